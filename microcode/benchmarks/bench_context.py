@@ -0,0 +1,77 @@
+"""
+Micro-benchmark for per-turn context assembly.
+
+Compares the incremental ConversationContext against rebuilding the task
+string from the full history each turn, as sessions grow. A few large
+pastes are made up front; the legacy rebuild serializes all of them every
+turn while the incremental context includes only the referenced one. Run
+with:
+
+    python benchmarks/bench_context.py
+"""
+
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.context import ConversationContext  # noqa: E402
+
+HISTORY_LIMIT = 12
+ANSWER = "x" * 4000
+PASTE = "log line\n" * 20000
+PASTE_COUNT = 3
+SESSION_LENGTHS = (25, 100, 400, 1600)
+
+
+def legacy_render(task, history, history_limit, paste_store):
+    context_lines = [
+        "cwd: /repo",
+        f"time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Current Task: {task}",
+        "Previous Conversation History:",
+    ]
+    for h in history[-history_limit:]:
+        context_lines.append(f"  User: {h['user']}")
+        context_lines.append(f"  Assistant: {h['assistant']}")
+    context_lines.append("All Pasted Content:")
+    for paste_id in paste_store:
+        context_lines.append(f"[{paste_id}]")
+    context_lines.append(str(paste_store))
+    return "\n".join(context_lines) + "\n"
+
+
+def run_legacy(turns: int) -> float:
+    history = []
+    paste_store = {f"paste_{index}": PASTE for index in range(PASTE_COUNT)}
+    start = time.perf_counter()
+    for turn in range(turns):
+        legacy_render(f"task {turn}", history, HISTORY_LIMIT, paste_store)
+        history.append({"user": f"task {turn}", "assistant": ANSWER})
+    return (time.perf_counter() - start) / turns
+
+
+def run_incremental(turns: int) -> float:
+    context = ConversationContext(HISTORY_LIMIT)
+    for index in range(PASTE_COUNT):
+        context.pastes.add(f"{PASTE}{index}")
+    start = time.perf_counter()
+    for turn in range(turns):
+        context.render(f"task {turn} [paste_{turn % PASTE_COUNT + 1}]", "/repo")
+        context.add_turn(f"task {turn}", ANSWER)
+    return (time.perf_counter() - start) / turns
+
+
+def main() -> None:
+    print(f"{'turns':>8} {'legacy us/turn':>16} {'incremental us/turn':>20}")
+    for turns in SESSION_LENGTHS:
+        legacy = run_legacy(turns) * 1e6
+        incremental = run_incremental(turns) * 1e6
+        print(f"{turns:>8} {legacy:>16.1f} {incremental:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
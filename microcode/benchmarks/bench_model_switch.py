@@ -0,0 +1,42 @@
+"""
+/model switching cost with N MCP servers whose tools are re-registered on the new agent.
+
+"cold" disables the agent pool so every switch loads the program; "warm"
+switches to a pair that is already pooled.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+TOOLS_PER_SERVER = 12
+
+
+def _server(index: int) -> SimpleNamespace:
+    def make_tool(name: str):
+        def tool(path: str = ".") -> str:
+            return f"{name}:{path}"
+
+        tool.__name__ = name
+        return tool
+
+    return SimpleNamespace(tools=[make_tool(f"tool{index}_{n}") for n in range(TOOLS_PER_SERVER)])
+
+
+@pytest.mark.parametrize("pool", ["cold", "warm"])
+@pytest.mark.parametrize("servers", [0, 4, 16])
+def test_model_switch(benchmark, monkeypatch, fake_program, servers, pool):
+    from utils import models
+    from utils.mcp import register_mcp_server
+
+    monkeypatch.setattr(models, "_AGENT_POOL", type(models._AGENT_POOL)())
+    monkeypatch.setenv("MICROCODE_MODEL_POOL_SIZE", "0" if pool == "cold" else "4")
+    monkeypatch.setattr(models, "prompt_model_tui", lambda _title, _options: "openai/gpt-5.2")
+    agent = fake_program({"lm": "openrouter/openai/gpt-5.2-codex", "sub_lm": "openrouter/openai/gpt-5.2-codex"})
+    mcp_servers = {f"srv{index}": {"server": _server(index), "tools": []} for index in range(servers)}
+
+    handled, new_agent, sub_lm = benchmark(
+        models.handle_model_command, "/model", agent, mcp_servers, register_mcp_server, "repo/nanocode"
+    )
+    assert handled and sub_lm == "openrouter/openai/gpt-5.2"
+    assert len(new_agent.tools) == servers * TOOLS_PER_SERVER
@@ -0,0 +1,41 @@
+"""
+Startup benchmarks: cold import of the CLI and init_agent overhead with a fake program.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_cold_import(benchmark):
+    def run() -> None:
+        subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, check=True)
+
+    benchmark.pedantic(run, rounds=5, iterations=1, warmup_rounds=1)
+
+
+def test_init_agent(benchmark, fake_program):
+    import main
+
+    def run():
+        return main.init_agent(
+            model="openrouter/openai/gpt-5.2",
+            sub_lm="openrouter/openai/gpt-5.2",
+            api_key=None,
+            max_iterations=50,
+            max_tokens=50000,
+            max_output_chars=100000,
+            api_base="http://127.0.0.1:9/api/v1",
+            verbose=False,
+            env="prod",
+            track_trace=False,
+            wandb_project=None,
+            wandb_key=None,
+            offline=True,
+        )
+
+    agent, model, _sub_lm = benchmark(run)
+    assert isinstance(agent, fake_program)
+    assert model == "openrouter/openai/gpt-5.2"
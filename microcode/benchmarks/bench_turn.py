@@ -0,0 +1,63 @@
+"""
+Per-turn hot paths: context assembly, paste placeholder handling and markdown rendering.
+"""
+
+import itertools
+
+import pytest
+
+from utils import paste
+from utils.context import ConversationContext
+from utils.display import render_markdown
+
+ANSWER = "Updated `utils/context.py` so **history** is rendered *once* per turn.\n" * 60
+PASTE = "2026-01-01 12:00:00 ERROR worker crashed: Traceback (most recent call last)\n" * 14000
+MARKDOWN_BLOCK = (
+    "## Summary\n\nThe **cache** now keys on `(task, config)` and *skips* the ~~old~~ path.\n"
+    "- Run `pytest -q` before __merging__.\n"
+) * 6
+_COUNTER = itertools.count()
+
+
+@pytest.mark.parametrize("turns", [1, 12, 25])
+def test_context_render(benchmark, turns):
+    context = ConversationContext(25)
+    for index in range(3):
+        context.pastes.add(f"{PASTE}{index}")
+    for turn in range(turns):
+        context.add_turn(f"task {turn} [paste_{turn % 3 + 1}]", ANSWER)
+
+    task = benchmark(context.render, "fix the crash in [paste_2]", "/repo")
+    assert "[paste_2]" in task
+    context.pastes.close()
+
+
+@pytest.mark.parametrize("size", [16 * 1024, 1024 * 1024, 8 * 1024 * 1024], ids=["16KB", "1MB", "8MB"])
+def test_paste_placeholder(benchmark, size):
+    context = ConversationContext(25)
+    base = ("x" * 79 + "\n") * (size // 80)
+
+    def setup():
+        # A distinct paste per round, so the content-addressed store cannot dedupe it.
+        text = f"{next(_COUNTER)}\n{base}"
+        placeholder = f"[pasted {len(text)}+ chars]"
+        paste._store_paste(text, placeholder)
+        return (f"explain {placeholder}",), {}
+
+    def run(user_input: str) -> str:
+        payload = paste.consume_paste_for_input(user_input)
+        paste_id = context.pastes.add(payload["text"])
+        return user_input.replace(payload["placeholder"], f"[{paste_id}]")
+
+    result = benchmark.pedantic(run, setup=setup, rounds=20)
+    assert result.startswith("explain [paste_")
+    context.pastes.close()
+
+
+@pytest.mark.parametrize(
+    "size", [1024, 64 * 1024, 1024 * 1024, 5 * 1024 * 1024], ids=["1KB", "64KB", "1MB", "5MB"]
+)
+def test_render_markdown(benchmark, size):
+    text = (MARKDOWN_BLOCK * (size // len(MARKDOWN_BLOCK) + 1))[:size]
+    rendered = benchmark(render_markdown, text)
+    assert "\033[1m" in rendered
@@ -0,0 +1,60 @@
+"""
+Shared setup for the pytest-benchmark suite.
+
+The suite runs against a throwaway cache directory and a fake program, so
+no hub, network or API key is needed. Run it from the microcode directory
+with `make bench` (or the command in the Makefile); results are saved
+under .benchmarks/ and `make bench-compare` compares a run against the
+last saved one.
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Set before any utils module computes its cache paths.
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="microcode_bench_")
+
+if importlib.util.find_spec("pytest_benchmark") is None:
+    collect_ignore_glob = ["bench_*.py"]
+
+
+class FakeProgram:
+    """
+    Stand-in for a loaded PrecompiledProgram: a config, no LMs, and a tool registry.
+    """
+
+    def __init__(self, config):
+        self.config = SimpleNamespace(**config)
+        self.lm = None
+        self.sub_lm = None
+        self.tools = {}
+
+    def set_tool(self, name, tool):
+        self.tools[name] = tool
+
+
+@pytest.fixture
+def fake_program(monkeypatch):
+    """
+    Make AutoProgram.from_precompiled return a FakeProgram without touching the hub.
+    """
+    modaic = pytest.importorskip("modaic")
+    import main
+
+    def fake_from_precompiled(_repo, rev=None, config=None, **_kwargs):
+        return FakeProgram(config or {})
+
+    monkeypatch.setattr(modaic.AutoProgram, "from_precompiled", fake_from_precompiled)
+    monkeypatch.setattr(modaic, "PrecompiledProgram", FakeProgram)
+    monkeypatch.setattr(main, "resolve_program_path", lambda *_args, **_kwargs: "/fake")
+    monkeypatch.setattr("utils.models.resolve_program_path", lambda *_args, **_kwargs: "/fake")
+    return FakeProgram
@@ -1,12 +1,11 @@
-from datetime import datetime
 import os
 import shlex
 import getpass
-from typing import Literal
+import json
+import time
+from typing import TYPE_CHECKING, Callable, Literal
 import click
 import typer
-import shutil
-from modaic import AutoProgram
 
 from utils.cache import (
     clear_openrouter_key,
@@ -19,12 +18,22 @@ from utils.constants import (
     BOLD,
     BLUE,
     CYAN,
+    DIM,
     GREEN,
     RED,
     RESET,
+    YELLOW,
     MODAIC_REPO_PATH,
     DEFAULT_HISTORY_LIMIT,
+    DAEMON_MAX_AGENTS,
+    DEFAULT_PROMPT_LAYOUT,
+    MODEL_BENCH_CONCURRENCY,
 )
+from utils.batch import completed_ids, read_tasks, run_batch, trim_partial_line
+from utils.cassettes import get_cassette
+from utils.connections import format_pool_stats, get_http_pool, install_http_pool
+from utils.context import ConversationContext
+from utils.daemon import MicrocodeDaemon, request_task
 from utils.display import (
     render_markdown,
     separator,
@@ -34,14 +43,54 @@ from utils.display import (
     format_auth_error,
     read_int_env,
 )
-from utils.models import handle_model_command, resolve_startup_models
-from utils.mcp import handle_add_mcp_command, register_mcp_server
+from utils.hedging import hedge_counts
+from utils.loader import AgentLoader
+from utils.models import handle_model_command, resolve_startup_models, run_bench_command, wrap_program_lms
+from utils.mcp import handle_add_mcp_command, load_mcp_command, register_mcp_server
 from utils.paste import consume_paste_for_input, read_user_input
+from utils.profiler import span, start_profiler, stop_profiler
+from utils.router import TaskRouter, aanswer_directly, answer_directly, format_route
+from utils.programs import program_revision, resolve_program_path
+from utils.responses import ResponseCache, workspace_fingerprint
+from utils.runner import AgentRunner, TurnCancelled
+from utils.stats import (
+    SessionStats,
+    format_session_stats,
+    format_turn_stats,
+    lm_markers,
+    turn_stats,
+)
+from utils.streaming import StreamPrinter, stream_agent
+from utils.stub_server import StubServer, format_stub_counts, load_script
+from utils.sessions import (
+    SessionLog,
+    evict_sessions,
+    list_sessions,
+    resolve_session_id,
+    restore_session,
+    turn_record,
+)
+from utils.tokens import calibrate_from_entries, history_token_budget
+from utils.tracing import (
+    format_trace_summary,
+    read_spans,
+    record_turn,
+    set_trace_session,
+    summarize_spans,
+)
+from utils.usage import (
+    cached_prompt_tokens,
+    entries_since,
+    history_marker,
+)
+
+if TYPE_CHECKING:
+    from modaic import AutoProgram
 
 app = typer.Typer(add_completion=False, help="Microcode interactive CLI.")
 
 
-def init_agent(
+def resolve_agent_config(
     model: str | None,
     sub_lm: str | None,
     api_key: str | None,
@@ -54,11 +103,12 @@ def init_agent(
     track_trace: bool | None,
     wandb_project: str | None,
     wandb_key: str | None,
-) -> tuple[AutoProgram, str | None, str | None]:
-    """
-    Build an AutoProgram instance with the specified configuration.
+) -> tuple[dict[str, object], str, str]:
     """
+    Resolve the program config from CLI flags, environment and cached settings.
 
+    This runs on the main thread since model resolution may prompt the user.
+    """
     if model is None:
         model = os.getenv("MICROCODE_MODEL")
     if sub_lm is None:
@@ -108,7 +158,7 @@ def init_agent(
     if openrouter_key and not os.getenv("OPENROUTER_API_KEY"):
         os.environ["OPENROUTER_API_KEY"] = openrouter_key
 
-    model, sub_lm = resolve_startup_models(model, sub_lm)
+    model, sub_lm = resolve_startup_models(model, sub_lm, api_base)
 
     config = {"lm": model, "sub_lm": sub_lm, "verbose": verbose}
     if max_iterations is not None:
@@ -130,14 +180,208 @@ def init_agent(
         verbose=verbose,
     )
 
-    agent = AutoProgram.from_precompiled( # RLM Engine: https://www.modaic.dev/farouk1/nanocode
-        MODAIC_REPO_PATH,
-        rev=os.getenv("MODAIC_ENV", "prod"),
-        config=config,
+    return config, model, sub_lm
+
+
+def load_agent(
+    config: dict[str, object],
+    offline: bool | None = None,
+    on_stage: Callable[[str], None] | None = None,
+) -> "AutoProgram":
+    """
+    Load the precompiled program with a resolved config.
+
+    Args:
+        config: Program config from resolve_agent_config
+        offline: Load the program only from the local program store
+        on_stage: Optional callback receiving a label for each load stage
+
+    Returns:
+        The loaded AutoProgram instance
+    """
+    if offline is None:
+        offline = os.getenv("MICROCODE_OFFLINE") == "1"
+    if on_stage is None:
+        on_stage = lambda _label: None
+
+    rev = os.getenv("MODAIC_ENV", "prod")
+    pool = get_http_pool()
+    api_base = config.get("api_base")
+    if isinstance(api_base, str) and api_base.startswith("https://") and not offline:
+        # The TLS handshake overlaps with resolving and importing the program.
+        pool.warm(api_base)
+    on_stage("Resolving program")
+    with span("resolve program", "load", rev=rev):
+        program_path = resolve_program_path(MODAIC_REPO_PATH, rev, offline=offline)
+
+    on_stage("Importing runtime")
+    with span("import runtime", "load"):
+        from modaic import AutoProgram
+
+        install_http_pool(pool)
+
+    on_stage("Loading program")
+    with span("load program", "load"):
+        agent = AutoProgram.from_precompiled( # RLM Engine: https://www.modaic.dev/farouk1/nanocode
+            program_path,
+            rev=rev,
+            config=config,
+        )
+    wrap_program_lms(agent)
+    return agent
+
+
+def set_profile_env(profile: bool, sample_ms: int | None) -> None:
+    """
+    Export --profile and --profile-sample-ms for the profiler and LM instrumentation.
+    """
+    if profile or sample_ms:
+        os.environ["MICROCODE_PROFILE"] = "1"
+    if sample_ms:
+        os.environ["MICROCODE_PROFILE_SAMPLE_MS"] = str(sample_ms)
+
+
+def set_cassette_env(record: str | None, replay: str | None, replay_latency: str | None) -> None:
+    """
+    Export --record, --replay and --replay-latency for the LM and tool cassette.
+    """
+    if record:
+        os.environ["MICROCODE_RECORD"] = record
+    if replay:
+        os.environ["MICROCODE_REPLAY"] = replay
+    if replay_latency:
+        os.environ["MICROCODE_REPLAY_LATENCY"] = replay_latency
+
+
+def set_trace_env(trace: bool) -> None:
+    """
+    Export --trace so that every agent built in this process records spans.
+    """
+    if trace:
+        os.environ["MICROCODE_TRACE"] = "1"
+
+
+def set_route_env(route: str | None, route_lm: bool) -> None:
+    """
+    Export --route and --route-lm so that the task router picks them up.
+    """
+    if route:
+        os.environ["MICROCODE_ROUTE"] = route
+    if route_lm:
+        os.environ["MICROCODE_ROUTE_LM"] = "1"
+
+
+def set_hedge_env(hedge: bool, fallback: list[str] | None) -> None:
+    """
+    Export --hedge and --fallback so that every agent built in this process picks them up.
+    """
+    if hedge:
+        os.environ["MICROCODE_HEDGE"] = "1"
+    if fallback:
+        os.environ["MICROCODE_FALLBACK_MODELS"] = ",".join(fallback)
+
+
+def response_cache_key(prompt: str, config: dict[str, object], offline: bool | None = None) -> str:
+    """
+    Build the response cache key for a task run with a resolved config.
+
+    The key covers the program revision, the route mode from --route and
+    --route-lm and, unless MICROCODE_RESPONSE_CACHE_WORKSPACE=0, a
+    fingerprint of the git workspace in the current directory.
+    """
+    rev = os.getenv("MODAIC_ENV", "prod")
+    revision = program_revision(resolve_program_path(MODAIC_REPO_PATH, rev, offline=offline))
+    workspace = None
+    if os.getenv("MICROCODE_RESPONSE_CACHE_WORKSPACE") != "0":
+        workspace = workspace_fingerprint(os.getcwd())
+    router = TaskRouter()
+    route = f"{router.mode}+lm" if router.mode == "auto" and router.use_lm else router.mode
+    return ResponseCache.key(prompt, config, revision=revision, workspace=workspace, route=route)
+
+
+def init_agent(
+    model: str | None,
+    sub_lm: str | None,
+    api_key: str | None,
+    max_iterations: int | None,
+    max_tokens: int | None,
+    max_output_chars: int | None,
+    api_base: str | None,
+    verbose: bool | None,
+    env: str | None,
+    track_trace: bool | None,
+    wandb_project: str | None,
+    wandb_key: str | None,
+    offline: bool | None = None,
+) -> tuple["AutoProgram", str | None, str | None]:
+    """
+    Build an AutoProgram instance with the specified configuration.
+    """
+    config, model, sub_lm = resolve_agent_config(
+        model=model,
+        sub_lm=sub_lm,
+        api_key=api_key,
+        max_iterations=max_iterations,
+        max_tokens=max_tokens,
+        max_output_chars=max_output_chars,
+        api_base=api_base,
+        verbose=verbose,
+        env=env,
+        track_trace=track_trace,
+        wandb_project=wandb_project,
+        wandb_key=wandb_key,
     )
+    agent = load_agent(config, offline=offline)
     return agent, model, sub_lm
 
 
+def resume_session(context: ConversationContext, ref: str) -> SessionLog | None:
+    """
+    Restore a saved session into the context.
+
+    Args:
+        context: The conversation context to fill
+        ref: A session ID, a unique ID suffix, or "last"
+
+    Returns:
+        The reopened session log, or None if the session was not found
+    """
+    session_id = resolve_session_id(ref)
+    if session_id is None:
+        click.echo(f"{RED}⏺ Session not found: {ref}{RESET}")
+        return None
+    try:
+        session = restore_session(context, session_id)
+    except FileNotFoundError:
+        click.echo(f"{RED}⏺ Session not found: {ref}{RESET}")
+        return None
+    click.echo(
+        f"{GREEN}⏺ Resumed session {session_id} ({len(context.turns)} of {len(session)} turns loaded){RESET}"
+    )
+    return session
+
+
+def print_sessions(current: str | None = None, limit: int = 10) -> None:
+    """
+    Print the most recent saved sessions.
+
+    Args:
+        current: The active session ID, marked in the list
+        limit: Maximum number of sessions to print
+    """
+    sessions = [info for info in list_sessions() if info["turns"]][:limit]
+    if not sessions:
+        click.echo(f"{DIM}No saved sessions{RESET}")
+        return
+    for info in sessions:
+        marker = f"{GREEN}*{RESET}" if info["id"] == current else " "
+        first = info["first"].splitlines()[0][:60] if info["first"] else ""
+        click.echo(
+            f"{marker} {BLUE}{info['id']}{RESET}  {DIM}{info['turns']} turns{RESET}  {first}"
+        )
+    click.echo(f"{DIM}Resume with /resume <id> or /resume last{RESET}")
+
+
 def run_interactive(
     history_limit: int,
     show_banner: bool,
@@ -153,6 +397,10 @@ def run_interactive(
     track_trace: bool | None = None,
     wandb_project: str | None = None,
     wandb_key: str | None = None,
+    offline: bool | None = None,
+    history_tokens: int | None = None,
+    prompt_layout: str | None = None,
+    resume: str | None = None,
 ) -> None:
     """
     Run the interactive CLI session.
@@ -161,7 +409,7 @@ def run_interactive(
     It handles user input, processes commands, and manages the conversation history.
 
     Args:
-        history_limit: Maximum number of messages to keep in history
+        history_limit: Maximum number of turns to keep in history
         show_banner: Whether to display the startup banner
         model: Override for the primary model ID
         sub_lm: Override for the sub model ID
@@ -175,8 +423,12 @@ def run_interactive(
         track_trace: Enable trace tracking
         wandb_project: Set Weights & Biases project name
         wandb_key: Set Weights & Biases API key
+        offline: Load the program only from the local program store
+        history_tokens: Token budget for history (defaults to a share of the model context)
+        prompt_layout: Task layout, "cache" (stable prefix first) or "legacy"
+        resume: Session ID (or "last") to resume
     """
-    agent, resolved_model, resolved_sub_lm = init_agent(
+    config, resolved_model, resolved_sub_lm = resolve_agent_config(
         model=model,
         sub_lm=sub_lm,
         api_key=api_key,
@@ -190,6 +442,11 @@ def run_interactive(
         wandb_project=wandb_project,
         wandb_key=wandb_key,
     )
+    profiler = start_profiler()
+    # Load the program in the background so the banner and first prompt are not blocked.
+    loader = AgentLoader(
+        lambda on_stage: load_agent(config, offline=offline, on_stage=on_stage)
+    )
 
     cwd = os.getcwd()
 
@@ -210,10 +467,25 @@ def run_interactive(
         click.echo()
         click.echo()
 
-    history = []
+    agent = None
+    context = ConversationContext(
+        history_limit,
+        token_budget=history_token_budget(
+            resolved_model, config.get("max_tokens"), history_tokens
+        ),
+        model=resolved_model,
+        layout=prompt_layout
+        or os.getenv("MICROCODE_PROMPT_LAYOUT", DEFAULT_PROMPT_LAYOUT),
+    )
     mcp_servers = {}
-    paste_store = {}
-    paste_counter = 0
+
+    runner = AgentRunner()
+    router = TaskRouter()
+    session = SessionLog()
+    session_stats = SessionStats()
+    if resume:
+        session = resume_session(context, resume) or session
+    evict_sessions(keep=session.session_id)
 
     while True:
         try:
@@ -262,12 +534,40 @@ def run_interactive(
                 continue
 
             if user_input == "/c":
-                history = []
+                context.clear_history()
+                session.close()
+                if profiler is not None:
+                    profiler.save(session.session_id)
+                    profiler = start_profiler()
+                session = SessionLog()
+                session_stats = SessionStats()
                 click.echo(f"{GREEN}⏺ Cleared conversation{RESET}")
                 continue
 
+            if user_input == "/stats":
+                for line in format_session_stats(session_stats.summary()):
+                    click.echo(f"{DIM}{line}{RESET}")
+                continue
+
+            if user_input == "/pool":
+                click.echo(f"{DIM}{format_pool_stats(get_http_pool().stats())}{RESET}")
+                continue
+
+            if user_input.startswith("/resume"):
+                args = shlex.split(user_input)[1:]
+                if not args:
+                    print_sessions(session.session_id)
+                    continue
+                resumed = resume_session(context, args[0])
+                if resumed is not None:
+                    session.close()
+                    session = resumed
+                continue
+
             handled = False
             if user_input.startswith("/model"):
+                if agent is None:
+                    agent = loader.result()
                 handled, agent, new_sub_lm = handle_model_command(
                     user_input,
                     agent,
@@ -285,56 +585,101 @@ def run_interactive(
             if handled:
                 if new_sub_lm:
                     sub_lm = new_sub_lm
+                context.set_token_budget(
+                    history_token_budget(
+                        agent.config.lm,
+                        getattr(agent.config, "max_tokens", None),
+                        history_tokens,
+                    ),
+                    model=agent.config.lm,
+                )
                 continue
 
             if user_input.startswith("/mcp"):
+                if agent is None:
+                    agent = loader.result()
                 if handle_add_mcp_command(user_input, agent, mcp_servers):
                     continue
 
             paste_payload = consume_paste_for_input(user_input)
             if paste_payload:
-                paste_counter += 1
-                paste_id = f"paste_{paste_counter}"
-                paste_store[paste_id] = paste_payload["text"]
+                paste_id = context.pastes.add(paste_payload["text"])
                 user_input = user_input.replace(
                     paste_payload["placeholder"], f"[{paste_id}]"
                 )
 
-            context_lines = [
-                f"cwd: {os.getcwd()}",
-                f"time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                f"Current Task: {user_input}",
-                "Previous Conversation History:",
-            ]
-            if history:
-                for h in history[-history_limit:]:
-                    context_lines.append(f"  User: {h['user']}")
-                    context_lines.append(f"  Assistant: {h['assistant']}")
-            else:
-                context_lines.append("  None")
-
-            context_lines.append("All Pasted Content:")
-            if paste_store:
-                for paste_id in paste_store:
-                    context_lines.append(f"[{paste_id}]")
-                context_lines.append(str(paste_store))
-            else:
-                context_lines.append("  None")
-
-            task = "\n".join(context_lines) + "\n"
+            with span("build context", "context", turns=len(context.turns)):
+                task = context.render(user_input, os.getcwd())
 
+            if agent is None:
+                agent = loader.result()
             click.echo(f"\n{CYAN}⏺{RESET} Thinking...", nl=True)
+            lm_marker = history_marker(agent.lm)
+            markers = lm_markers(agent)
+            hedges_before = hedge_counts()
+            printer = StreamPrinter()
+            set_trace_session(session.session_id)
+            started_at = time.time()
+            started = time.perf_counter()
             try:
-                result = agent(task=task)
+                with span("turn", "turn", task_chars=len(task)):
+                    decision = runner.call(router.aroute, user_input, agent.sub_lm)
+                    result = None
+                    if decision["route"] == "direct":
+                        result = runner.call(aanswer_directly, agent.lm, task)
+                        if result is None:
+                            router.escalate(decision)
+                    if result is None:
+                        result = runner.run(agent, task, printer)
+            except TurnCancelled as e:
+                printer.finish()
+                record_turn(task, None, started_at, time.perf_counter() - started, error=e)
+                click.echo(
+                    f"\n{YELLOW}⏺ Cancelled (press Ctrl-C again at the prompt to exit){RESET}"
+                )
+                continue
             except Exception as e:
+                printer.finish()
+                record_turn(task, None, started_at, time.perf_counter() - started, error=e)
                 click.echo(f"\n{RED}⏺ Error: {e}{RESET}")
                 continue
+            printer.finish()
+            stats = turn_stats(agent, result, markers, time.perf_counter() - started)
+            record_turn(task, result, started_at, stats["seconds"])
+            router.record(decision, user_input, started_at, stats["seconds"])
+            stats["route"] = decision["route"]
+            stats["saved_seconds"] = decision["saved_seconds"]
+            session_stats.add(stats)
+            lm_entries = entries_since(agent.lm, lm_marker)
+            calibrate_from_entries(lm_entries)
 
-            click.echo(f"\n{CYAN}⏺{RESET} {render_markdown(result.answer)}")
+            with span("render markdown", "render", chars=len(result.answer)):
+                rendered = render_markdown(result.answer)
+            click.echo(f"\n{CYAN}⏺{RESET} {rendered}")
+            cached_tokens, prompt_tokens = cached_prompt_tokens(lm_entries)
+            if prompt_tokens:
+                click.echo(
+                    f"{DIM}  prompt cache: {cached_tokens:,}/{prompt_tokens:,} tokens "
+                    f"({cached_tokens / prompt_tokens:.0%}){RESET}"
+                )
+            hedges = {
+                name: count - hedges_before[name] for name, count in hedge_counts().items()
+            }
+            if hedges["hedges"] or hedges["fallbacks"]:
+                click.echo(
+                    f"{DIM}  hedged {hedges['hedges']} of {hedges['calls']} LM calls "
+                    f"({hedges['hedge_wins']} won), {hedges['fallbacks']} fallbacks{RESET}"
+                )
+            click.echo(f"{DIM}  {format_turn_stats(stats)}{RESET}")
+            if router.mode != "rlm":
+                click.echo(f"{DIM}  {format_route(decision)}{RESET}")
 
-            history.append(
-                {"user": user_input, "assistant": result.answer, "pasted_content": None}
-            )
+            context.add_turn(user_input, result.answer)
+            record = turn_record(context, user_input, result.answer, agent.config.lm)
+            record["stats"] = stats
+            session.append(record)
+            if profiler is not None:
+                profiler.save(session.session_id)
             click.echo()
 
         except (KeyboardInterrupt, EOFError):
@@ -351,6 +696,30 @@ def run_interactive(
             traceback.print_exc()
             click.echo(f"{RED}⏺ Error: {err}{RESET}")
 
+    runner.close()
+    session.close()
+    if len(session):
+        click.echo(
+            f"{DIM}Session saved: microcode --resume {session.session_id}{RESET}"
+        )
+    if profiler is not None:
+        path = profiler.save(session.session_id)
+        stop_profiler()
+        click.echo(f"{DIM}Profile saved: {path}{RESET}")
+    cassette = get_cassette()
+    if cassette is not None:
+        cassette.close()
+        counts = cassette.counts
+        if cassette.mode == "record":
+            click.echo(f"{DIM}Cassette saved: {cassette.path} ({counts['recorded']} calls){RESET}")
+        else:
+            click.echo(
+                f"{DIM}Cassette replayed: {counts['matched']} matched, {counts['sequential']} "
+                f"in order, {counts['missed']} missed{RESET}"
+            )
+    context.pastes.close()
+    loader.shutdown()
+
 
 @app.command("task")
 def run_task(
@@ -391,11 +760,102 @@ def run_task(
         "--env",
         help="Set MODAIC_ENV.",
     ),
+    offline: bool = typer.Option(
+        False, "--offline", help="Load the program from the local cache only."
+    ),
+    no_daemon: bool = typer.Option(
+        False, "--no-daemon", help="Always run in-process, even if a daemon is up."
+    ),
+    stream: bool = typer.Option(
+        False,
+        "--stream",
+        help="Write reasoning to stdout as it is generated (progress goes to stderr).",
+    ),
+    use_cache: bool = typer.Option(
+        os.getenv("MICROCODE_RESPONSE_CACHE") == "1",
+        "--cache/--no-cache",
+        help="Reuse answers for identical tasks, config and workspace.",
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Ignore a cached answer and overwrite it."
+    ),
+    hedge: bool = typer.Option(
+        False, "--hedge", help="Send a second request when an LM call outlasts its p95 latency."
+    ),
+    fallback: list[str] | None = typer.Option(
+        None,
+        "--fallback",
+        help="Fallback model ID or menu number, tried in order (repeatable, 'auto' for all).",
+    ),
+    stats_json: bool = typer.Option(
+        False,
+        "--stats-json",
+        help="Write time, LM calls, tokens per model, iterations and cost as JSON to stderr.",
+    ),
+    trace: bool = typer.Option(
+        os.getenv("MICROCODE_TRACE") == "1",
+        "--trace/--no-trace",
+        help="Record LM calls, tool calls and RLM iterations to local NDJSON trace files.",
+    ),
+    record: str | None = typer.Option(
+        None, "--record", help="Record every LM response and MCP tool result to a cassette file."
+    ),
+    replay: str | None = typer.Option(
+        None, "--replay", help="Answer LM and MCP tool calls from a recorded cassette, offline."
+    ),
+    replay_latency: str | None = typer.Option(
+        None,
+        "--replay-latency",
+        help="Delay for replayed calls: 'recorded' or seconds (default: none).",
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Write a Chrome trace of load, context, LM, tool and render time (see chrome://tracing).",
+    ),
+    profile_sample_ms: int | None = typer.Option(
+        None,
+        "--profile-sample-ms",
+        min=1,
+        help="Also sample Python stacks every N ms into a folded-stack file (implies --profile).",
+    ),
+    route: Literal["auto", "direct", "rlm"] = typer.Option(
+        os.getenv("MICROCODE_ROUTE", "auto"),
+        "--route",
+        help="'auto' answers simple questions with one LM call and sends the rest to the RLM; 'direct' or 'rlm' forces a path.",
+    ),
+    route_lm: bool = typer.Option(
+        os.getenv("MICROCODE_ROUTE_LM") == "1",
+        "--route-lm",
+        help="Ask the sub_lm to route tasks the local heuristics cannot place.",
+    ),
 ) -> None:
     """
     Run a single task and exit.
+
+    If a `microcode serve` daemon is listening, the task is sent to it and
+    runs on a warm agent; otherwise the agent is loaded in-process. With
+    --stream, partial output is written as it arrives so it can be piped.
+    With --cache, answers are stored on disk and reused while the task,
+    config, program revision and git workspace are unchanged. With
+    --profile, the task runs in-process and its trace is written under
+    the profiles cache directory. --record and --replay also run
+    in-process, and so do --hedge, --fallback and --trace unless the
+    daemon's environment already enables them. Tasks are routed like
+    interactive turns (see --route), on the daemon too.
     """
-    agent, _, _ = init_agent(
+    # Hedging, fallbacks and tracing wrap the LMs when an agent is built, so a warm daemon agent cannot take them per task.
+    lm_flags = (
+        (hedge and os.getenv("MICROCODE_HEDGE") != "1")
+        or bool(fallback)
+        or (trace and os.getenv("MICROCODE_TRACE") != "1")
+    )
+    set_hedge_env(hedge, fallback)
+    set_trace_env(trace)
+    set_cassette_env(record, replay, replay_latency)
+    set_profile_env(profile, profile_sample_ms)
+    set_route_env(route, route_lm)
+    config, _, _ = resolve_agent_config(
         model=model,
         sub_lm=sub_lm,
         api_key=api_key,
@@ -409,8 +869,427 @@ def run_task(
         wandb_project=wandb_project,
         wandb_key=wandb_key,
     )
-    result = agent(task=prompt)
-    click.echo(result.answer)
+
+    started = time.perf_counter()
+    cache = cache_key = None
+    if use_cache or refresh:
+        cache = ResponseCache()
+        cache_key = response_cache_key(prompt, config, offline=offline)
+        if not refresh:
+            answer = cache.get(cache_key)
+            if answer is not None:
+                click.echo(f"{DIM}⏺ Cached answer{RESET}", err=True)
+                click.echo(answer)
+                if stats_json:
+                    stats = turn_stats(None, None, {}, time.perf_counter() - started)
+                    click.echo(json.dumps({**stats, "cache_hit": True}), err=True)
+                return
+
+    profiler = start_profiler()
+    # Per-call credentials, LM wrappers, profiling and cassettes only apply in-process; the daemon uses its own environment.
+    printer = StreamPrinter(ansi=False, status_to_stderr=True) if stream else None
+    answer = None
+    stats = None
+    in_process = (
+        bool(api_key or wandb_key) or lm_flags or profiler is not None or get_cassette() is not None
+    )
+    if not no_daemon and not in_process:
+        daemon_stats = {}
+        daemon_decision = {}
+
+        def on_event(event: dict[str, object]) -> None:
+            if event.get("event") == "answer" and isinstance(event.get("stats"), dict):
+                daemon_stats.update(event["stats"])
+                if isinstance(event.get("decision"), dict):
+                    daemon_decision.update(event["decision"])
+            elif printer is not None:
+                printer(event.get("event", ""), event.get("text") or event.get("message", ""))
+
+        try:
+            answer = request_task(
+                prompt, config, on_event=on_event, stream=stream, route=route, route_lm=route_lm
+            )
+        except RuntimeError as err:
+            click.echo(f"{RED}⏺ Error: {err}{RESET}", err=True)
+            raise typer.Exit(1)
+        stats = daemon_stats or None
+        if daemon_decision and route != "rlm":
+            click.echo(f"{DIM}⏺ {format_route(daemon_decision)}{RESET}", err=True)
+
+    if answer is None:
+        agent = load_agent(config, offline=offline)
+        router = TaskRouter()
+        markers = lm_markers(agent)
+        agent_started_at = time.time()
+        agent_started = time.perf_counter()
+        with span("turn", "turn", task_chars=len(prompt)):
+            decision = router.route(prompt, agent.sub_lm)
+            result = None
+            if decision["route"] == "direct":
+                result = answer_directly(agent.lm, prompt)
+                if result is None:
+                    router.escalate(decision)
+            if result is None and printer is not None:
+                result = stream_agent(agent, prompt, printer)
+            elif result is None:
+                result = agent(task=prompt)
+        answer = result.answer
+        stats = turn_stats(agent, result, markers, time.perf_counter() - agent_started)
+        record_turn(prompt, result, agent_started_at, stats["seconds"])
+        router.record(decision, prompt, agent_started_at, stats["seconds"])
+        stats["route"] = decision["route"]
+        stats["saved_seconds"] = decision["saved_seconds"]
+        if router.mode != "rlm":
+            click.echo(f"{DIM}⏺ {format_route(decision)}{RESET}", err=True)
+    if printer is not None:
+        printer.finish()
+    if cache is not None and isinstance(answer, str):
+        cache.put(cache_key, answer, task=prompt)
+    click.echo(answer)
+    if stats_json and stats is not None:
+        click.echo(json.dumps({**stats, "cache_hit": False}), err=True)
+    if profiler is not None:
+        path = profiler.save(time.strftime("task-%Y%m%d-%H%M%S"))
+        stop_profiler()
+        click.echo(f"{DIM}⏺ Profile saved: {path}{RESET}", err=True)
+
+
+cache_app = typer.Typer(help="Inspect or clear the `task --cache` answer cache.")
+app.add_typer(cache_app, name="cache")
+
+
+@cache_app.command("stats")
+def cache_stats() -> None:
+    """
+    Show the response cache hit rate and size.
+    """
+    stats = ResponseCache().stats()
+    lookups = stats["hits"] + stats["misses"]
+    rate = f"{stats['hits'] / lookups:.0%}" if lookups else "n/a"
+    click.echo(
+        f"{stats['hits']} hits, {stats['misses']} misses (hit rate {rate}), "
+        f"{stats['entries']} entries, {stats['bytes'] / (1024 * 1024):.1f} MB"
+    )
+
+
+@cache_app.command("clear")
+def cache_clear() -> None:
+    """
+    Delete every cached answer and reset the counters.
+    """
+    ResponseCache().clear()
+    click.echo(f"{GREEN}⏺ Response cache cleared{RESET}")
+
+
+@app.command("batch")
+def run_batch_command(
+    input_path: str = typer.Argument(
+        "-", help="JSONL file of tasks, or '-' to read from stdin."
+    ),
+    output_path: str | None = typer.Option(
+        None, "--output", "-o", help="Write results to this JSONL file instead of stdout."
+    ),
+    concurrency: int = typer.Option(
+        4, "--concurrency", "-j", min=1, help="Number of tasks run at once."
+    ),
+    resume: bool = typer.Option(
+        False, "--resume", help="Skip tasks that already succeeded in --output and append."
+    ),
+    model: str | None = typer.Option(
+        None, "--lm", "-m", help="Override primary model ID."
+    ),
+    sub_lm: str | None = typer.Option(
+        None, "--sub-lm", "-s", help="Override sub_lm model ID."
+    ),
+    max_iterations: int = typer.Option(
+        50, "--max-iterations", help="Maximum number of iterations."
+    ),
+    max_tokens: int = typer.Option(
+        50000, "--max-tokens", help="Maximum number of tokens."
+    ),
+    max_output_chars: int = typer.Option(
+        100000, "--max-output-tokens", help="Maximum number of output tokens."
+    ),
+    api_base: str = typer.Option(
+        "https://openrouter.ai/api/v1", "--api-base", help="Override API base URL."
+    ),
+    env: Literal["dev", "prod"] = typer.Option(
+        os.getenv("MODAIC_ENV", os.getenv("MICROCODE_ENV", "prod")),
+        "--env",
+        help="Set MODAIC_ENV.",
+    ),
+    offline: bool = typer.Option(
+        False, "--offline", help="Load the program from the local cache only."
+    ),
+) -> None:
+    """
+    Run many tasks from a JSONL file on a bounded pool of workers.
+
+    Each input line is a task string or an object with "task" and optional
+    "id", "lm" and "sub_lm". One result record per task is written as soon
+    as it finishes, with the answer or error, timing and token usage.
+    """
+    if resume and not output_path:
+        click.echo(f"{RED}⏺ --resume requires --output{RESET}", err=True)
+        raise typer.Exit(2)
+
+    try:
+        if input_path == "-":
+            tasks = read_tasks(click.get_text_stream("stdin"))
+        else:
+            with open(input_path, "r", encoding="utf-8") as handle:
+                tasks = read_tasks(handle)
+    except (OSError, ValueError) as err:
+        click.echo(f"{RED}⏺ Could not read tasks: {err}{RESET}", err=True)
+        raise typer.Exit(2)
+
+    if resume:
+        trim_partial_line(output_path)
+        done = completed_ids(output_path)
+        tasks = [item for item in tasks if item["id"] not in done]
+        click.echo(f"{DIM}Skipping {len(done)} completed tasks{RESET}", err=True)
+    if not tasks:
+        return
+
+    config, _, _ = resolve_agent_config(
+        model=model,
+        sub_lm=sub_lm,
+        api_key=None,
+        max_iterations=max_iterations,
+        max_tokens=max_tokens,
+        max_output_chars=max_output_chars,
+        api_base=api_base,
+        verbose=False,
+        env=env,
+        track_trace=None,
+        wandb_project=None,
+        wandb_key=None,
+    )
+
+    total = len(tasks)
+    finished = 0
+
+    def report(record: dict[str, object]) -> None:
+        nonlocal finished
+        finished += 1
+        status = f"{RED}failed{RESET}" if "error" in record else f"{GREEN}ok{RESET}"
+        click.echo(
+            f"{DIM}[{finished}/{total}]{RESET} {record['id']} {status} {DIM}{record['seconds']:.1f}s{RESET}",
+            err=True,
+        )
+
+    output = (
+        open(output_path, "a" if resume else "w", encoding="utf-8")
+        if output_path
+        else click.get_text_stream("stdout")
+    )
+    try:
+        counts = run_batch(
+            tasks,
+            config,
+            build_agent=lambda agent_config: load_agent(agent_config, offline=offline),
+            output=output,
+            concurrency=concurrency,
+            on_record=report,
+        )
+    except KeyboardInterrupt:
+        output.flush()
+        click.echo(
+            f"\n{YELLOW}⏺ Interrupted after {finished}/{total} tasks; rerun with --resume to continue{RESET}",
+            err=True,
+        )
+        # Worker threads may still be inside LM calls; do not wait for them.
+        os._exit(130)
+    finally:
+        if output_path:
+            output.close()
+
+    click.echo(
+        f"{GREEN}⏺ {counts['ok']} succeeded{RESET}, {RED if counts['failed'] else DIM}{counts['failed']} failed{RESET}",
+        err=True,
+    )
+    if counts["failed"]:
+        raise typer.Exit(1)
+
+
+@app.command("serve")
+def run_serve(
+    socket_path: str | None = typer.Option(
+        None, "--socket", help="Unix socket path (defaults to the cache directory)."
+    ),
+    mcp: list[str] | None = typer.Option(
+        None, "--mcp", help="MCP server to keep loaded, as name=command (repeatable)."
+    ),
+    max_agents: int = typer.Option(
+        DAEMON_MAX_AGENTS, "--max-agents", min=1, help="Number of warm agents to keep."
+    ),
+    env: Literal["dev", "prod"] = typer.Option(
+        os.getenv("MODAIC_ENV", os.getenv("MICROCODE_ENV", "prod")),
+        "--env",
+        help="Set MODAIC_ENV.",
+    ),
+    offline: bool = typer.Option(
+        False, "--offline", help="Load the program from the local cache only."
+    ),
+    trace: bool = typer.Option(
+        os.getenv("MICROCODE_TRACE") == "1",
+        "--trace/--no-trace",
+        help="Record LM calls, tool calls and RLM iterations to local NDJSON trace files.",
+    ),
+) -> None:
+    """
+    Run a daemon that keeps agents warm for `microcode task`.
+
+    Tasks run in the client's working directory. Agents are kept per
+    directory, and --mcp servers are started again for each directory.
+    """
+    if env:
+        os.environ["MODAIC_ENV"] = env
+    set_trace_env(trace)
+    openrouter_key = load_openrouter_key()
+    if openrouter_key and not os.getenv("OPENROUTER_API_KEY"):
+        os.environ["OPENROUTER_API_KEY"] = openrouter_key
+
+    mcp_servers = {}
+    for spec in mcp or []:
+        name, sep, server_cmd = spec.partition("=")
+        if not sep or not name or not server_cmd:
+            click.echo(f"{RED}⏺ Invalid --mcp value '{spec}', expected name=command{RESET}")
+            raise typer.Exit(2)
+        mcp_servers[name] = {"server": load_mcp_command(server_cmd), "command": server_cmd, "tools": []}
+
+    try:
+        server = MicrocodeDaemon(
+            socket_path,
+            build_agent=lambda config: load_agent(config, offline=offline),
+            mcp_servers=mcp_servers,
+            register_mcp_server=register_mcp_server,
+            max_agents=max_agents,
+            load_mcp_server=load_mcp_command,
+        )
+    except RuntimeError as err:
+        click.echo(f"{RED}⏺ {err}{RESET}")
+        raise typer.Exit(1)
+
+    click.echo(f"{GREEN}⏺ microcode daemon listening on {server.server_address}{RESET}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@app.command("model-bench")
+def model_bench(
+    models: list[str] = typer.Argument(
+        None, help="Model IDs or numbers from the model list (default: all available models)."
+    ),
+    api_base: str | None = typer.Option(
+        None, "--api-base", help="API base URL, e.g. a `microcode dev stub-server` (default: MICROCODE_API_BASE)."
+    ),
+    repeat: int = typer.Option(1, "--repeat", min=1, help="Rounds over the probe prompt set."),
+    concurrency: int = typer.Option(
+        MODEL_BENCH_CONCURRENCY, "--concurrency", "-j", min=1, help="Requests in flight at once."
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Print the results as JSON."),
+) -> None:
+    """
+    Probe models for TTFT, tokens/sec, end-to-end latency and error rate.
+
+    Results are cached and shown as columns in the /model picker; `/model
+    bench` runs the same probe from the interactive CLI.
+    """
+    openrouter_key = load_openrouter_key()
+    if openrouter_key and not os.getenv("OPENROUTER_API_KEY"):
+        os.environ["OPENROUTER_API_KEY"] = openrouter_key
+
+    results = run_bench_command(
+        models or [],
+        api_base=api_base or os.getenv("MICROCODE_API_BASE"),
+        repeat=repeat,
+        concurrency=concurrency,
+        echo=not as_json,
+    )
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+
+
+dev_app = typer.Typer(help="Developer tools for testing microcode without a network.")
+app.add_typer(dev_app, name="dev")
+
+
+@dev_app.command("stub-server")
+def run_stub_server(
+    host: str = typer.Option("127.0.0.1", "--host", help="Interface to listen on."),
+    port: int = typer.Option(8765, "--port", min=0, help="Port to listen on (0 picks a free one)."),
+    script: str | None = typer.Option(
+        None,
+        "--script",
+        help="JSONL of scripted replies (strings or {\"content\", \"match\"} objects); echoes the prompt without it.",
+    ),
+    ttft: float = typer.Option(0.0, "--ttft", min=0.0, help="Seconds before the first token."),
+    tokens_per_sec: float = typer.Option(
+        0.0, "--tokens-per-sec", min=0.0, help="Generation speed in tokens per second (0 for instant)."
+    ),
+    error_rate: float = typer.Option(
+        0.0, "--error-rate", min=0.0, max=1.0, help="Fraction of requests answered with HTTP 500."
+    ),
+    rate_limit_rate: float = typer.Option(
+        0.0, "--rate-limit-rate", min=0.0, max=1.0, help="Fraction of requests answered with HTTP 429."
+    ),
+    rpm: int = typer.Option(0, "--rpm", min=0, help="Requests allowed per minute before 429 (0 for unlimited)."),
+    seed: int | None = typer.Option(None, "--seed", help="Seed for error and 429 injection."),
+) -> None:
+    """
+    Serve an OpenRouter-compatible chat completions API locally, for load tests without a network.
+
+    Point microcode at it with --api-base (for example with batch, serve,
+    --hedge or the HTTP pool) and any API key.
+    """
+    try:
+        server = StubServer(
+            (host, port),
+            script=load_script(script) if script else None,
+            ttft=ttft,
+            tokens_per_sec=tokens_per_sec,
+            error_rate=error_rate,
+            rate_limit_rate=rate_limit_rate,
+            rpm=rpm,
+            seed=seed,
+        )
+    except (OSError, ValueError) as err:
+        click.echo(f"{RED}⏺ {err}{RESET}")
+        raise typer.Exit(1)
+
+    click.echo(f"{GREEN}⏺ Stub server listening, use --api-base {server.api_base}{RESET}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        click.echo(f"{DIM}{format_stub_counts(server.counts)}{RESET}")
+
+
+@app.command("traces")
+def show_traces(
+    top: int = typer.Option(10, "--top", min=0, help="Number of slowest spans to list."),
+    kind: str | None = typer.Option(
+        None, "--kind", help="Only spans of this kind (turn, iteration, lm, sub_lm, tool)."
+    ),
+    session: str | None = typer.Option(None, "--session", help="Only spans from this session ID."),
+    as_json: bool = typer.Option(False, "--json", help="Print the summary as JSON."),
+) -> None:
+    """
+    Summarize local trace files recorded with --trace: time per span kind and the slowest spans.
+    """
+    summary = summarize_spans(list(read_spans(kind=kind, session=session)), top=top)
+    if as_json:
+        click.echo(json.dumps(summary))
+        return
+    for line in format_trace_summary(summary):
+        click.echo(line)
 
 
 @app.callback(invoke_without_command=True)
@@ -452,8 +1331,76 @@ def cli(
         "--env",
         help="Set MODAIC_ENV.",
     ),
+    offline: bool = typer.Option(
+        False, "--offline", help="Load the program from the local cache only."
+    ),
     history_limit: int = typer.Option(
-        DEFAULT_HISTORY_LIMIT, "--max-turns", min=1, max=25, help="History size."
+        DEFAULT_HISTORY_LIMIT,
+        "--max-turns",
+        min=1,
+        max=25,
+        help="Maximum history turns kept within the token budget.",
+    ),
+    history_tokens: int | None = typer.Option(
+        None,
+        "--history-tokens",
+        min=1,
+        help="Token budget for history (default: a share of the model context).",
+    ),
+    resume: str | None = typer.Option(
+        None,
+        "--resume",
+        help="Resume a saved session by ID (or 'last').",
+    ),
+    prompt_layout: Literal["cache", "legacy"] = typer.Option(
+        os.getenv("MICROCODE_PROMPT_LAYOUT", DEFAULT_PROMPT_LAYOUT),
+        "--prompt-layout",
+        help="Task layout: 'cache' puts stable context first for provider prompt caching.",
+    ),
+    hedge: bool = typer.Option(
+        False, "--hedge", help="Send a second request when an LM call outlasts its p95 latency."
+    ),
+    fallback: list[str] | None = typer.Option(
+        None,
+        "--fallback",
+        help="Fallback model ID or menu number, tried in order (repeatable, 'auto' for all).",
+    ),
+    trace: bool = typer.Option(
+        os.getenv("MICROCODE_TRACE") == "1",
+        "--trace/--no-trace",
+        help="Record LM calls, tool calls and RLM iterations to local NDJSON trace files.",
+    ),
+    record: str | None = typer.Option(
+        None, "--record", help="Record every LM response and MCP tool result to a cassette file."
+    ),
+    replay: str | None = typer.Option(
+        None, "--replay", help="Answer LM and MCP tool calls from a recorded cassette, offline."
+    ),
+    replay_latency: str | None = typer.Option(
+        None,
+        "--replay-latency",
+        help="Delay for replayed calls: 'recorded' or seconds (default: none).",
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Write a Chrome trace of load, context, LM, tool and render time (see chrome://tracing).",
+    ),
+    profile_sample_ms: int | None = typer.Option(
+        None,
+        "--profile-sample-ms",
+        min=1,
+        help="Also sample Python stacks every N ms into a folded-stack file (implies --profile).",
+    ),
+    route: Literal["auto", "direct", "rlm"] = typer.Option(
+        os.getenv("MICROCODE_ROUTE", "auto"),
+        "--route",
+        help="'auto' answers simple questions with one LM call and sends the rest to the RLM; 'direct' or 'rlm' forces a path.",
+    ),
+    route_lm: bool = typer.Option(
+        os.getenv("MICROCODE_ROUTE_LM") == "1",
+        "--route-lm",
+        help="Ask the sub_lm to route tasks the local heuristics cannot place.",
     ),
     no_banner: bool = typer.Option(
         False, "--no-banner", help="Disable the startup banner."
@@ -480,8 +1427,22 @@ def cli(
         wandb_project: Set Weights & Biases project name
         wandb_key: Set Weights & Biases API key
         env: Set the environment (dev or prod)
-        history_limit: History size limit
+        history_limit: Maximum history turns kept within the token budget
+        history_tokens: Token budget for conversation history
+        prompt_layout: Task layout ("cache" or "legacy")
+        resume: Session ID (or "last") to resume
+        hedge: Hedge slow LM requests
+        fallback: Fallback models for hedged and failed LM requests
+        trace: Record spans to local trace files
+        record: Cassette file to record LM and tool calls to
+        replay: Cassette file to replay LM and tool calls from
+        replay_latency: Delay for replayed calls
+        profile: Write a Chrome trace of each session
+        profile_sample_ms: Stack sampling interval for the profiler
+        route: Task routing mode ("auto", "direct" or "rlm")
+        route_lm: Ask the sub_lm when routing heuristics are undecided
         no_banner: Disable the startup banner
+        offline: Load the program from the local cache only
     """
     if ctx.invoked_subcommand is not None:
         return
@@ -509,6 +1470,15 @@ def cli(
         os.environ["WANDB_API_KEY"] = wandb_key
     if no_banner:
         os.environ["MICROCODE_NO_BANNER"] = "1"
+    if offline:
+        os.environ["MICROCODE_OFFLINE"] = "1"
+    if prompt_layout:
+        os.environ["MICROCODE_PROMPT_LAYOUT"] = prompt_layout
+    set_hedge_env(hedge, fallback)
+    set_trace_env(trace)
+    set_cassette_env(record, replay, replay_latency)
+    set_profile_env(profile, profile_sample_ms)
+    set_route_env(route, route_lm)
 
     show_banner = not no_banner
 
@@ -527,16 +1497,14 @@ def cli(
         track_trace=track_trace,
         wandb_project=wandb_project,
         wandb_key=wandb_key,
+        offline=offline,
+        history_tokens=history_tokens,
+        prompt_layout=prompt_layout,
+        resume=resume,
     )
 
 
 def main() -> None:
-    # Clear modaic cache on startup
-    modaic_cache = os.path.expanduser("~/.cache/modaic")
-    if os.path.exists(modaic_cache):
-        if os.getenv("MODAIC_ENV") == "dev":
-            click.echo("Resetting Modaic Cache...")
-        shutil.rmtree(modaic_cache)
     app()
 
 
@@ -0,0 +1,81 @@
+import io
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.batch import completed_ids, read_tasks, run_batch, trim_partial_line  # noqa: E402
+
+
+class FakeAnswer:
+    def __init__(self, answer):
+        self.answer = answer
+
+
+def test_read_tasks_accepts_strings_and_objects():
+    tasks = read_tasks(
+        ['"first"', "", '{"id": "b", "prompt": "second", "lm": "openai/gpt-5.2"}']
+    )
+    assert tasks == [
+        {"id": "1", "task": "first"},
+        {"id": "b", "task": "second", "lm": "openrouter/openai/gpt-5.2"},
+    ]
+    with pytest.raises(ValueError):
+        read_tasks(['{"id": 1}'])
+
+
+def test_run_batch_shares_agents_and_bounds_concurrency():
+    builds = []
+    running = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def build_agent(config):
+        builds.append(config["lm"])
+
+        def agent(task):
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.02)
+            with lock:
+                running["now"] -= 1
+            if task == "boom":
+                raise RuntimeError("failed")
+            return FakeAnswer(task.upper())
+
+        return agent
+
+    tasks = read_tasks([json.dumps(f"task {n}") for n in range(10)] + ['"boom"'])
+    tasks.append({"id": "other", "task": "x", "lm": "openrouter/qwen/qwen3-coder"})
+    output = io.StringIO()
+
+    counts = run_batch(tasks, {"lm": "openrouter/openai/gpt-5.2"}, build_agent, output, 3)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert counts == {"ok": 11, "failed": 1}
+    assert sorted(builds) == ["openrouter/openai/gpt-5.2", "openrouter/qwen/qwen3-coder"]
+    assert running["max"] <= 3
+    by_id = {record["id"]: record for record in records}
+    assert by_id["1"]["answer"] == "TASK 0"
+    assert "RuntimeError" in by_id["11"]["error"]
+    assert by_id["other"]["lm"] == "openrouter/qwen/qwen3-coder"
+    assert all("seconds" in record for record in records)
+
+
+def test_resume_skips_succeeded_tasks(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text(
+        json.dumps({"id": "1", "answer": "ok"})
+        + "\n"
+        + json.dumps({"id": "2", "error": "x"})
+        + '\n{"id": "3", "ans'
+    )
+    trim_partial_line(str(path))
+    assert path.read_text().endswith('"error": "x"}\n')
+    assert completed_ids(str(path)) == {"1"}
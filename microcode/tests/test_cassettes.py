@@ -0,0 +1,184 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import cassettes
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.echo(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0)))))
+
+    def echo(self, request):
+        prompt = request["messages"][-1]["content"]
+        body = json.dumps(
+            {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": request["model"],
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": f"echo {prompt}"}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+def _use(monkeypatch, **env):
+    for name in ("MICROCODE_RECORD", "MICROCODE_REPLAY", "MICROCODE_REPLAY_LATENCY"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(cassettes, "_CASSETTE", None)
+
+
+def test_record_then_replay_lm_and_tool_calls_offline(monkeypatch, tmp_path):
+    dspy = pytest.importorskip("dspy")
+    path = str(tmp_path / "session.cassette")
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{httpd.server_address[1]}/api/v1"
+    calls = []
+
+    def read_file(path: str) -> dict:
+        """Read a file."""
+        calls.append(path)
+        return {"path": path, "text": "hello"}
+
+    def build(role):
+        lm = dspy.LM("openrouter/test-model", api_base=api_base, api_key="key", cache=False)
+        cassettes.enable_cassette(lm, role)
+        return lm
+
+    _use(monkeypatch, MICROCODE_RECORD=path)
+    try:
+        lm, sub_lm = build("lm"), build("sub_lm")
+        tool = cassettes.cassette_tool(read_file, "fs_read_file")
+        prompt = f"plan at {time.time()}"
+        assert lm(prompt) == [f"echo {prompt}"]
+        assert sub_lm("summarize") == ["echo summarize"]
+        assert tool("a.txt") == {"path": "a.txt", "text": "hello"}
+        cassettes.get_cassette().close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    entries = [json.loads(line) for line in Path(path).read_text().splitlines()]
+    assert [(entry["kind"], entry["group"]) for entry in entries] == [
+        ("lm", "lm"),
+        ("lm", "sub_lm"),
+        ("tool", "fs_read_file"),
+    ]
+
+    # The server is gone: every call below is answered from the cassette.
+    _use(monkeypatch, MICROCODE_REPLAY=path, MICROCODE_REPLAY_LATENCY="0.05")
+    lm, sub_lm = build("lm"), build("sub_lm")
+    tool = cassettes.cassette_tool(read_file, "fs_read_file")
+    started = time.perf_counter()
+    assert sub_lm("summarize") == ["echo summarize"]
+    assert time.perf_counter() - started >= 0.05
+    # The main prompt changed (a new timestamp), so it is matched by order within its role.
+    assert lm(f"plan at {time.time()}")[0].startswith("echo plan at ")
+    assert lm.history[-1]["usage"]["total_tokens"] == 5
+    assert tool("a.txt") == {"path": "a.txt", "text": "hello"}
+    assert calls == ["a.txt"]
+
+    cassette = cassettes.get_cassette()
+    assert (cassette.counts["matched"], cassette.counts["sequential"]) == (2, 1)
+    with pytest.raises(cassettes.CassetteMiss):
+        sub_lm("one more")
+
+
+def test_no_cassette_leaves_lm_alone(monkeypatch):
+    _use(monkeypatch)
+
+    class FakeLM:
+        model = "openrouter/test-model"
+
+        def forward(self, **kwargs):
+            return None
+
+        async def aforward(self, **kwargs):
+            return None
+
+    lm = FakeLM()
+    forward = lm.forward
+    cassettes.enable_cassette(lm, "lm")
+    assert lm.forward == forward
+    assert cassettes.get_cassette() is None
+
+
+def test_fallback_records_and_replays_under_its_own_model(monkeypatch, tmp_path):
+    dspy = pytest.importorskip("dspy")
+    from utils.models import wrap_program_lms
+
+    path = str(tmp_path / "fallback.cassette")
+    models = []
+
+    class FailingPrimary(_StandIn):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            models.append(request["model"])
+            if request["model"] == "test/primary":
+                body = b'{"error": {"message": "upstream down", "code": 500}}'
+                self.send_response(500)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.echo(request)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FailingPrimary)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{httpd.server_address[1]}/api/v1"
+
+    class Program:
+        def __init__(self):
+            self.lm = dspy.LM("openrouter/test/primary", api_base=api_base, api_key="key", cache=False, num_retries=0)
+            self.sub_lm = None
+
+    monkeypatch.setenv("MICROCODE_FALLBACK_MODELS", "openrouter/test/fallback")
+    monkeypatch.setenv("MICROCODE_HEDGE_DELAY", "30")
+    _use(monkeypatch, MICROCODE_RECORD=path)
+    try:
+        program = Program()
+        wrap_program_lms(program)
+        assert program.lm("hello") == ["echo hello"]
+        cassettes.get_cassette().close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert models == ["test/primary", "test/fallback"]
+    entries = [json.loads(line) for line in Path(path).read_text().splitlines()]
+    assert [(entry["group"], entry["model"], bool(entry.get("error"))) for entry in entries] == [
+        ("lm", "openrouter/test/primary", True),
+        ("lm@openrouter/test/fallback", "openrouter/test/fallback", False),
+    ]
+
+    _use(monkeypatch, MICROCODE_REPLAY=path)
+    program = Program()
+    wrap_program_lms(program)
+    assert program.lm("hello") == ["echo hello"]
+    assert cassettes.get_cassette().counts["matched"] == 2
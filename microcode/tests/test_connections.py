@@ -0,0 +1,123 @@
+import asyncio
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import connections
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "test-model",
+    "choices": [
+        {"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}
+    ],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+}
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, body: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply(b"")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(json.dumps(COMPLETION).encode("utf-8"))
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/api/v1"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_pool_reuses_warm_connection(server):
+    pool = connections.HttpPool(http2=False)
+    pool.warm(server).join(timeout=5)
+    for _ in range(3):
+        assert pool.client.post(server + "/chat/completions", json={}).status_code == 200
+
+    stats = pool.stats()
+    assert (stats["requests"], stats["connections"], stats["handshakes"]) == (4, 1, 0)
+    assert stats["reuse_rate"] == 0.75
+    assert "4 requests over 1 connections" in connections.format_pool_stats(stats)
+
+
+def test_litellm_calls_go_through_installed_pool(monkeypatch, server):
+    litellm = pytest.importorskip("litellm")
+    from litellm.llms.custom_httpx import llm_http_handler
+
+    monkeypatch.setattr(llm_http_handler, "_get_httpx_client", llm_http_handler._get_httpx_client)
+    monkeypatch.setattr(
+        llm_http_handler, "get_async_httpx_client", llm_http_handler.get_async_httpx_client
+    )
+    monkeypatch.setattr(litellm, "client_session", None)
+    monkeypatch.setattr(connections, "_INSTALLED", None)
+
+    pool = connections.HttpPool(http2=False)
+    connections.install_http_pool(pool)
+    request = {
+        "model": "openrouter/test-model",
+        "messages": [{"role": "user", "content": "ping"}],
+        "api_base": server,
+        "api_key": "test-key",
+    }
+    for _ in range(2):
+        assert litellm.completion(**request).choices[0].message.content == "pong"
+
+    async def run_async():
+        for _ in range(2):
+            response = await litellm.acompletion(**request)
+            assert response.choices[0].message.content == "pong"
+
+    asyncio.run(run_async())
+
+    stats = pool.stats()
+    assert stats["requests"] == 4
+    assert stats["connections"] == 2  # one sync, one for the event loop
+
+
+def test_install_skips_missing_litellm_getters(monkeypatch):
+    litellm = pytest.importorskip("litellm")
+    from litellm.llms.custom_httpx import llm_http_handler
+
+    monkeypatch.delattr(llm_http_handler, "_get_httpx_client")
+    monkeypatch.setattr(
+        llm_http_handler, "get_async_httpx_client", llm_http_handler.get_async_httpx_client
+    )
+    monkeypatch.setattr(litellm, "client_session", None)
+    monkeypatch.setattr(connections, "_INSTALLED", None)
+
+    pool = connections.HttpPool(http2=False)
+    connections.install_http_pool(pool)
+    assert not hasattr(llm_http_handler, "_get_httpx_client")
+    assert litellm.client_session is pool.client
+
+    async def async_client():
+        return llm_http_handler.get_async_httpx_client(None).client is pool.async_client()
+
+    assert asyncio.run(async_client())
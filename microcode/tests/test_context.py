@@ -0,0 +1,202 @@
+import importlib
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.context import ConversationContext  # noqa: E402
+
+NOW = datetime(2026, 1, 2, 3, 4, 5)
+
+
+def _legacy_render(task, cwd, history, history_limit, paste_store):
+    context_lines = [
+        f"cwd: {cwd}",
+        f"time: {NOW.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Current Task: {task}",
+        "Previous Conversation History:",
+    ]
+    if history:
+        for h in history[-history_limit:]:
+            context_lines.append(f"  User: {h['user']}")
+            context_lines.append(f"  Assistant: {h['assistant']}")
+    else:
+        context_lines.append("  None")
+
+    context_lines.append("All Pasted Content:")
+    if paste_store:
+        for paste_id in paste_store:
+            context_lines.append(f"[{paste_id}]")
+        context_lines.append(str(paste_store))
+    else:
+        context_lines.append("  None")
+    return "\n".join(context_lines) + "\n"
+
+
+def _history_section(rendered, marker):
+    return rendered.split(marker, 1)[0]
+
+
+def test_render_matches_legacy_history_layout_as_window_slides():
+    context = ConversationContext(history_limit=3, layout="legacy")
+    history = []
+
+    assert context.render("first", "/repo", NOW) == _legacy_render(
+        "first", "/repo", history, 3, {}
+    ).replace("All Pasted Content:", "Pasted Content:")
+
+    for turn in range(6):
+        context.add_turn(f"question {turn}", f"answer {turn}")
+        history.append({"user": f"question {turn}", "assistant": f"answer {turn}"})
+
+        assert _history_section(
+            context.render("next", "/repo", NOW), "Pasted Content:"
+        ) == _history_section(
+            _legacy_render("next", "/repo", history, 3, {}), "All Pasted Content:"
+        )
+
+    assert [turn["user"] for turn in context.turns] == [
+        "question 3",
+        "question 4",
+        "question 5",
+    ]
+
+
+def test_cache_layout_keeps_prefix_stable_across_turns():
+    context = ConversationContext(history_limit=5)
+    context.add_turn("q0", "a0")
+    first = context.render("first task", "/repo", NOW)
+    assert first.endswith(f"time: {NOW.strftime('%Y-%m-%d %H:%M:%S')}\nCurrent Task: first task\n")
+
+    context.add_turn("first task", "a1")
+    later = datetime(2026, 1, 2, 3, 9, 0)
+    second = context.render("second task", "/repo", later)
+
+    shared = "cwd: /repo\nPrevious Conversation History:\n  User: q0\n  Assistant: a0\n"
+    assert first.startswith(shared)
+    assert second.startswith(shared + "  User: first task\n")
+    assert second.index("Pasted Content:") < second.index("time:") < second.index("Current Task:")
+
+
+def test_only_referenced_pastes_are_included():
+    context = ConversationContext(history_limit=1)
+    first = context.pastes.add("first log\n" * 10)
+    second = context.pastes.add("second log\n" * 10)
+    assert context.pastes.add("first log\n" * 10) == first
+    assert len(context.pastes) == 2
+
+    rendered = context.render(f"look at [{second}]", "/repo", NOW)
+    assert "second log" in rendered
+    assert "first log" not in rendered
+    assert f"[{first}] 10 lines, 100 B (not referenced)" in rendered
+
+    context.add_turn(f"summarize [{first}]", "done")
+    rendered = context.render("and now?", "/repo", NOW)
+    assert "first log" in rendered
+    assert "second log" not in rendered
+
+    context.add_turn("unrelated", "ok")
+    rendered = context.render("and now?", "/repo", NOW)
+    assert "first log" not in rendered
+
+
+def test_clear_history_keeps_pastes():
+    context = ConversationContext(history_limit=2)
+    paste_id = context.pastes.add("data")
+    context.add_turn("q", "a")
+    context.clear_history()
+
+    rendered = context.render(f"task [{paste_id}]", "/repo", NOW)
+    assert "Previous Conversation History:\n  None\n" in rendered
+    assert "[paste_1]:\ndata\n" in rendered
+    assert context.turns == []
+
+
+def test_token_budget_keeps_newest_turns():
+    context = ConversationContext(history_limit=25, token_budget=100, model="openai/gpt-5.2")
+    for turn in range(10):
+        context.add_turn(f"q{turn}", "a" * 100)
+
+    kept = [turn["user"] for turn in context.turns]
+    assert kept == ["q7", "q8", "q9"]
+    assert context.history_tokens <= 100
+
+    context.set_token_budget(60)
+    assert [turn["user"] for turn in context.turns] == ["q9"]
+
+
+def test_oversized_turn_is_truncated_to_budget():
+    context = ConversationContext(history_limit=5, token_budget=50, model="openai/gpt-5.2")
+    context.add_turn("q", "x" * 10000)
+
+    assert context.history_tokens <= 50
+    assert "[truncated" in context.render("next", "/repo", NOW)
+    assert context.turns[0]["assistant"] == "x" * 10000
+
+
+def test_calibration_moves_ratio_towards_observed_usage(monkeypatch):
+    tokens = importlib.import_module("utils.tokens")
+    monkeypatch.setattr(tokens, "_CALIBRATION", {})
+    monkeypatch.setattr(tokens, "save_token_calibration", lambda _calibration: None)
+
+    assert tokens.chars_per_token("openrouter/anthropic/claude-opus-4.5") == 3.5
+    tokens.calibrate_from_entries(
+        [
+            {
+                "model": "openrouter/anthropic/claude-opus-4.5",
+                "messages": [{"role": "user", "content": "y" * 3000}],
+                "usage": {"prompt_tokens": 1000},
+            }
+        ]
+    )
+    assert 3.0 < tokens.chars_per_token("anthropic/claude-opus-4.5") < 3.5
+    assert tokens.estimate_tokens("z" * 300, "anthropic/claude-opus-4.5") > 85
+
+
+def test_cache_hits_and_breakpoints():
+    usage = importlib.import_module("utils.usage")
+
+    entries = [
+        {"usage": {"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 800}}},
+        {"usage": {"prompt_tokens": 500, "cache_read_input_tokens": 400}},
+        {"usage": {}},
+    ]
+    assert usage.cached_prompt_tokens(entries) == (1200, 1500)
+
+    class FakeLM:
+        def __init__(self, model):
+            self.model = model
+            self.kwargs = {}
+            self.sent = []
+
+        def forward(self, prompt=None, messages=None, **kwargs):
+            self.sent.append(messages)
+
+        async def aforward(self, prompt=None, messages=None, **kwargs):
+            self.sent.append(messages)
+
+    claude = FakeLM("openrouter/anthropic/claude-opus-4.5")
+    gpt = FakeLM("openrouter/openai/gpt-5.2")
+    assert usage.enable_prompt_caching(claude)
+    assert claude.kwargs["cache_control_injection_points"] == [
+        {"location": "message", "role": "system"}
+    ]
+    assert not usage.enable_prompt_caching(gpt)
+    assert gpt.kwargs == {}
+
+    # The stable head of the rendered task gets its own breakpoint; the stamp and task follow uncached.
+    context = ConversationContext(history_limit=5)
+    context.add_turn("first", "answer")
+    task = context.render("next", "/repo", now=datetime(2026, 1, 1, 9, 0, 0))
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": f"[[ ## task ## ]]\n{task}"}]
+    claude.forward(messages=messages)
+    head, tail = claude.sent[0][1]["content"]
+    assert head["cache_control"] == {"type": "ephemeral"}
+    assert head["text"].startswith("[[ ## task ## ]]\ncwd: /repo\n") and "User: first" in head["text"]
+    assert tail == {"type": "text", "text": "time: 2026-01-01 09:00:00\nCurrent Task: next\n"}
+    assert claude.sent[0][0] == messages[0] and isinstance(messages[1]["content"], str)
+
+    gpt.forward(messages=messages)
+    assert gpt.sent == [messages]
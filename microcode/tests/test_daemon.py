@@ -0,0 +1,217 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.daemon import MicrocodeDaemon, daemon_available, request_task  # noqa: E402
+
+
+@pytest.fixture
+def socket_path():
+    # AF_UNIX paths are length limited, so avoid pytest's deep tmp_path.
+    with tempfile.TemporaryDirectory(prefix="mc-") as tmp_dir:
+        yield str(Path(tmp_dir) / "daemon.sock")
+
+
+def _start_daemon(socket_path, built, registered):
+    def build_agent(config):
+        built.append(config)
+        return lambda task: SimpleNamespace(answer=f"{config['lm']}:{task}")
+
+    def register(agent, name, server):
+        registered.append(name)
+        return [f"{name}_tool"]
+
+    server = MicrocodeDaemon(
+        socket_path,
+        build_agent=build_agent,
+        mcp_servers={"fs": {"server": object(), "tools": []}},
+        register_mcp_server=register,
+        max_agents=1,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def test_request_task_returns_none_without_daemon(socket_path):
+    assert request_task("hello", {"lm": "m"}, socket_path=socket_path) is None
+    assert not daemon_available(socket_path)
+
+
+def test_daemon_reuses_warm_agents(socket_path):
+    built, registered = [], []
+    server, thread = _start_daemon(socket_path, built, registered)
+    try:
+        events = []
+        assert request_task("a", {"lm": "m1"}, socket_path, events.append) == "m1:a"
+        assert request_task("b", {"lm": "m1"}, socket_path) == "m1:b"
+        assert [event["event"] for event in events] == ["status", "answer"]
+        assert events[-1]["stats"]["lm_calls"] == 0
+        assert built == [{"lm": "m1"}]
+        assert registered == ["fs"]
+
+        assert request_task("c", {"lm": "m2"}, socket_path) == "m2:c"
+        assert request_task("d", {"lm": "m1"}, socket_path) == "m1:d"
+        assert len(built) == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+    assert not Path(socket_path).exists()
+
+
+def test_daemon_reports_agent_errors(socket_path):
+    def build_agent(_config):
+        def agent(task):
+            raise ValueError("boom")
+
+        return agent
+
+    server = MicrocodeDaemon(socket_path, build_agent=build_agent)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(RuntimeError, match="boom"):
+            request_task("a", {"lm": "m"}, socket_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+
+def test_daemon_runs_tasks_in_the_client_directory(socket_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    repo_a, repo_b = tmp_path / "a", tmp_path / "b"
+    repo_a.mkdir()
+    repo_b.mkdir()
+    built, registered, started = [], [], []
+
+    def build_agent(config):
+        built.append(os.getcwd())
+        return lambda task: SimpleNamespace(answer=f"{os.getcwd()}:{task}")
+
+    def load_mcp_server(command):
+        started.append((command, os.getcwd()))
+        return object()
+
+    server = MicrocodeDaemon(
+        socket_path,
+        build_agent=build_agent,
+        mcp_servers={"fs": {"server": object(), "command": "fs-server .", "tools": []}},
+        register_mcp_server=lambda agent, name, _server: registered.append(name) or [f"{name}_tool"],
+        load_mcp_server=load_mcp_server,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert request_task("x", {"lm": "m"}, socket_path, cwd=str(repo_a)) == f"{repo_a}:x"
+        assert request_task("y", {"lm": "m"}, socket_path, cwd=str(repo_b)) == f"{repo_b}:y"
+        assert request_task("z", {"lm": "m"}, socket_path, cwd=str(repo_a)) == f"{repo_a}:z"
+        assert built == [str(repo_a), str(repo_b)]
+        assert started == [("fs-server .", str(repo_a)), ("fs-server .", str(repo_b))]
+        assert registered == ["fs", "fs"]
+
+        with pytest.raises(RuntimeError, match="not a directory"):
+            request_task("w", {"lm": "m"}, socket_path, cwd=str(tmp_path / "missing"))
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+
+def test_daemon_routes_tasks_when_asked(socket_path, tmp_path, monkeypatch):
+    pytest.importorskip("dspy")
+    from utils import cache
+
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "ROUTE_BASELINE_PATH", str(tmp_path / "route_baseline.json"))
+    rlm_tasks = []
+
+    class Agent:
+        lm = staticmethod(lambda messages=None: ["Use `--verbose`."])
+        sub_lm = None
+
+        def __call__(self, task):
+            rlm_tasks.append(task)
+            return SimpleNamespace(answer="from the rlm")
+
+    server = MicrocodeDaemon(socket_path, build_agent=lambda config: Agent())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        events = []
+        assert request_task("what does -v do?", {"lm": "m"}, socket_path, events.append, route="direct") == (
+            "Use `--verbose`."
+        )
+        assert events[-1]["stats"]["route"] == "direct"
+        assert events[-1]["decision"]["reason"] == "forced"
+        assert request_task("what does -v do?", {"lm": "m"}, socket_path, route="rlm") == "from the rlm"
+        assert request_task("what does -v do?", {"lm": "m"}, socket_path) == "from the rlm"
+        assert len(rlm_tasks) == 2
+        assert len(cache.load_route_baseline()) == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+
+def test_daemon_closes_evicted_servers_and_starts_one_set_per_directory(socket_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    repo_a, repo_b = tmp_path / "a", tmp_path / "b"
+    repo_a.mkdir()
+    repo_b.mkdir()
+    started, closed = [], []
+
+    class Server:
+        def __init__(self, cwd):
+            self.cwd = cwd
+
+        def close(self):
+            closed.append(self.cwd)
+
+    def load_mcp_server(command):
+        started.append(os.getcwd())
+        time.sleep(0.05)
+        return Server(os.getcwd())
+
+    server = MicrocodeDaemon(
+        socket_path,
+        build_agent=lambda config: lambda task: SimpleNamespace(answer=f"{config['lm']}:{task}"),
+        mcp_servers={"fs": {"server": Server("home"), "command": "fs-server .", "tools": []}},
+        register_mcp_server=lambda agent, name, _server: [f"{name}_tool"],
+        max_agents=2,
+        load_mcp_server=load_mcp_server,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        clients = [
+            threading.Thread(target=request_task, args=("x", {"lm": lm}, socket_path), kwargs={"cwd": str(repo_a)})
+            for lm in ("m1", "m2")
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join(timeout=5)
+        assert started == [str(repo_a)]
+
+        assert request_task("y", {"lm": "m1"}, socket_path, cwd=str(repo_b)) == "m1:y"
+        assert closed == []
+        assert request_task("z", {"lm": "m2"}, socket_path, cwd=str(repo_b)) == "m2:z"
+        assert closed == [str(repo_a)]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+    assert closed == [str(repo_a), str(repo_b)]
@@ -0,0 +1,129 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import hedging
+
+
+class FakeLM:
+    """
+    Stand-in for dspy.LM whose latency and failures are set per model.
+    """
+
+    def __init__(self, model, behaviour):
+        self.model = model
+        self.behaviour = behaviour
+        self.cancelled = []
+
+    def copy(self, model):
+        return FakeLM(model, self.behaviour)
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        # Each configured behaviour applies to the first call only.
+        delay, error = self.behaviour.pop(self.model, (0, None))
+        time.sleep(delay)
+        if error:
+            raise error
+        return f"{self.model}:{prompt}"
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        delay, error = self.behaviour.pop(self.model, (0, None))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(self.model)
+            raise
+        if error:
+            raise error
+        return f"{self.model}:{prompt}"
+
+
+def _hedged(monkeypatch, behaviour, chain="openrouter/b", model="openrouter/a"):
+    monkeypatch.setenv("MICROCODE_HEDGE", "1")
+    monkeypatch.setenv("MICROCODE_HEDGE_DELAY", "0.05")
+    monkeypatch.setenv("MICROCODE_FALLBACK_MODELS", chain)
+    lm = FakeLM(model, behaviour)
+    hedging.enable_hedging(lm)
+    return lm
+
+
+def test_slow_primary_is_hedged_to_next_model(monkeypatch):
+    lm = _hedged(monkeypatch, {"openrouter/a": (1.0, None)})
+    before = hedging.hedge_counts()
+
+    started = time.monotonic()
+    assert lm.forward(prompt="q") == "openrouter/b:q"
+    assert time.monotonic() - started < 0.5
+
+    after = hedging.hedge_counts()
+    assert after["hedges"] - before["hedges"] == 1
+    assert after["hedge_wins"] - before["hedge_wins"] == 1
+
+
+def test_async_failure_falls_back_and_loser_is_cancelled(monkeypatch):
+    lm = _hedged(monkeypatch, {"openrouter/a": (0, RuntimeError("upstream 502"))})
+    before = hedging.hedge_counts()
+    assert asyncio.run(lm.aforward(prompt="q")) == "openrouter/b:q"
+    assert hedging.hedge_counts()["fallbacks"] - before["fallbacks"] == 1
+
+    duplicate = _hedged(monkeypatch, {"openrouter/c": (1.0, None)}, chain="", model="openrouter/c")
+    assert asyncio.run(duplicate.aforward(prompt="q")) == "openrouter/c:q"
+    assert duplicate.cancelled == ["openrouter/c"]
+
+
+def test_p95_and_fallback_chain(monkeypatch):
+    for seconds in range(1, 21):
+        hedging.record_latency("openrouter/p95-test", float(seconds))
+    assert hedging.p95_latency("openrouter/p95-test") == 20.0
+    assert hedging.p95_latency("openrouter/unseen") is None
+
+    monkeypatch.setenv("MICROCODE_FALLBACK_MODELS", "5, openrouter/qwen/qwen3-coder,x/y")
+    assert hedging.fallback_chain("openrouter/openai/gpt-5.2") == [
+        "openrouter/qwen/qwen3-coder",
+        "openrouter/x/y",
+    ]
+    monkeypatch.setenv("MICROCODE_FALLBACK_MODELS", "auto")
+    assert "openrouter/openai/gpt-5.2" not in hedging.fallback_chain("openrouter/openai/gpt-5.2")
+
+
+def test_only_the_first_request_streams(monkeypatch):
+    dspy = pytest.importorskip("dspy")
+    seen = []
+
+    class StreamingLM(FakeLM):
+        def copy(self, model):
+            return StreamingLM(model, self.behaviour)
+
+        def forward(self, prompt=None, messages=None, **kwargs):
+            seen.append((self.model, dspy.settings.send_stream))
+            return super().forward(prompt=prompt, messages=messages, **kwargs)
+
+        async def aforward(self, prompt=None, messages=None, **kwargs):
+            seen.append((self.model, dspy.settings.send_stream))
+            return await super().aforward(prompt=prompt, messages=messages, **kwargs)
+
+    monkeypatch.setenv("MICROCODE_HEDGE_DELAY", "0.05")
+    monkeypatch.setenv("MICROCODE_FALLBACK_MODELS", "openrouter/b")
+    lm = StreamingLM("openrouter/a", {"openrouter/a": (0.5, None)})
+    hedging.enable_hedging(lm)
+
+    stream = object()
+    with dspy.context(send_stream=stream):
+        assert lm.forward(prompt="q") == "openrouter/b:q"
+    assert seen == [("openrouter/a", stream), ("openrouter/b", None)]
+
+    seen.clear()
+    lm.hedge_policy._fallbacks[0].behaviour["openrouter/a"] = (0.5, None)
+
+    async def run():
+        with dspy.context(send_stream=stream):
+            return await lm.aforward(prompt="q")
+
+    assert asyncio.run(run()) == "openrouter/b:q"
+    assert seen == [("openrouter/a", stream), ("openrouter/b", None)]
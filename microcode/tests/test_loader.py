@@ -0,0 +1,43 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.loader import AgentLoader  # noqa: E402
+
+
+def test_result_waits_for_background_build():
+    release = threading.Event()
+    stages = []
+
+    def build(on_stage):
+        on_stage("Loading program")
+        stages.append("started")
+        release.wait(timeout=5)
+        return "agent"
+
+    loader = AgentLoader(build)
+    try:
+        assert not loader.done()
+        release.set()
+        assert loader.result() == "agent"
+        assert loader.stage == "Loading program"
+        assert stages == ["started"]
+    finally:
+        loader.shutdown()
+
+
+def test_result_reraises_build_errors():
+    def build(_on_stage):
+        raise FileNotFoundError("no cached copy")
+
+    loader = AgentLoader(build)
+    try:
+        with pytest.raises(FileNotFoundError):
+            loader.result()
+    finally:
+        loader.shutdown()
@@ -76,10 +76,12 @@ def _run_interactive(monkeypatch, tmp_path, env_vars, cache_settings, **override
             verbose=cache_settings.get("verbose"),
         )
 
+    modaic = importlib.import_module("modaic")
+    monkeypatch.setattr(modaic.AutoProgram, "from_precompiled", fake_from_precompiled)
+    monkeypatch.setattr(microcode_main, "read_user_input", fake_read_user_input)
     monkeypatch.setattr(
-        microcode_main.AutoProgram, "from_precompiled", fake_from_precompiled
+        microcode_main, "resolve_program_path", lambda *_args, **_kwargs: "/fake"
     )
-    monkeypatch.setattr(microcode_main, "read_user_input", fake_read_user_input)
 
     microcode_main.run_interactive(**defaults)
 
@@ -197,3 +199,62 @@ def test_track_trace_and_wandb_env(monkeypatch, tmp_path):
     assert captured.get("track_trace") is True
     assert os.getenv("WANDB_PROJECT") == "proj-x"
     assert os.getenv("WANDB_API_KEY") == "key-x"
+
+
+def test_load_agent_installs_pool_and_wraps_program_lms(monkeypatch, tmp_path):
+    dspy = pytest.importorskip("dspy")
+    modaic = pytest.importorskip("modaic")
+    litellm = pytest.importorskip("litellm")
+    from litellm.llms.custom_httpx import llm_http_handler
+
+    microcode_main = importlib.import_module("main")
+    cassettes = importlib.import_module("utils.cassettes")
+    connections = importlib.import_module("utils.connections")
+    tracing = importlib.import_module("utils.tracing")
+
+    monkeypatch.setattr(llm_http_handler, "_get_httpx_client", llm_http_handler._get_httpx_client)
+    monkeypatch.setattr(
+        llm_http_handler, "get_async_httpx_client", llm_http_handler.get_async_httpx_client
+    )
+    monkeypatch.setattr(litellm, "client_session", litellm.client_session)
+    monkeypatch.setattr(connections, "_INSTALLED", None)
+    # litellm's HTTPHandler closes its client when collected, so the shared pool stays out of this test.
+    monkeypatch.setattr(connections, "_POOL", None)
+    monkeypatch.setenv("MODAIC_ENV", "dev")
+    monkeypatch.setenv("MICROCODE_FALLBACK_MODELS", "openrouter/openai/gpt-5.2")
+    monkeypatch.setenv("MICROCODE_RECORD", str(tmp_path / "load.cassette"))
+    monkeypatch.setattr(cassettes, "_CASSETTE", None)
+    monkeypatch.setenv("MICROCODE_TRACE", "1")
+    monkeypatch.setattr(tracing, "_TRACER", tracing.Tracer(str(tmp_path), flush_interval=60))
+
+    loaded = []
+
+    def fake_from_precompiled(repo, rev=None, config=None, **_kwargs):
+        loaded.append((repo, rev))
+        return SimpleNamespace(
+            config=SimpleNamespace(**config),
+            lm=dspy.LM(config["lm"], cache=False),
+            sub_lm=dspy.LM(config["sub_lm"], cache=False),
+        )
+
+    monkeypatch.setattr(modaic.AutoProgram, "from_precompiled", fake_from_precompiled)
+    monkeypatch.setattr(
+        microcode_main, "resolve_program_path", lambda _repo, rev, **_kwargs: f"/store/{rev}"
+    )
+
+    stages = []
+    agent = microcode_main.load_agent(
+        {"lm": "openrouter/anthropic/claude-opus-4.5", "sub_lm": "openrouter/test/sub"},
+        offline=True,
+        on_stage=stages.append,
+    )
+
+    assert loaded == [("/store/dev", "dev")]
+    assert stages == ["Resolving program", "Importing runtime", "Loading program"]
+    assert connections._INSTALLED is connections.get_http_pool()
+    assert agent.lm.kwargs["cache_control_injection_points"]
+    assert "cache_control_injection_points" not in agent.sub_lm.kwargs
+    for lm in (agent.lm, agent.sub_lm):
+        assert lm._cassette and lm._traced
+        assert [fallback.model for fallback in lm.hedge_policy._fallbacks] == ["openrouter/openai/gpt-5.2"]
+    cassettes.get_cassette().close()
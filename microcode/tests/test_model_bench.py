@@ -0,0 +1,78 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import cache, model_bench, models  # noqa: E402
+from utils.stub_server import StubServer  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    server = StubServer(("127.0.0.1", 0), ttft=0.05, tokens_per_sec=50, error_rate=0.25, seed=7)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_bench_against_stub_is_cached_and_shown_in_picker(stub, monkeypatch, tmp_path):
+    pytest.importorskip("textual")
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "MODEL_BENCH_PATH", str(tmp_path / "model_bench.json"))
+
+    results = models.run_bench_command(["1", "qwen/qwen3-coder"], api_base=stub.api_base, repeat=4, echo=False)
+    assert set(results) == {"openrouter/openai/gpt-5.2-codex", "openrouter/qwen/qwen3-coder"}
+    assert stub.counts["requests"] == 2 * 4 * len(model_bench.PROBE_PROMPTS)
+    assert stub.counts["streamed"] == stub.counts["ok"]
+
+    for result in results.values():
+        assert result["samples"] == 12 and result["api_base"] == stub.api_base
+        assert result["error_rate"] == result["errors"] / 12
+        assert result["ttft"] >= 0.05 and result["latency"] > result["ttft"]
+        assert 25 < result["tokens_per_sec"] < 100
+    assert sum(result["errors"] for result in results.values()) == stub.counts["errors"]
+
+    assert cache.load_model_bench(stub.api_base) == results
+    labels = {option.id: str(option.prompt) for option in models._build_model_options(api_base=stub.api_base)}
+    assert "ttft" in labels["openai/gpt-5.2-codex"] and "just now" in labels["qwen/qwen3-coder"]
+    assert labels["openai/gpt-5.2"] == "GPT-5.2 (openai/gpt-5.2)"
+
+    # Stub numbers stay out of the default OpenRouter picker and do not replace its results.
+    assert cache.load_model_bench() == {}
+    labels = {option.id: str(option.prompt) for option in models._build_model_options()}
+    assert labels["qwen/qwen3-coder"] == "Qwen 3 Coder (qwen/qwen3-coder)"
+    real = {**results["openrouter/qwen/qwen3-coder"], "api_base": None, "ttft": 0.4}
+    cache.save_model_bench({"openrouter/qwen/qwen3-coder": real})
+    assert cache.load_model_bench()["openrouter/qwen/qwen3-coder"]["ttft"] == 0.4
+    assert cache.load_model_bench(stub.api_base) == results
+
+
+def test_model_bench_reads_results_keyed_by_model_only(monkeypatch, tmp_path):
+    path = tmp_path / "model_bench.json"
+    monkeypatch.setattr(cache, "MODEL_BENCH_PATH", str(path))
+    path.write_text(
+        json.dumps(
+            {
+                "openrouter/a": {"measured_at": 1.0, "api_base": None},
+                "openrouter/b": {"measured_at": 1.0, "api_base": "http://127.0.0.1:8765/v1/"},
+            }
+        )
+    )
+    assert set(cache.load_model_bench()) == {"openrouter/a"}
+    assert set(cache.load_model_bench("http://127.0.0.1:8765/v1")) == {"openrouter/b"}
+
+
+def test_summary_and_columns_handle_all_failed_probes():
+    failed = {"ok": False, "seconds": 1.0, "ttft": None, "tokens": 0, "tokens_per_sec": None, "error": "HTTP 500"}
+    summary = model_bench.summarize_probes([failed, failed])
+    assert summary["error_rate"] == 1.0 and summary["ttft"] is None and summary["last_error"] == "HTTP 500"
+
+    columns = model_bench.format_bench_columns(summary, now=summary["measured_at"] + 7200)
+    assert columns.split() == ["-", "ttft", "-", "tok/s", "-", "e2e", "100%", "err", "2h", "ago"]
+    assert model_bench.format_bench_table({"openrouter/a": summary})[0].endswith("(HTTP 500)")
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import models  # noqa: E402
+
+
+class FakeProgram:
+    def __init__(self, config):
+        self.config = SimpleNamespace(**config)
+        self.lm = None
+        self.sub_lm = None
+
+
+@pytest.fixture
+def switch(monkeypatch, tmp_path):
+    modaic = pytest.importorskip("modaic")
+    built, registered = [], []
+
+    def from_precompiled(_repo, rev=None, config=None, **_kwargs):
+        built.append(config["lm"])
+        return FakeProgram(config)
+
+    monkeypatch.setattr(modaic.AutoProgram, "from_precompiled", from_precompiled)
+    monkeypatch.setattr(modaic, "PrecompiledProgram", FakeProgram)
+    monkeypatch.setattr(models, "resolve_program_path", lambda *_args: "/fake")
+    monkeypatch.setattr(models, "save_model_config", lambda *_args: None)
+    monkeypatch.setattr(models, "_AGENT_POOL", type(models._AGENT_POOL)())
+
+    def register(agent, name, _server):
+        registered.append((agent.config.lm, name))
+        return [f"{name}_tool"]
+
+    def run(agent, model, mcp_servers):
+        def prompt(title, _options):
+            return model if "base" in title else models.PRIMARY_OPTION
+
+        monkeypatch.setattr(models, "prompt_model_tui", prompt)
+        return models.handle_model_command("/model", agent, mcp_servers, register, "repo")[1]
+
+    return run, built, registered
+
+
+def test_switching_back_reuses_pooled_agent(switch):
+    run, built, registered = switch
+    servers = {"fs": {"server": object(), "tools": []}}
+    first = FakeProgram({"lm": "openrouter/a", "sub_lm": "openrouter/a", "max_iters": 5})
+
+    second = run(first, "b", servers)
+    assert built == ["openrouter/b"] and second.config.max_iters == 5
+    servers["git"] = {"server": object(), "tools": []}
+    assert run(second, "a", servers) is first
+    assert run(first, "b", servers) is second
+    assert built == ["openrouter/b"]
+    assert registered == [("openrouter/b", "fs"), ("openrouter/a", "git")]
+
+
+def test_pool_evicts_least_recent_and_can_be_disabled(switch, monkeypatch):
+    run, built, _registered = switch
+    monkeypatch.setenv("MICROCODE_MODEL_POOL_SIZE", "2")
+    agent = FakeProgram({"lm": "openrouter/a", "sub_lm": "openrouter/a"})
+    for model in ("b", "c", "a"):
+        agent = run(agent, model, {})
+    assert built == ["openrouter/b", "openrouter/c", "openrouter/a"]
+
+    monkeypatch.setenv("MICROCODE_MODEL_POOL_SIZE", "0")
+    run(run(agent, "c", {}), "a", {})
+    assert built[-2:] == ["openrouter/c", "openrouter/a"]
@@ -0,0 +1,52 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.paste import PasteStore  # noqa: E402
+
+
+def test_small_pastes_stay_in_memory(tmp_path):
+    store = PasteStore(spool_root=str(tmp_path), spill_threshold=1024)
+    paste_id = store.add("short text")
+
+    assert store.get(paste_id) == "short text"
+    assert store.spool_dir is None
+    store.close()
+
+
+def test_large_pastes_spill_to_mmap_and_clean_up(tmp_path):
+    store = PasteStore(spool_root=str(tmp_path), spill_threshold=100, hot_bytes=250)
+    first = store.add("a\n" * 100)
+    second = store.add("é\n" * 100)
+    assert store.add("a\n" * 100) == first
+
+    spool_dir = store.spool_dir
+    assert spool_dir is not None
+    assert len(os.listdir(spool_dir)) == 2
+
+    with store.view(first) as view:
+        assert bytes(view[:4]) == b"a\na\n"
+    assert store.get(second) == "é\n" * 100
+    assert store.get(first) == "a\n" * 100
+    assert list(store._hot) == [first]
+    assert store.summary(second) == f"[{second}] 100 lines, 300 B (not referenced)"
+
+    store.close()
+    assert not os.path.exists(spool_dir)
+
+
+def test_stale_spools_are_removed(tmp_path):
+    stale = tmp_path / "999999999-abc"
+    stale.mkdir()
+    live = tmp_path / f"{os.getpid()}-live"
+    live.mkdir()
+
+    store = PasteStore(spool_root=str(tmp_path), spill_threshold=1)
+    store.add("spilled")
+
+    assert not stale.exists()
+    assert live.exists()
+    store.close()
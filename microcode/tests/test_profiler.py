@@ -0,0 +1,99 @@
+import asyncio
+import inspect
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import profiler
+
+
+class FakeLM:
+    def __init__(self, model):
+        self.model = model
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        time.sleep(0.01)
+        return prompt
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        await asyncio.sleep(0.01)
+        return prompt
+
+
+def test_session_trace_has_spans_lm_fanout_and_tools(monkeypatch, tmp_path):
+    monkeypatch.setenv("MICROCODE_PROFILE", "1")
+    monkeypatch.delenv("MICROCODE_PROFILE_SAMPLE_MS", raising=False)
+    active = profiler.start_profiler(str(tmp_path))
+    try:
+        lm, sub_lm = FakeLM("openrouter/main"), FakeLM("openrouter/sub")
+        profiler.instrument_lm(lm, "lm")
+        profiler.instrument_lm(sub_lm, "sub_lm")
+        profiler.instrument_lm(sub_lm, "sub_lm")
+
+        def search(query: str) -> str:
+            """Search the docs."""
+            return query.upper()
+
+        tool = profiler.traced_tool(search, "docs_search")
+        assert tool.__name__ == "search" and tool.__doc__ == "Search the docs."
+        assert str(inspect.signature(tool)) == "(query: str) -> str"
+
+        with profiler.span("turn", "turn"):
+            assert asyncio.run(lm.aforward(prompt="plan")) == "plan"
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                assert list(pool.map(lambda p: sub_lm.forward(prompt=p), "abc")) == ["a", "b", "c"]
+            assert tool("x") == "X"
+        path = active.save("session-1")
+    finally:
+        profiler.stop_profiler()
+
+    events = json.loads(Path(path).read_text())["traceEvents"]
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert set(spans) == {"turn", "docs_search"}
+    assert spans["docs_search"]["cat"] == "tool"
+    assert spans["turn"]["dur"] >= 20_000
+
+    begins = [event for event in events if event["ph"] == "b"]
+    ends = {event["id"] for event in events if event["ph"] == "e"}
+    assert sorted(event["cat"] for event in begins) == ["lm", "sub_lm", "sub_lm", "sub_lm"]
+    assert {event["id"] for event in begins} == ends
+    assert {event["name"] for event in begins} == {"lm main", "sub_lm sub"}
+    assert any(event["ph"] == "M" for event in events)
+    assert profiler.active_profiler() is None
+
+
+def test_disabled_profiling_changes_nothing(monkeypatch, tmp_path):
+    monkeypatch.delenv("MICROCODE_PROFILE", raising=False)
+    assert profiler.start_profiler(str(tmp_path)) is None
+
+    lm = FakeLM("openrouter/main")
+    forward = lm.forward
+    profiler.instrument_lm(lm, "lm")
+    assert lm.forward == forward
+
+    def tool():
+        return 1
+
+    assert profiler.traced_tool(tool, "t") is tool
+    with profiler.span("noop"):
+        pass
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stack_sampler_writes_folded_stacks(tmp_path):
+    active = profiler.Profiler(str(tmp_path), sample_ms=1)
+    deadline = time.monotonic() + 0.2
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    active.stop()
+    active.save("sampled")
+
+    lines = (tmp_path / "sampled.folded").read_text().splitlines()
+    main = [line.rsplit(" ", 1) for line in lines if line.startswith("MainThread;")]
+    assert main and all(int(count) > 0 for _stack, count in main)
+    assert any("test_stack_sampler_writes_folded_stacks" in stack for stack, _count in main)
@@ -0,0 +1,108 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _load_store(monkeypatch, tmp_path, fetches):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.delenv("MICROCODE_OFFLINE", raising=False)
+    monkeypatch.delenv("MICROCODE_PROGRAM_STORE_LIMIT", raising=False)
+    monkeypatch.setenv("MICROCODE_PROGRAM_REFRESH_INTERVAL", "3600")
+
+    constants = importlib.import_module("utils.constants")
+    importlib.reload(constants)
+    programs = importlib.import_module("utils.programs")
+    importlib.reload(programs)
+
+    def fake_fetch(repo_path, rev):
+        commit = fetches["commits"][rev]
+        source = tmp_path / "hub" / rev / commit
+        source.mkdir(parents=True, exist_ok=True)
+        (source / "program.py").write_text(f"COMMIT = {commit!r}\n")
+        (source / ".git").mkdir(exist_ok=True)
+        fetches["calls"].append((repo_path, rev))
+        return str(source), commit
+
+    monkeypatch.setattr(programs, "_fetch_snapshot", fake_fetch)
+    return programs
+
+
+def test_cached_copy_is_reused_without_fetch(monkeypatch, tmp_path):
+    fetches = {"commits": {"prod": "a" * 40}, "calls": []}
+    programs = _load_store(monkeypatch, tmp_path, fetches)
+
+    first = programs.resolve_program_path("user/repo", "prod")
+    assert os.path.exists(os.path.join(first, "program.py"))
+    assert not os.path.exists(os.path.join(first, ".git"))
+
+    programs._RESOLVED.clear()
+    second = programs.resolve_program_path("user/repo", "prod")
+    assert second == first
+    assert fetches["calls"] == [("user/repo", "prod")]
+
+
+def test_corrupt_entry_is_refetched(monkeypatch, tmp_path):
+    fetches = {"commits": {"prod": "b" * 40}, "calls": []}
+    programs = _load_store(monkeypatch, tmp_path, fetches)
+
+    entry = programs.resolve_program_path("user/repo", "prod")
+    with open(os.path.join(entry, "program.py"), "a", encoding="utf-8") as handle:
+        handle.write("tampered = True\n")
+
+    programs._RESOLVED.clear()
+    programs.resolve_program_path("user/repo", "prod")
+    assert len(fetches["calls"]) == 2
+    with open(os.path.join(entry, "program.py"), encoding="utf-8") as handle:
+        assert "tampered" not in handle.read()
+
+
+def test_offline_requires_cached_copy(monkeypatch, tmp_path):
+    fetches = {"commits": {"prod": "c" * 40}, "calls": []}
+    programs = _load_store(monkeypatch, tmp_path, fetches)
+
+    with pytest.raises(FileNotFoundError):
+        programs.resolve_program_path("user/repo", "prod", offline=True)
+
+    programs.resolve_program_path("user/repo", "prod")
+    programs._RESOLVED.clear()
+    assert programs.resolve_program_path("user/repo", "prod", offline=True)
+    assert len(fetches["calls"]) == 1
+
+
+def test_refresh_ingests_moved_revision(monkeypatch, tmp_path):
+    fetches = {"commits": {"prod": "d" * 40}, "calls": []}
+    programs = _load_store(monkeypatch, tmp_path, fetches)
+
+    old_entry = programs.resolve_program_path("user/repo", "prod")
+    fetches["commits"]["prod"] = "e" * 40
+    programs._refresh("user/repo", "prod", "d" * 40)
+
+    programs._RESOLVED.clear()
+    new_entry = programs.resolve_program_path("user/repo", "prod", offline=True)
+    assert new_entry != old_entry
+    with open(os.path.join(new_entry, "program.py"), encoding="utf-8") as handle:
+        assert "e" * 40 in handle.read()
+
+
+def test_lru_eviction_keeps_recent_entries(monkeypatch, tmp_path):
+    fetches = {
+        "commits": {"r1": "1" * 40, "r2": "2" * 40, "r3": "3" * 40},
+        "calls": [],
+    }
+    programs = _load_store(monkeypatch, tmp_path, fetches)
+    monkeypatch.setenv("MICROCODE_PROGRAM_STORE_LIMIT", "2")
+
+    first = programs.resolve_program_path("user/repo", "r1")
+    programs.resolve_program_path("user/repo", "r2")
+    programs.resolve_program_path("user/repo", "r3")
+
+    assert not os.path.exists(first)
+    index = programs._load_index()
+    assert len(index["entries"]) == 2
+    assert "user/repo@r1" not in index["revs"]
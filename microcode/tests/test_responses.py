@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.responses import ResponseCache, workspace_fingerprint
+
+CONFIG = {"lm": "openai/gpt-5.2", "sub_lm": "openai/gpt-5.2", "max_iters": 50, "verbose": False}
+
+
+def test_key_ignores_whitespace_and_unrelated_config():
+    key = ResponseCache.key("fix the tests\r\n", CONFIG, revision="abc")
+    assert key == ResponseCache.key("  fix the tests  ", {**CONFIG, "verbose": True}, revision="abc")
+    assert key != ResponseCache.key("fix the tests", {**CONFIG, "max_iters": 10}, revision="abc")
+    assert key != ResponseCache.key("fix the tests", CONFIG, revision="def")
+    assert key != ResponseCache.key("fix the tests", {**CONFIG, "api_base": "http://127.0.0.1:8765/v1"}, revision="abc")
+    assert key != ResponseCache.key("fix the tests", CONFIG, revision="abc", route="direct")
+
+
+def test_ttl_lru_eviction_and_hit_rate(tmp_path):
+    cache = ResponseCache(root=str(tmp_path), ttl=60, max_bytes=10**6)
+    cache.put("a", "answer a")
+    assert cache.get("a") == "answer a"
+    assert cache.get("missing") is None
+
+    expired = tmp_path / "a.json"
+    os.utime(expired, (time.time() - 120, time.time() - 120))
+    cache.put("b", "answer b")
+    assert not expired.exists()
+
+    small = ResponseCache(root=str(tmp_path), ttl=60, max_bytes=200)
+    small.put("c", "x" * 40)
+    os.utime(tmp_path / "b.json", (time.time() - 30, time.time() - 30))
+    small.put("d", "y" * 40)
+    assert small.get("b") is None
+    assert small.get("c") == "x" * 40
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["entries"] == 2
+
+
+def test_workspace_fingerprint_tracks_edits(tmp_path):
+    assert workspace_fingerprint(str(tmp_path)) is None
+
+    git = lambda *args: subprocess.run(
+        ["git", "-C", str(tmp_path), "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        check=True,
+        capture_output=True,
+    )
+    git("init", "-q")
+    (tmp_path / "a.py").write_text("x = 1\n")
+    git("add", "a.py")
+    git("commit", "-q", "-m", "init")
+
+    clean = workspace_fingerprint(str(tmp_path))
+    assert clean == workspace_fingerprint(str(tmp_path))
+    (tmp_path / "a.py").write_text("x = 2\n")
+    edited = workspace_fingerprint(str(tmp_path))
+    (tmp_path / "new.py").write_text("y = 1\n")
+    assert len({clean, edited, workspace_fingerprint(str(tmp_path))}) == 3
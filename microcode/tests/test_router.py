@@ -0,0 +1,77 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import cache, router, tracing  # noqa: E402
+
+
+class FakeLM:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def __call__(self, messages=None):
+        self.calls.append(messages)
+        return [self.reply]
+
+    async def acall(self, messages=None):
+        return self(messages=messages)
+
+
+@pytest.mark.parametrize(
+    "text, route",
+    [
+        ("what does this flag do?", "direct"),
+        ("Explain the difference between a list and a tuple", "direct"),
+        ("thanks!", "direct"),
+        ("fix the failing test", "rlm"),
+        ("why does utils/context.py drop old turns?", "rlm"),
+        ("what is in [paste_1]?", "rlm"),
+        ("is there a bug in this function?", "rlm"),
+        ("make it faster", None),
+    ],
+)
+def test_heuristics(text, route):
+    assert router.classify_task(text)[0] == route
+
+
+def test_routing_direct_answers_and_saved_latency(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "ROUTE_BASELINE_PATH", str(tmp_path / "route_baseline.json"))
+    monkeypatch.setenv("MICROCODE_TRACE", "1")
+    tracer = tracing.Tracer(str(tmp_path), flush_interval=60)
+    monkeypatch.setattr(tracing, "_TRACER", tracer)
+
+    sub_lm = FakeLM("DIRECT")
+    task_router = router.TaskRouter(mode="auto", use_lm=True)
+    assert task_router.route("fix it", sub_lm)["route"] == "rlm" and not sub_lm.calls
+    decision = asyncio.run(task_router.aroute("make it faster", sub_lm))
+    assert decision["route"] == "direct" and decision["reason"] == "sub_lm: direct" and len(sub_lm.calls) == 1
+    assert router.TaskRouter(mode="auto", use_lm=False).route("make it faster", sub_lm)["route"] == "rlm"
+    assert router.TaskRouter(mode="rlm").route("thanks")["reason"] == "forced"
+
+    task_router.record({"route": "rlm", "reason": "long task"}, "t1", 0.0, 10.0)
+    task_router.record({"route": "rlm", "reason": "long task"}, "t2", 0.0, 30.0)
+    assert cache.load_route_baseline() == [10.0, 30.0]
+
+    answer = router.answer_directly(FakeLM("Use `--verbose`."), "what does -v do?")
+    assert answer.answer == "Use `--verbose`."
+    assert task_router.record(decision, "make it faster", 0.0, 2.0) == 8.0
+    assert router.format_route(decision) == "route: direct (sub_lm: direct), ~8.0s saved vs median RLM turn"
+
+    escalated = {"route": "direct", "reason": "short question"}
+    assert asyncio.run(router.aanswer_directly(FakeLM("ESCALATE"), "what is failing?")) is None
+    task_router.escalate(escalated)
+    task_router.record(escalated, "what is failing?", 0.0, 40.0)
+    assert escalated["reason"] == "escalated (short question)" and cache.load_route_baseline() == [10.0, 30.0]
+    assert task_router.counts == {"direct": 1, "rlm": 3, "escalated": 1}
+
+    tracer.close()
+    spans = [span for span in tracing.read_spans(str(tmp_path)) if span["kind"] == "route"]
+    assert [span["name"] for span in spans] == ["rlm", "rlm", "direct", "rlm"]
+    assert spans[2]["attrs"]["saved_seconds"] == 8.0
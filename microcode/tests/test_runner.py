@@ -0,0 +1,83 @@
+import _thread
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.runner import AgentRunner, TurnCancelled  # noqa: E402
+
+
+def _interrupt_after(seconds):
+    timer = threading.Timer(seconds, _thread.interrupt_main)
+    timer.start()
+    return timer
+
+
+def test_ctrl_c_cancels_sync_turn_at_next_call():
+    import dspy
+
+    calls = []
+
+    class Step(dspy.Module):
+        def forward(self, index):
+            calls.append(index)
+            time.sleep(0.05)
+            return dspy.Prediction(done=index)
+
+    class Agent(dspy.Module):
+        def __init__(self):
+            super().__init__()
+            self.step = Step()
+
+        def forward(self, task):
+            for index in range(100):
+                self.step(index=index)
+            return dspy.Prediction(answer="finished")
+
+    runner = AgentRunner()
+    try:
+        _interrupt_after(0.2)
+        with pytest.raises(TurnCancelled):
+            runner.run(Agent(), "task", lambda kind, text: None)
+        time.sleep(0.2)
+        stopped_at = len(calls)
+        time.sleep(0.2)
+        assert len(calls) == stopped_at < 100
+    finally:
+        runner.close()
+
+
+def test_async_turn_is_cancelled_and_runner_is_reusable():
+    import dspy
+
+    state = {"cancelled": False}
+
+    class Agent(dspy.Module):
+        def forward(self, task):
+            return dspy.Prediction(answer=f"sync {task}")
+
+        async def aforward(self, task):
+            if task == "slow":
+                try:
+                    await asyncio.sleep(30)
+                except asyncio.CancelledError:
+                    state["cancelled"] = True
+                    raise
+            return dspy.Prediction(answer=f"async {task}")
+
+    runner = AgentRunner()
+    try:
+        _interrupt_after(0.2)
+        with pytest.raises(TurnCancelled):
+            runner.run(Agent(), "slow", lambda kind, text: None)
+        time.sleep(0.1)
+        assert state["cancelled"]
+        assert runner.run(Agent(), "fast", lambda kind, text: None).answer == "async fast"
+    finally:
+        runner.close()
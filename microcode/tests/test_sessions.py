@@ -0,0 +1,89 @@
+import gzip
+import importlib
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _load_sessions(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("MICROCODE_SESSION_FSYNC_INTERVAL", "0")
+
+    constants = importlib.import_module("utils.constants")
+    importlib.reload(constants)
+    sessions = importlib.import_module("utils.sessions")
+    importlib.reload(sessions)
+    return sessions
+
+
+def test_tail_reads_last_records_and_log_is_gzip(monkeypatch, tmp_path):
+    sessions = _load_sessions(monkeypatch, tmp_path)
+    log = sessions.SessionLog()
+    for turn in range(50):
+        log.append({"user": f"q{turn}", "assistant": f"a{turn}"})
+    log.close()
+
+    tail = sessions.read_tail(log.session_id, 3)
+    assert [record["user"] for record in tail] == ["q47", "q48", "q49"]
+
+    with gzip.open(sessions._log_path(log.session_id), "rt", encoding="utf-8") as handle:
+        assert len(handle.read().splitlines()) == 50
+    assert sessions.resolve_session_id("last") == log.session_id
+
+
+def test_recovery_indexes_unindexed_records_and_drops_torn_tail(monkeypatch, tmp_path):
+    sessions = _load_sessions(monkeypatch, tmp_path)
+    log = sessions.SessionLog()
+    for turn in range(3):
+        log.append({"user": f"q{turn}", "assistant": "a"})
+    log.close()
+
+    index_path = sessions._index_path(log.session_id)
+    with open(index_path, "r+b") as handle:
+        handle.truncate(sessions._INDEX_RECORD.size)
+    with open(sessions._log_path(log.session_id), "ab") as handle:
+        handle.write(gzip.compress(b'{"user": "torn"}')[:10])
+
+    reopened = sessions.SessionLog(log.session_id)
+    assert len(reopened) == 3
+    reopened.append({"user": "q3", "assistant": "a"})
+    reopened.close()
+    assert [record["user"] for record in reopened.tail(10)] == ["q0", "q1", "q2", "q3"]
+
+
+def test_restore_session_renumbers_pastes(monkeypatch, tmp_path):
+    sessions = _load_sessions(monkeypatch, tmp_path)
+    from utils.context import ConversationContext
+
+    original = ConversationContext(history_limit=2)
+    log = sessions.SessionLog()
+    for turn in range(3):
+        paste_id = original.pastes.add(f"log {turn}")
+        user = f"check [{paste_id}]"
+        log.append(sessions.turn_record(original, user, f"ok {turn}"))
+    log.close()
+
+    restored = ConversationContext(history_limit=2)
+    restored.pastes.add("unrelated")
+    sessions.restore_session(restored, log.session_id)
+
+    assert [turn["user"] for turn in restored.turns] == ["check [paste_2]", "check [paste_3]"]
+    assert restored.pastes.get("paste_3") == "log 2"
+
+
+def test_eviction_keeps_newest_and_active_sessions(monkeypatch, tmp_path):
+    sessions = _load_sessions(monkeypatch, tmp_path)
+    ids = []
+    for position in range(4):
+        log = sessions.SessionLog(f"20260101-00000{position}-abcdef")
+        log.append({"user": "q", "assistant": "a"})
+        log.close()
+        os.utime(sessions._log_path(log.session_id), (1000 + position, 1000 + position))
+        ids.append(log.session_id)
+
+    sessions.evict_sessions(limit=2, retention_days=100000, keep=ids[0])
+    remaining = {session["id"] for session in sessions.list_sessions()}
+    assert remaining == {ids[0], ids[2], ids[3]}
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules that must only load on the code paths that need them.
+DEFERRED_MODULES = ("modaic", "dspy", "textual", "prompt_toolkit", "mcp2py", "weave")
+IMPORT_BUDGET_US = int(os.getenv("MICROCODE_IMPORT_BUDGET_US", "400000"))
+
+
+def _import_profile(*args: str) -> tuple[set[str], int]:
+    """
+    Run python -X importtime and return the imported modules and total import time in us.
+    """
+    env = dict(os.environ)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert completed.returncode == 0, completed.stderr[-2000:]
+
+    modules: set[str] = set()
+    total = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line.removeprefix("import time:").split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        # Only top-level entries: nested imports are already in their parent's total.
+        if not name.startswith("  "):
+            total += int(cumulative.strip())
+    return modules, total
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ("-c", "import main"),
+        ("main.py", "--help"),
+        ("main.py", "task", "--help"),
+    ],
+    ids=["import", "help", "task-help"],
+)
+def test_entry_point_defers_heavy_imports(args):
+    modules, total = _import_profile(*args)
+
+    loaded = sorted(
+        name for name in modules if name.split(".", 1)[0] in DEFERRED_MODULES
+    )
+    assert loaded == []
+    assert total <= IMPORT_BUDGET_US, f"startup imports took {total}us"
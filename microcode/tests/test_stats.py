@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.stats import SessionStats, format_session_stats, lm_markers, percentile, turn_stats
+
+
+def _entry(prompt, completion, cached=0, cost=None):
+    usage = {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+    return {"usage": usage, "cost": cost}
+
+
+def test_turn_stats_counts_new_calls_per_model():
+    lm = SimpleNamespace(model="openrouter/main", history=[_entry(999, 999)])
+    sub_lm = SimpleNamespace(model="openrouter/sub", history=[])
+    agent = SimpleNamespace(lm=lm, sub_lm=sub_lm, config=SimpleNamespace(max_iters=20))
+    markers = lm_markers(agent)
+
+    lm.history += [_entry(100, 10, cached=60, cost=0.01), _entry(200, 20, cost=0.02)]
+    sub_lm.history += [_entry(50, 5, cost=None)]
+    result = SimpleNamespace(answer="done", trajectory=[{}, {}, {}])
+    stats = turn_stats(agent, result, markers, 1.5)
+
+    assert stats["lm_calls"] == 3
+    assert (stats["prompt_tokens"], stats["completion_tokens"], stats["cached_tokens"]) == (350, 35, 60)
+    assert stats["cost"] == 0.03
+    assert stats["models"]["sub_lm"]["priced_calls"] == 0
+    assert (stats["iterations"], stats["max_iters"]) == (3, 20)
+
+    shared = SimpleNamespace(lm=lm, sub_lm=lm)
+    assert list(lm_markers(shared)) == ["lm"]
+
+
+def test_session_summary_totals_and_percentiles():
+    session = SessionStats()
+    assert format_session_stats(session.summary()) == ["No turns yet"]
+
+    for seconds in range(1, 11):
+        session.add(
+            {
+                "seconds": float(seconds),
+                "lm_calls": 2,
+                "prompt_tokens": 10,
+                "completion_tokens": 1,
+                "cached_tokens": 0,
+                "cost": 0.001,
+                "iterations": 1,
+                "models": {"lm": {"model": "openrouter/m", "calls": 2, "prompt_tokens": 10, "completion_tokens": 1, "cached_tokens": 0, "cost": 0.001}},
+            }
+        )
+    summary = session.summary()
+    assert summary["turns"] == 10
+    assert summary["models"]["lm"]["calls"] == 20
+    assert summary["percentiles"]["seconds"] == {"p50": 5.0, "p90": 9.0, "max": 10.0}
+    assert percentile([], 0.5) is None
+    assert len(format_session_stats(summary)) == 3
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.constants import BOLD, RESET  # noqa: E402
+from utils.streaming import MarkdownStream, stream_agent  # noqa: E402
+
+
+def test_markdown_stream_renders_complete_lines_only():
+    renderer = MarkdownStream()
+    assert renderer.feed("some **bo") == ""
+    assert renderer.feed("ld** text\n```py\nx = **y**\n") == (
+        f"some {BOLD}bold{RESET} text\n\033[2m```py{RESET}\nx = **y**\n"
+    )
+    assert renderer.feed("```\n# Title").endswith("```\x1b[0m\n")
+    assert renderer.flush() == f"{BOLD}Title{RESET}"
+
+    raw = MarkdownStream(ansi=False)
+    assert raw.feed("**a") + raw.feed("b**") == "**ab**"
+
+
+def test_stream_agent_reports_iterations():
+    import dspy
+    from dspy.utils import DummyLM
+
+    class Agent(dspy.Module):
+        def __init__(self):
+            super().__init__()
+            self.lm = DummyLM(
+                [
+                    {"reasoning": "look", "code": "print(1)"},
+                    {"reasoning": "done", "code": "SUBMIT()"},
+                ]
+            )
+            self.sub_lm = self.lm
+            self.generate_action = dspy.Predict("task -> reasoning, code")
+
+        def forward(self, task):
+            with dspy.context(lm=self.lm):
+                first = self.generate_action(task=task)
+                second = self.generate_action(task=task + first.code)
+            return dspy.Prediction(answer=second.reasoning)
+
+    events = []
+    result = stream_agent(Agent(), "hi", lambda kind, text: events.append((kind, text)))
+
+    assert result.answer == "done"
+    assert [text for kind, text in events if kind == "status"] == ["Iteration 1", "Iteration 2"]
@@ -0,0 +1,68 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.stub_server import StubServer, format_stub_counts, load_script
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**options):
+        server = StubServer(("127.0.0.1", 0), **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_litellm_completion_and_streaming_against_stub(serve, tmp_path):
+    litellm = pytest.importorskip("litellm")
+    script = tmp_path / "script.jsonl"
+    script.write_text(json.dumps({"match": "status", "content": "all green"}) + "\n" + json.dumps("first reply") + "\n")
+    server = serve(script=load_script(str(script)), ttft=0.05, tokens_per_sec=100)
+    request = {
+        "model": "openrouter/stub/model",
+        "api_base": server.api_base,
+        "api_key": "stub",
+    }
+
+    started = time.perf_counter()
+    response = litellm.completion(messages=[{"role": "user", "content": "hello"}], **request)
+    assert time.perf_counter() - started >= 0.05
+    assert response.choices[0].message.content == "first reply"
+    assert response.usage.completion_tokens == 2
+
+    chunks = list(litellm.completion(messages=[{"role": "user", "content": "build status?"}], stream=True, **request))
+    assert "".join(chunk.choices[0].delta.content or "" for chunk in chunks) == "all green"
+    assert server.counts["streamed"] == 1 and server.counts["ok"] == 2
+
+
+def test_echo_error_and_rate_limit_injection(serve):
+    server = serve(rpm=2)
+    url = server.api_base + "/chat/completions"
+    body = {"model": "stub/echo", "messages": [{"role": "user", "content": "ping pong"}]}
+    with httpx.Client() as client:
+        replies = [client.post(url, json=body) for _ in range(3)]
+        assert [reply.status_code for reply in replies] == [200, 200, 429]
+        assert replies[0].json()["choices"][0]["message"]["content"] == "ping pong"
+        assert int(replies[2].headers["Retry-After"]) >= 1
+        assert client.get(server.api_base + "/models").json()["data"] == [{"id": "stub/echo", "object": "model"}]
+
+    failing = serve(error_rate=1.0)
+    assert httpx.post(failing.api_base + "/chat/completions", json=body).status_code == 500
+    assert "1 rate limited" in format_stub_counts(server.counts)
+    assert failing.counts["errors"] == 1
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import tracing
+
+
+def _response(text):
+    message = SimpleNamespace(content=text)
+    usage = SimpleNamespace(prompt_tokens=7, completion_tokens=2, total_tokens=9)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeLM:
+    def __init__(self, model):
+        self.model = model
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        if messages[-1]["content"] == "boom":
+            raise RuntimeError("provider down")
+        return _response("pong")
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        return _response("apong")
+
+
+def _tracer(monkeypatch, tmp_path, **options):
+    monkeypatch.setenv("MICROCODE_TRACE", "1")
+    tracer = tracing.Tracer(str(tmp_path), flush_interval=60, **options)
+    monkeypatch.setattr(tracing, "_TRACER", tracer)
+    return tracer
+
+
+def test_lm_tool_and_turn_spans_flush_to_ndjson(monkeypatch, tmp_path):
+    tracer = _tracer(monkeypatch, tmp_path)
+    tracing.set_trace_session("s1")
+
+    lm = FakeLM("openrouter/main")
+    tracing.enable_tracing(lm, "lm")
+    tracing.enable_tracing(lm, "lm")
+    assert lm.forward(messages=[{"role": "user", "content": "ping"}]).choices[0].message.content == "pong"
+    asyncio.run(lm.aforward(messages=[{"role": "user", "content": "x" * 5000}]))
+    try:
+        lm.forward(messages=[{"role": "user", "content": "boom"}])
+    except RuntimeError:
+        pass
+
+    def grep(pattern: str) -> str:
+        """Search files."""
+        return f"match {pattern}"
+
+    tool = tracing.trace_tool(grep, "fs_grep")
+    assert tool.__doc__ == "Search files." and tool("todo") == "match todo"
+
+    trajectory = [{"reasoning": "look", "code": "print(1)", "output": "1"}, {"reasoning": "done", "code": "SUBMIT()"}]
+    tracing.record_turn("fix it", SimpleNamespace(answer="ok", trajectory=trajectory), 1000.0, 2.5)
+    tracer.close()
+
+    spans = list(tracing.read_spans(str(tmp_path)))
+    assert [span["kind"] for span in spans] == ["lm", "lm", "lm", "tool", "turn", "iteration", "iteration"]
+    assert {span["session"] for span in spans} == {"s1"}
+    first, second, failed = spans[:3]
+    assert first["attrs"]["request"] == "ping" and first["attrs"]["response"] == "pong"
+    assert first["attrs"]["usage"]["total_tokens"] == 9
+    assert second["attrs"]["request"].endswith("... [3000 chars]")
+    assert failed["attrs"]["error"] == "RuntimeError: provider down"
+    assert spans[3]["attrs"]["result"] == "match todo"
+    assert spans[4]["attrs"]["iterations"] == 2 and spans[6]["seconds"] is None
+    assert spans[6]["attrs"] == {"reasoning": "done", "code": "SUBMIT()"}
+
+    summary = tracing.summarize_spans(spans, top=2)
+    assert summary["kinds"]["lm"]["count"] == 3 and summary["kinds"]["lm"]["errors"] == 1
+    assert "iteration" not in summary["kinds"]
+    assert summary["slowest"][0]["kind"] == "turn"
+    assert "turn" in "\n".join(tracing.format_trace_summary(summary))
+
+
+def test_full_buffer_drops_oldest_and_files_rotate(monkeypatch, tmp_path):
+    tracer = _tracer(monkeypatch, tmp_path, buffer_size=4, max_file_bytes=1, max_files=2)
+    for index in range(6):
+        tracer.record("tool", f"t{index}", 0.0, 0.1)
+    assert tracer.counts["dropped"] == 2
+    tracer.flush()
+    for index in range(2):
+        tracer.record("tool", f"late{index}", 0.0, 0.1)
+        tracer.flush()
+    tracer.close()
+
+    files = tracing.trace_files(str(tmp_path))
+    assert len(files) == 2
+    names = [json.loads(line)["name"] for path in files for line in Path(path).read_text().splitlines()]
+    assert names == ["late0", "late1"]
+    assert tracer.counts["flushed"] == 6
+
+
+def test_tracing_off_leaves_lm_and_tools_alone(monkeypatch):
+    monkeypatch.delenv("MICROCODE_TRACE", raising=False)
+    monkeypatch.setattr(tracing, "_TRACER", None)
+    lm = FakeLM("openrouter/main")
+    forward = lm.forward
+    tracing.enable_tracing(lm, "lm")
+    assert lm.forward == forward
+
+    def tool():
+        return 1
+
+    assert tracing.trace_tool(tool, "t") is tool
+    tracing.record_turn("task", None, 0.0, 1.0)
+    assert tracing._TRACER is None
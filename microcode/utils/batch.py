@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, TextIO
+
+from .models import normalize_model_id
+
+# Per-task keys that select a different program config.
+_CONFIG_KEYS = ("lm", "sub_lm")
+
+
+def read_tasks(lines: Iterable[str]) -> list[dict[str, Any]]:
+    """
+    Parse batch tasks from JSONL lines.
+
+    Each line is either a JSON string (the task) or an object with a "task"
+    (or "prompt") and optional "id", "lm" and "sub_lm". Tasks without an
+    id are numbered by their line.
+
+    Args:
+        lines: Input lines
+
+    Returns:
+        Task dicts with "id", "task" and any config overrides
+
+    Raises:
+        ValueError: If a line is not valid JSON or has no task
+    """
+    tasks = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as err:
+            raise ValueError(f"line {number}: invalid JSON ({err})") from err
+
+        if isinstance(item, str):
+            item = {"task": item}
+        if not isinstance(item, dict):
+            raise ValueError(f"line {number}: expected a string or an object")
+        task = item.get("task", item.get("prompt"))
+        if not isinstance(task, str) or not task:
+            raise ValueError(f"line {number}: missing task")
+
+        entry = {"id": str(item.get("id", number)), "task": task}
+        for key in _CONFIG_KEYS:
+            if item.get(key):
+                entry[key] = normalize_model_id(str(item[key]))
+        tasks.append(entry)
+    return tasks
+
+
+def completed_ids(path: str) -> set[str]:
+    """
+    Return the IDs of tasks that already succeeded in a batch output file.
+
+    Failed tasks and a torn last line are ignored so that they run again.
+    """
+    done = set()
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict) and "answer" in record and "id" in record:
+                    done.add(str(record["id"]))
+    except OSError:
+        pass
+    return done
+
+
+def trim_partial_line(path: str) -> None:
+    """
+    Drop a torn trailing line from an output file so appended records start on a new line.
+    """
+    try:
+        with open(path, "r+b") as handle:
+            data = handle.read()
+            if not data or data.endswith(b"\n"):
+                return
+            handle.truncate(data.rfind(b"\n") + 1)
+    except OSError:
+        pass
+
+
+class _AgentPool:
+    """
+    One warm agent per program config, built once and shared by all workers.
+    """
+
+    def __init__(self, build_agent: Callable[[dict[str, Any]], Any]):
+        self.build_agent = build_agent
+        self._agents: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def agent_for(self, config: dict[str, Any]) -> Any:
+        key = json.dumps(config, sort_keys=True, default=str)
+        with self._lock:
+            future = self._agents.get(key)
+            owner = future is None
+            if owner:
+                future = self._agents[key] = Future()
+        if owner:
+            try:
+                future.set_result(self.build_agent(config))
+            except BaseException as err:
+                future.set_exception(err)
+        return future.result()
+
+
+def _usage_totals(usage: dict[str, dict[str, Any]]) -> dict[str, int]:
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for entry in usage.values():
+        for key in totals:
+            value = entry.get(key)
+            if isinstance(value, int):
+                totals[key] += value
+    return totals
+
+
+def _run_one(pool: _AgentPool, base_config: dict[str, Any], item: dict[str, Any]) -> dict[str, Any]:
+    import dspy
+
+    config = dict(base_config)
+    for key in _CONFIG_KEYS:
+        if key in item:
+            config[key] = item[key]
+
+    record: dict[str, Any] = {"id": item["id"], "task": item["task"], "lm": config.get("lm")}
+    started = time.perf_counter()
+    try:
+        agent = pool.agent_for(config)
+        with dspy.track_usage() as tracker:
+            result = agent(task=item["task"])
+        record["answer"] = result.answer
+        record["usage"] = _usage_totals(tracker.get_total_tokens())
+    except Exception as err:
+        record["error"] = f"{type(err).__name__}: {err}"
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_batch(
+    tasks: list[dict[str, Any]],
+    base_config: dict[str, Any],
+    build_agent: Callable[[dict[str, Any]], Any],
+    output: TextIO,
+    concurrency: int,
+    on_record: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, int]:
+    """
+    Run tasks on a bounded thread pool and write one JSONL record per task as it completes.
+
+    Agents are built once per distinct config and shared by the workers, as
+    dspy programs are called concurrently by dspy.Parallel and Evaluate.
+    At most `concurrency` tasks are in flight, so large inputs are not all
+    queued up front.
+
+    Args:
+        tasks: Tasks from read_tasks
+        base_config: Program config from resolve_agent_config
+        build_agent: Callable that loads an agent for a config
+        output: Writable text stream for result records
+        concurrency: Maximum number of tasks running at once
+        on_record: Optional callback receiving each record after it is written
+
+    Returns:
+        Counts of "ok" and "failed" tasks
+    """
+    assert concurrency > 0, "concurrency must be positive"
+    assert callable(build_agent), "build_agent must be callable"
+
+    pool = _AgentPool(build_agent)
+    counts = {"ok": 0, "failed": 0}
+    pending: set[Future] = set()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="microcode-batch")
+    try:
+        for item in tasks:
+            pending.add(executor.submit(_run_one, pool, base_config, item))
+            if len(pending) < concurrency:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _write_records(done, output, counts, on_record)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _write_records(done, output, counts, on_record)
+    finally:
+        executor.shutdown(wait=not pending, cancel_futures=True)
+    return counts
+
+
+def _write_records(
+    done: set[Future],
+    output: TextIO,
+    counts: dict[str, int],
+    on_record: Callable[[dict[str, Any]], None] | None,
+) -> None:
+    for future in done:
+        record = future.result()
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        counts["failed" if "error" in record else "ok"] += 1
+        if on_record is not None:
+            on_record(record)
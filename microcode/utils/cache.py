@@ -1,11 +1,17 @@
 import json
 import os
 import tempfile
+from typing import Any
+
 from .constants import (
     OPENROUTER_KEY_PATH,
     CACHE_DIR,
     MODEL_CONFIG_PATH,
     SETTINGS_CONFIG_PATH,
+    TOKEN_CALIBRATION_PATH,
+    MODEL_BENCH_PATH,
+    OPENROUTER_API_BASE,
+    ROUTE_BASELINE_PATH,
 )
 
 
@@ -203,3 +209,174 @@ def save_settings_config(
                 os.remove(tmp_path)
             except OSError:
                 pass
+
+
+def load_token_calibration() -> dict[str, float]:
+    """
+    Load the per-model characters-per-token calibration from the cache file.
+    """
+    assert isinstance(TOKEN_CALIBRATION_PATH, str), "calibration path must be a str"
+
+    if not os.path.exists(TOKEN_CALIBRATION_PATH):
+        return {}
+
+    try:
+        with open(TOKEN_CALIBRATION_PATH, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+
+        if not isinstance(data, dict):
+            return {}
+
+        return {
+            model: float(ratio)
+            for model, ratio in data.items()
+            if isinstance(model, str)
+            and isinstance(ratio, (int, float))
+            and not isinstance(ratio, bool)
+            and ratio > 0
+        }
+
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_token_calibration(calibration: dict[str, float]) -> None:
+    """
+    Save the per-model characters-per-token calibration to the cache file.
+    """
+    assert isinstance(calibration, dict), "calibration must be a dict"
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix="microcode_tokens_", suffix=".json", dir=CACHE_DIR
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(calibration, handle)
+        os.replace(tmp_path, TOKEN_CALIBRATION_PATH)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _bench_base(api_base: str | None) -> str:
+    return (api_base or OPENROUTER_API_BASE).rstrip("/")
+
+
+def _load_model_bench_file() -> dict[str, dict[str, dict[str, Any]]]:
+    if not os.path.exists(MODEL_BENCH_PATH):
+        return {}
+
+    try:
+        with open(MODEL_BENCH_PATH, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+    if not isinstance(data, dict):
+        return {}
+
+    bases: dict[str, dict[str, dict[str, Any]]] = {}
+    for key, value in data.items():
+        if not isinstance(key, str) or not isinstance(value, dict):
+            continue
+        if "measured_at" in value:
+            # Older files keyed results by model only; each result records its API base.
+            bases.setdefault(_bench_base(value.get("api_base")), {})[key] = value
+            continue
+        section = bases.setdefault(key, {})
+        for model, result in value.items():
+            if isinstance(model, str) and isinstance(result, dict):
+                section[model] = result
+    return bases
+
+
+def load_model_bench(api_base: str | None = None) -> dict[str, dict[str, Any]]:
+    """
+    Load the cached `/model bench` results for one API base, keyed by normalized model ID.
+
+    Args:
+        api_base: The API base the results were measured against (default OpenRouter)
+    """
+    assert isinstance(MODEL_BENCH_PATH, str), "model bench path must be a str"
+
+    return _load_model_bench_file().get(_bench_base(api_base), {})
+
+
+def save_model_bench(results: dict[str, dict[str, Any]]) -> None:
+    """
+    Merge `/model bench` results into the cache file, replacing older results for the same models and API base.
+    """
+    assert isinstance(results, dict), "results must be a dict"
+
+    merged = _load_model_bench_file()
+    for model, result in results.items():
+        merged.setdefault(_bench_base(result.get("api_base")), {})[model] = result
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix="microcode_bench_", suffix=".json", dir=CACHE_DIR
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(merged, handle, indent=2)
+        os.replace(tmp_path, MODEL_BENCH_PATH)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def load_route_baseline() -> list[float]:
+    """
+    Load the recent RLM turn durations the task router compares direct answers against.
+    """
+    assert isinstance(ROUTE_BASELINE_PATH, str), "route baseline path must be a str"
+
+    if not os.path.exists(ROUTE_BASELINE_PATH):
+        return []
+
+    try:
+        with open(ROUTE_BASELINE_PATH, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+
+        if not isinstance(data, list):
+            return []
+
+        return [
+            float(seconds)
+            for seconds in data
+            if isinstance(seconds, (int, float)) and not isinstance(seconds, bool) and seconds >= 0
+        ]
+
+    except (OSError, json.JSONDecodeError):
+        return []
+
+
+def save_route_baseline(durations: list[float]) -> None:
+    """
+    Save the recent RLM turn durations for the task router.
+    """
+    assert isinstance(durations, list), "durations must be a list"
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix="microcode_route_", suffix=".json", dir=CACHE_DIR
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(durations, handle)
+        os.replace(tmp_path, ROUTE_BASELINE_PATH)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
@@ -0,0 +1,315 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable
+
+# Request kwargs that do not change the response and are left out of the match key.
+_VOLATILE_KWARGS = {"api_key", "api_base", "base_url", "num_retries", "cache", "rollout_id", "headers"}
+
+
+class CassetteMiss(RuntimeError):
+    """
+    Raised in replay mode when the cassette has no recorded response left for a call.
+    """
+
+
+def request_key(model: str, prompt: str | None, messages: list[dict[str, Any]] | None, kwargs: dict[str, Any]) -> str:
+    """
+    Hash an LM request for matching against a cassette.
+    """
+    request = {
+        "model": model,
+        "prompt": prompt,
+        "messages": messages,
+        "kwargs": {key: value for key, value in sorted(kwargs.items()) if key not in _VOLATILE_KWARGS},
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _tool_key(name: str, args: tuple[Any, ...], kwargs: dict[str, Any]) -> str:
+    payload = json.dumps([name, list(args), kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _jsonable(value: Any) -> Any:
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class Cassette:
+    """
+    An NDJSON file of recorded LM responses and MCP tool results.
+
+    In record mode the file is truncated and every call is appended as it
+    completes. In replay mode calls are answered from the file without any
+    network access: an unused entry with the same request hash wins, and
+    otherwise the next unused entry for the same LM role (or tool) is used,
+    since RLM prompts carry the current time and never hash the same twice.
+
+    Args:
+        path: Cassette file
+        mode: "record" or "replay"
+        latency: In replay, None for no delay, "recorded" to sleep for the
+            recorded duration, or a fixed number of seconds
+    """
+
+    def __init__(self, path: str, mode: str, latency: str | float | None = None):
+        assert mode in ("record", "replay"), "mode must be 'record' or 'replay'"
+        assert latency is None or latency == "recorded" or isinstance(latency, (int, float)), (
+            "latency must be None, 'recorded' or seconds"
+        )
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.counts = {"recorded": 0, "matched": 0, "sequential": 0, "missed": 0}
+        self._lock = threading.Lock()
+        self._entries: list[dict[str, Any]] = []
+        self._used: set[int] = set()
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._handle = open(path, "w", encoding="utf-8")
+        else:
+            self._handle = None
+            with open(path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        self._entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, entry: dict[str, Any]) -> None:
+        """
+        Append an entry (record mode).
+        """
+        assert self._handle is not None, "cassette is not recording"
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            self._entries.append(entry)
+            self._handle.write(line)
+            self._handle.flush()
+            self.counts["recorded"] += 1
+
+    def take(self, kind: str, group: str, key: str) -> dict[str, Any]:
+        """
+        Claim the entry that answers a call (replay mode).
+
+        Args:
+            kind: "lm" or "tool"
+            group: LM role or tool name
+            key: Request hash
+
+        Raises:
+            CassetteMiss: If no unused entry of that kind and group is left
+        """
+        with self._lock:
+            candidates = [
+                index
+                for index, entry in enumerate(self._entries)
+                if index not in self._used and entry.get("kind") == kind and entry.get("group") == group
+            ]
+            exact = [index for index in candidates if self._entries[index].get("key") == key]
+            if exact:
+                index = exact[0]
+                self.counts["matched"] += 1
+            elif candidates:
+                index = candidates[0]
+                self.counts["sequential"] += 1
+            else:
+                self.counts["missed"] += 1
+                raise CassetteMiss(f"No recorded {kind} response left for {group} in {self.path}")
+            self._used.add(index)
+            return self._entries[index]
+
+    def delay(self, entry: dict[str, Any]) -> float:
+        """
+        Return the seconds a replayed call should take.
+        """
+        if self.latency == "recorded":
+            return float(entry.get("seconds") or 0.0)
+        return float(self.latency or 0.0)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            with self._lock:
+                self._handle.close()
+                self._handle = None
+
+
+_CASSETTE: Cassette | None = None
+_CASSETTE_LOCK = threading.Lock()
+
+
+def get_cassette() -> Cassette | None:
+    """
+    Return the process-wide cassette from MICROCODE_RECORD or MICROCODE_REPLAY, opening it on first use.
+
+    MICROCODE_REPLAY_LATENCY sets the replay delay: "recorded" or seconds.
+    """
+    global _CASSETTE
+    record_path = os.getenv("MICROCODE_RECORD")
+    replay_path = os.getenv("MICROCODE_REPLAY")
+    if not record_path and not replay_path:
+        return None
+    with _CASSETTE_LOCK:
+        if _CASSETTE is None:
+            latency: str | float | None = os.getenv("MICROCODE_REPLAY_LATENCY") or None
+            if latency is not None and latency != "recorded":
+                try:
+                    latency = float(latency)
+                except ValueError:
+                    latency = None
+            if replay_path:
+                _CASSETTE = Cassette(replay_path, "replay", latency=latency)
+            else:
+                _CASSETTE = Cassette(record_path, "record")
+            import atexit
+
+            atexit.register(_CASSETTE.close)
+        return _CASSETTE
+
+
+def _dump_response(response: Any) -> tuple[Any, Any]:
+    hidden = getattr(response, "_hidden_params", None) or {}
+    data = response.model_dump() if hasattr(response, "model_dump") else response
+    return _jsonable(data), hidden.get("response_cost")
+
+
+def _load_response(entry: dict[str, Any]) -> Any:
+    from litellm import ModelResponse
+
+    response = ModelResponse(**entry["response"])
+    if entry.get("cost") is not None:
+        response._hidden_params["response_cost"] = entry["cost"]
+    return response
+
+
+def enable_cassette(lm: Any, role: str) -> None:
+    """
+    Record or replay an LM's requests through the active cassette.
+
+    Like enable_hedging, this wraps `forward`/`aforward`; it should be
+    applied before the other wrappers so that replay replaces only the
+    provider call. Failed calls are recorded and raise again in replay.
+    Replayed responses are not streamed token by token.
+
+    Args:
+        lm: The dspy LM (ignored if None or already wrapped)
+        role: "lm" or "sub_lm"; entries are matched within a role
+    """
+    if lm is None or getattr(lm, "_cassette", False):
+        return
+    cassette = get_cassette()
+    if cassette is None:
+        return
+
+    forward = lm.forward
+    aforward = lm.aforward
+
+    def record(key: str, response: Any, seconds: float) -> None:
+        data, cost = _dump_response(response)
+        cassette.record(
+            {"kind": "lm", "group": role, "model": lm.model, "key": key, "seconds": round(seconds, 6), "response": data, "cost": cost}
+        )
+
+    def record_error(key: str, err: Exception, seconds: float) -> None:
+        # Failures are kept so a replay fails over (or retries) where the recording did.
+        cassette.record(
+            {"kind": "lm", "group": role, "model": lm.model, "key": key, "seconds": round(seconds, 6), "error": f"{type(err).__name__}: {err}"}
+        )
+
+    def replayed(entry: dict[str, Any]) -> Any:
+        if entry.get("error"):
+            raise RuntimeError(entry["error"])
+        return _load_response(entry)
+
+    if cassette.mode == "record":
+
+        def cassette_forward(prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any) -> Any:
+            key = request_key(lm.model, prompt, messages, kwargs)
+            started = time.perf_counter()
+            try:
+                response = forward(prompt=prompt, messages=messages, **kwargs)
+            except Exception as err:
+                record_error(key, err, time.perf_counter() - started)
+                raise
+            record(key, response, time.perf_counter() - started)
+            return response
+
+        async def cassette_aforward(
+            prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any
+        ) -> Any:
+            key = request_key(lm.model, prompt, messages, kwargs)
+            started = time.perf_counter()
+            try:
+                response = await aforward(prompt=prompt, messages=messages, **kwargs)
+            except Exception as err:
+                record_error(key, err, time.perf_counter() - started)
+                raise
+            record(key, response, time.perf_counter() - started)
+            return response
+
+    else:
+
+        def cassette_forward(prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any) -> Any:
+            entry = cassette.take("lm", role, request_key(lm.model, prompt, messages, kwargs))
+            time.sleep(cassette.delay(entry))
+            return replayed(entry)
+
+        async def cassette_aforward(
+            prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any
+        ) -> Any:
+            import asyncio
+
+            entry = cassette.take("lm", role, request_key(lm.model, prompt, messages, kwargs))
+            await asyncio.sleep(cassette.delay(entry))
+            return replayed(entry)
+
+    lm._cassette = True
+    lm.forward = cassette_forward
+    lm.aforward = cassette_aforward
+
+
+def cassette_tool(tool: Callable[..., Any], name: str) -> Callable[..., Any]:
+    """
+    Record or replay a tool's results through the active cassette.
+
+    In replay the tool is not called; results that were not JSON come back
+    as their string form. Tools are returned unchanged without a cassette.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return tool
+
+    @functools.wraps(tool)
+    def call(*args: Any, **kwargs: Any) -> Any:
+        key = _tool_key(name, args, kwargs)
+        if cassette.mode == "replay":
+            entry = cassette.take("tool", name, key)
+            time.sleep(cassette.delay(entry))
+            if entry.get("error"):
+                raise RuntimeError(entry["error"])
+            return entry.get("result")
+
+        started = time.perf_counter()
+        entry: dict[str, Any] = {"kind": "tool", "group": name, "key": key}
+        try:
+            result = tool(*args, **kwargs)
+        except Exception as err:
+            entry.update(error=f"{type(err).__name__}: {err}", seconds=round(time.perf_counter() - started, 6))
+            cassette.record(entry)
+            raise
+        entry.update(result=_jsonable(result), seconds=round(time.perf_counter() - started, 6))
+        cassette.record(entry)
+        return result
+
+    return call
@@ -0,0 +1,215 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+from typing import Any
+
+from .constants import HTTP_KEEPALIVE_EXPIRY, HTTP_MAX_CONNECTIONS
+from .display import read_int_env
+
+
+class HttpPool:
+    """
+    Process-wide keep-alive HTTP clients shared by every LM the program builds.
+
+    One sync client and one async client per event loop are kept for the life
+    of the process, so agents rebuilt on /model reuse warm connections instead
+    of opening new ones. HTTP/2 is negotiated when the `h2` package is
+    installed, which the `httpx[http2]` dependency provides. Connection
+    setup is counted through the httpcore trace hook.
+    """
+
+    def __init__(
+        self,
+        max_connections: int | None = None,
+        keepalive_expiry: int | None = None,
+        http2: bool | None = None,
+    ):
+        import httpx
+
+        if max_connections is None:
+            max_connections = read_int_env("MICROCODE_HTTP_MAX_CONNECTIONS") or HTTP_MAX_CONNECTIONS
+        if keepalive_expiry is None:
+            keepalive_expiry = read_int_env("MICROCODE_HTTP_KEEPALIVE_EXPIRY") or HTTP_KEEPALIVE_EXPIRY
+        if http2 is None:
+            http2 = importlib.util.find_spec("h2") is not None
+        assert max_connections > 0, "max_connections must be positive"
+
+        self.http2 = http2
+        self._options = {
+            "http2": http2,
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            "timeout": httpx.Timeout(600.0, connect=5.0),
+            "follow_redirects": True,
+        }
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "connections": 0, "handshakes": 0}
+        self.client = httpx.Client(
+            event_hooks={"request": [self._on_request]}, **self._options
+        )
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _trace(self, event: str, info: dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self._count("connections")
+        elif event == "connection.start_tls.complete":
+            self._count("handshakes")
+
+    async def _atrace(self, event: str, info: dict[str, Any]) -> None:
+        self._trace(event, info)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def _on_request(self, request: Any) -> None:
+        self._count("requests")
+        request.extensions["trace"] = self._trace
+
+    async def _aon_request(self, request: Any) -> None:
+        self._count("requests")
+        request.extensions["trace"] = self._atrace
+
+    def async_client(self) -> Any:
+        """
+        Return the async client for the running event loop, creating it on first use.
+
+        Async connections belong to the loop that opened them, so each loop
+        (for example the AgentRunner loop) gets its own client.
+        """
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    event_hooks={"request": [self._aon_request]}, **self._options
+                )
+                self._async_clients[loop] = client
+        return client
+
+    def warm(self, url: str) -> threading.Thread:
+        """
+        Open a connection to url on a background thread so the first LM call skips setup.
+
+        Args:
+            url: Any URL on the API host, e.g. the api_base
+
+        Returns:
+            The started thread
+        """
+        assert isinstance(url, str), "url must be a str"
+
+        def run() -> None:
+            try:
+                self.client.head(url, timeout=5.0)
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=run, name="microcode-http-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return request, connection and TLS handshake counts plus the connection reuse rate.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        requests = counts["requests"]
+        reused = max(requests - counts["connections"], 0)
+        counts["reuse_rate"] = reused / requests if requests else 0.0
+        counts["http2"] = self.http2
+        return counts
+
+
+_POOL: HttpPool | None = None
+_POOL_LOCK = threading.Lock()
+_INSTALLED: HttpPool | None = None
+
+
+def get_http_pool() -> HttpPool:
+    """
+    Return the process-wide HttpPool, creating it on first use.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = HttpPool()
+        return _POOL
+
+
+def install_http_pool(pool: HttpPool) -> None:
+    """
+    Route litellm requests through the pool's clients.
+
+    OpenRouter and other providers served by litellm's generic HTTP handler
+    fetch their client from module-level getters, which are replaced here;
+    providers on the OpenAI SDK read litellm.client_session. Calls that pass
+    an explicit `client` are left alone. The getters are litellm internals:
+    any that a litellm release no longer has are left to litellm's own
+    clients.
+
+    Args:
+        pool: The pool to install
+    """
+    global _INSTALLED
+    if _INSTALLED is pool:
+        return
+
+    import litellm
+
+    litellm.client_session = pool.client
+    _INSTALLED = pool
+    try:
+        from litellm.llms.custom_httpx import llm_http_handler
+        from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler, HTTPHandler
+    except ImportError:
+        return
+
+    class PooledAsyncHandler(AsyncHTTPHandler):
+        # Skips AsyncHTTPHandler.__init__, which would build a throwaway client.
+        def __init__(self, client: Any):
+            self.timeout = None
+            self.event_hooks = None
+            self.client_alias = None
+            self.client = client
+
+    async_handlers: dict[int, AsyncHTTPHandler] = {}
+
+    def get_async_client(
+        llm_provider: Any,
+        params: dict[str, Any] | None = None,
+        shared_session: Any = None,
+    ) -> AsyncHTTPHandler:
+        client = pool.async_client()
+        handler = async_handlers.get(id(client))
+        if handler is None:
+            handler = async_handlers[id(client)] = PooledAsyncHandler(client)
+        return handler
+
+    if hasattr(llm_http_handler, "_get_httpx_client"):
+        sync_handler = HTTPHandler(client=pool.client)
+
+        def get_sync_client(params: dict[str, Any] | None = None) -> HTTPHandler:
+            return sync_handler
+
+        llm_http_handler._get_httpx_client = get_sync_client
+    if hasattr(llm_http_handler, "get_async_httpx_client"):
+        llm_http_handler.get_async_httpx_client = get_async_client
+
+
+def format_pool_stats(stats: dict[str, Any]) -> str:
+    """
+    Format HttpPool.stats() as a one-line summary.
+    """
+    protocol = "HTTP/2" if stats.get("http2") else "HTTP/1.1"
+    return (
+        f"{stats['requests']} requests over {stats['connections']} connections "
+        f"({stats['handshakes']} TLS handshakes, {stats['reuse_rate']:.0%} reused, {protocol})"
+    )
@@ -7,6 +7,9 @@ MODAIC_REPO_PATH = "farouk1/nanocode"
 
 # Display
 DEFAULT_HISTORY_LIMIT = 12
+HISTORY_TOKEN_FRACTION = 0.1
+PROMPT_LAYOUTS = ("cache", "legacy")
+DEFAULT_PROMPT_LAYOUT = "cache"
 BANNER_ART = """
                       ▓██████▓                                          
                     ░██████████░                                        
@@ -47,8 +50,48 @@ CACHE_DIR = os.path.join(
 OPENROUTER_KEY_PATH = os.path.join(CACHE_DIR, "openrouter_key.json")
 MODEL_CONFIG_PATH = os.path.join(CACHE_DIR, "model_config.json")
 SETTINGS_CONFIG_PATH = os.path.join(CACHE_DIR, "settings_config.json")
+TOKEN_CALIBRATION_PATH = os.path.join(CACHE_DIR, "token_calibration.json")
+MODEL_BENCH_PATH = os.path.join(CACHE_DIR, "model_bench.json")
+ROUTE_BASELINE_PATH = os.path.join(CACHE_DIR, "route_baseline.json")
+PROGRAM_STORE_DIR = os.path.join(CACHE_DIR, "programs")
+PROGRAM_STORE_LIMIT = 3
+PROGRAM_REFRESH_INTERVAL = 300
+PASTE_SPOOL_DIR = os.path.join(CACHE_DIR, "spool")
+PASTE_SPILL_THRESHOLD = 256 * 1024
+PASTE_HOT_BYTES = 8 * 1024 * 1024
+SESSIONS_DIR = os.path.join(CACHE_DIR, "sessions")
+SESSION_LIMIT = 50
+SESSION_RETENTION_DAYS = 30
+SESSION_FSYNC_INTERVAL = 1
+RESPONSE_CACHE_DIR = os.path.join(CACHE_DIR, "responses")
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+HTTP_MAX_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 120
+HEDGE_DEFAULT_DELAY = 30.0
+HEDGE_MIN_DELAY = 2.0
+HEDGE_MIN_SAMPLES = 5
+HEDGE_WINDOW = 50
+PROFILES_DIR = os.path.join(CACHE_DIR, "profiles")
+PROFILE_SAMPLE_DEPTH = 64
+TRACES_DIR = os.path.join(CACHE_DIR, "traces")
+TRACE_BUFFER_SIZE = 4096
+TRACE_FLUSH_INTERVAL = 1.0
+TRACE_FILE_MAX_BYTES = 8 * 1024 * 1024
+TRACE_MAX_FILES = 20
+TRACE_MAX_CHARS = 2000
+DAEMON_SOCKET_PATH = os.path.join(CACHE_DIR, "microcode.sock")
+DAEMON_MAX_AGENTS = 4
+MODEL_POOL_SIZE = 4
+MODEL_BENCH_CONCURRENCY = 8
+MODEL_BENCH_MAX_TOKENS = 256
+MODEL_BENCH_TIMEOUT = 60.0
+ROUTE_MODES = ("auto", "direct", "rlm")
+ROUTE_MAX_DIRECT_CHARS = 280
+ROUTE_BASELINE_WINDOW = 50
 
 # Models
+OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
 AVAILABLE_MODELS = {
     "1": ("GPT-5.2 Codex", "openai/gpt-5.2-codex"),
     "2": ("GPT-5.2", "openai/gpt-5.2"),
@@ -59,3 +102,28 @@ AVAILABLE_MODELS = {
     "7": ("Kimi K2 0905", "moonshotai/kimi-k2-0905"),
     "8": ("Minimax M2.1", "minimax/minimax-m2.1"),
 }
+
+# Approximate context windows (tokens) and characters per token by model
+DEFAULT_CONTEXT_WINDOW = 128000
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-5.2-codex": 400000,
+    "openai/gpt-5.2": 400000,
+    "anthropic/claude-opus-4.5": 200000,
+    "anthropic/claude-opus-4": 200000,
+    "qwen/qwen3-coder": 262144,
+    "google/gemini-3-flash-preview": 1048576,
+    "moonshotai/kimi-k2-0905": 262144,
+    "minimax/minimax-m2.1": 204800,
+}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+CHARS_PER_TOKEN = {
+    "openai/": 4.0,
+    "anthropic/": 3.5,
+    "google/": 4.0,
+    "qwen/": 3.7,
+    "moonshotai/": 3.7,
+    "minimax/": 3.7,
+}
+
+# Providers that only cache prompt prefixes at explicit cache_control breakpoints
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
@@ -0,0 +1,201 @@
+from collections import Counter, deque
+from datetime import datetime
+
+from .constants import DEFAULT_PROMPT_LAYOUT, PROMPT_LAYOUTS
+from .paste import PASTE_REF_RE, PasteStore
+from .tokens import chars_per_token, estimate_tokens
+
+
+class ConversationContext:
+    """
+    Append-only builder for the task string sent to the agent each turn.
+
+    Rendered history is kept between turns: a new turn is rendered once and
+    appended, turns leaving the window are sliced off the front, and only the
+    final task string is assembled per call.
+
+    The history window keeps the newest turns that fit in `token_budget`
+    (estimated tokens), capped at `history_limit` turns. Only pastes
+    referenced as [paste_N] by the current task or the window are included
+    in full; the rest are listed as one-line stubs.
+
+    The "cache" layout puts stable sections (cwd, history, pastes) before the
+    time stamp and the current task so consecutive turns share a prompt
+    prefix that providers can cache. The "legacy" layout keeps the original
+    order with the task first.
+    """
+
+    def __init__(
+        self,
+        history_limit: int,
+        token_budget: int | None = None,
+        model: str | None = None,
+        pastes: PasteStore | None = None,
+        layout: str = DEFAULT_PROMPT_LAYOUT,
+    ):
+        assert isinstance(history_limit, int), "history_limit must be an int"
+        assert history_limit > 0, "history_limit must be positive"
+        assert token_budget is None or token_budget > 0, "token_budget must be positive"
+        assert layout in PROMPT_LAYOUTS, f"layout must be one of {PROMPT_LAYOUTS}"
+
+        self.history_limit = history_limit
+        self.token_budget = token_budget
+        self.model = model
+        self.layout = layout
+        self.pastes = pastes if pastes is not None else PasteStore()
+        self._turns: deque[tuple[dict[str, object], str, int]] = deque()
+        self._history_text = ""
+        self._history_tokens = 0
+        self._history_refs: Counter[str] = Counter()
+
+    @property
+    def turns(self) -> list[dict[str, object]]:
+        """
+        Return the turns currently inside the history window.
+        """
+        return [turn for turn, _rendered, _tokens in self._turns]
+
+    @property
+    def history_tokens(self) -> int:
+        """
+        Return the estimated tokens of the rendered history window.
+        """
+        return self._history_tokens
+
+    def add_turn(self, user: str, assistant: str) -> None:
+        """
+        Append a completed turn, dropping the oldest turns outside the window.
+
+        Args:
+            user: The user input for the turn
+            assistant: The assistant answer for the turn
+        """
+        rendered = self._render_turn(user, assistant)
+        tokens = estimate_tokens(rendered, self.model)
+        self._turns.append(
+            ({"user": user, "assistant": assistant, "pasted_content": None}, rendered, tokens)
+        )
+        self._history_text += rendered
+        self._history_tokens += tokens
+        self._history_refs.update(set(PASTE_REF_RE.findall(rendered)))
+        self._trim()
+
+    def set_token_budget(self, token_budget: int | None, model: str | None = None) -> None:
+        """
+        Change the token budget (and estimation model), trimming the window to fit.
+
+        Args:
+            token_budget: New history token budget, or None for a turn count only
+            model: Model ID used for token estimation
+        """
+        assert token_budget is None or token_budget > 0, "token_budget must be positive"
+
+        self.token_budget = token_budget
+        if model is not None and model != self.model:
+            self.model = model
+            self._turns = deque(
+                (turn, rendered, estimate_tokens(rendered, model))
+                for turn, rendered, _tokens in self._turns
+            )
+            self._history_tokens = sum(tokens for _turn, _rendered, tokens in self._turns)
+        self._trim()
+
+    def _render_turn(self, user: str, assistant: str) -> str:
+        rendered = f"  User: {user}\n  Assistant: {assistant}\n"
+        if self.token_budget is None or estimate_tokens(rendered, self.model) <= self.token_budget:
+            return rendered
+
+        # A single turn larger than the whole budget keeps the start of its answer.
+        max_chars = int(self.token_budget * chars_per_token(self.model))
+        keep = max(max_chars - len(user) - 64, 0)
+        marker = f" ... [truncated {len(assistant) - keep} chars]"
+        return f"  User: {user}\n  Assistant: {assistant[:keep]}{marker}\n"
+
+    def _trim(self) -> None:
+        dropped = 0
+        while len(self._turns) > self.history_limit or (
+            self.token_budget is not None
+            and self._history_tokens > self.token_budget
+            and len(self._turns) > 1
+        ):
+            _turn, old_rendered, old_tokens = self._turns.popleft()
+            dropped += len(old_rendered)
+            self._history_tokens -= old_tokens
+            self._history_refs.subtract(set(PASTE_REF_RE.findall(old_rendered)))
+        if dropped:
+            self._history_text = self._history_text[dropped:]
+
+    def clear_history(self) -> None:
+        """
+        Drop all turns while keeping pasted content.
+        """
+        self._turns.clear()
+        self._history_text = ""
+        self._history_tokens = 0
+        self._history_refs.clear()
+
+    def referenced_pastes(self, task: str) -> list[str]:
+        """
+        Return paste IDs referenced by the task or the history window, in paste order.
+        """
+        referenced = set(PASTE_REF_RE.findall(task))
+        referenced.update(
+            paste_id for paste_id, count in self._history_refs.items() if count > 0
+        )
+        return [paste_id for paste_id in self.pastes.ids if paste_id in referenced]
+
+    def _render_pastes(self, task: str) -> str:
+        if not len(self.pastes):
+            return "  None\n"
+
+        referenced = set(self.referenced_pastes(task))
+        parts = []
+        for paste_id in self.pastes.ids:
+            if paste_id in referenced:
+                parts.append(f"[{paste_id}]:\n{self.pastes.get(paste_id)}\n")
+            else:
+                parts.append(f"{self.pastes.summary(paste_id)}\n")
+        return "".join(parts)
+
+    def render(self, task: str, cwd: str, now: datetime | None = None) -> str:
+        """
+        Build the task string for the agent.
+
+        Args:
+            task: The current user task
+            cwd: The current working directory
+            now: Timestamp to include (defaults to the current time)
+
+        Returns:
+            The full task string including history and pasted content
+        """
+        if now is None:
+            now = datetime.now()
+        history = self._history_text or "  None\n"
+        pastes = self._render_pastes(task)
+        stamp = f"time: {now.strftime('%Y-%m-%d %H:%M:%S')}\n"
+
+        if self.layout == "legacy":
+            return "".join(
+                (
+                    f"cwd: {cwd}\n",
+                    stamp,
+                    f"Current Task: {task}\n",
+                    "Previous Conversation History:\n",
+                    history,
+                    "Pasted Content:\n",
+                    pastes,
+                )
+            )
+
+        return "".join(
+            (
+                f"cwd: {cwd}\n",
+                "Previous Conversation History:\n",
+                history,
+                "Pasted Content:\n",
+                pastes,
+                stamp,
+                f"Current Task: {task}\n",
+            )
+        )
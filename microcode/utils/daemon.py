@@ -0,0 +1,364 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from .constants import DAEMON_MAX_AGENTS, DAEMON_SOCKET_PATH, ROUTE_MODES
+from .router import TaskRouter, answer_directly
+from .stats import lm_markers, turn_stats
+from .tracing import record_turn
+
+
+def _socket_path(socket_path: str | None) -> str:
+    return socket_path or os.getenv("MICROCODE_DAEMON_SOCKET") or DAEMON_SOCKET_PATH
+
+
+def _config_key(config: dict[str, Any], cwd: str) -> str:
+    return json.dumps({"cwd": cwd, "config": config}, sort_keys=True, default=str)
+
+
+def _close_server(server: Any) -> None:
+    close = getattr(server, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+def _send(stream: Any, event: dict[str, Any]) -> None:
+    stream.write((json.dumps(event) + "\n").encode("utf-8"))
+    stream.flush()
+
+
+class MicrocodeDaemon(socketserver.ThreadingUnixStreamServer):
+    """
+    Long-lived server that keeps warm agents and MCP servers for `microcode task`.
+
+    Each connection sends one JSON line with a task, its resolved program
+    config and the client's working directory (and optionally
+    `"stream": true`, and a `"route"` mode with `"route_lm"` to route the
+    task like `microcode task` does in-process), and receives JSON line
+    events back: "status", "token" while streaming, then "answer" (with
+    the routing decision, if routed) or "error". Agents are cached per
+    working directory and config in a small LRU; calls on the same agent
+    are serialized. The task runs with the process in the client's
+    directory, so tasks from different directories wait for each other.
+    MCP servers with a "command" are started again for each directory
+    other than the daemon's own when `load_mcp_server` is given, and
+    closed when the last agent for that directory is evicted.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str | None,
+        build_agent: Callable[[dict[str, Any]], Any],
+        mcp_servers: dict[str, dict[str, Any]] | None = None,
+        register_mcp_server: Callable[[Any, str, Any], list[str]] | None = None,
+        max_agents: int = DAEMON_MAX_AGENTS,
+        load_mcp_server: Callable[[str], Any] | None = None,
+    ):
+        assert callable(build_agent), "build_agent must be callable"
+        assert max_agents > 0, "max_agents must be positive"
+
+        self.build_agent = build_agent
+        self.mcp_servers = mcp_servers or {}
+        self.register_mcp_server = register_mcp_server
+        self.load_mcp_server = load_mcp_server
+        self.max_agents = max_agents
+        self.home = os.getcwd()
+        self._agents: OrderedDict[str, tuple[Any, threading.Lock, str]] = OrderedDict()
+        self._agents_lock = threading.Lock()
+        self._workspace_servers: dict[str, dict[str, dict[str, Any]]] = {self.home: self.mcp_servers}
+        self._workspace_locks: dict[str, threading.Lock] = {}
+        self._cwd = self.home
+        self._cwd_users = 0
+        self._cwd_changed = threading.Condition()
+
+        # Absolute, since tasks change the working directory.
+        socket_path = os.path.abspath(_socket_path(socket_path))
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        if os.path.exists(socket_path):
+            if daemon_available(socket_path):
+                raise RuntimeError(f"A microcode daemon is already listening on {socket_path}")
+            os.remove(socket_path)
+        super().__init__(socket_path, _DaemonHandler)
+        try:
+            os.chmod(socket_path, 0o600)
+        except OSError:
+            pass
+
+    @contextmanager
+    def workspace(self, cwd: str) -> Iterator[None]:
+        """
+        Hold the process in a working directory while tasks for it run.
+
+        Tasks for the same directory run concurrently; a task for another
+        directory waits until they have finished.
+        """
+        with self._cwd_changed:
+            while self._cwd_users and self._cwd != cwd:
+                self._cwd_changed.wait()
+            if self._cwd != cwd:
+                os.chdir(cwd)
+                self._cwd = cwd
+            self._cwd_users += 1
+        try:
+            yield
+        finally:
+            with self._cwd_changed:
+                self._cwd_users -= 1
+                self._cwd_changed.notify_all()
+
+    def _servers_for(self, cwd: str) -> dict[str, dict[str, Any]]:
+        with self._agents_lock:
+            servers = self._workspace_servers.get(cwd)
+            start_lock = self._workspace_locks.setdefault(cwd, threading.Lock())
+        if servers is not None:
+            return servers
+
+        # One set of servers per directory, even when several agents for it are built at once.
+        with start_lock:
+            with self._agents_lock:
+                servers = self._workspace_servers.get(cwd)
+            if servers is not None:
+                return servers
+
+            servers = {}
+            for server_name, info in self.mcp_servers.items():
+                if self.load_mcp_server is not None and info.get("command"):
+                    servers[server_name] = {
+                        "server": self.load_mcp_server(info["command"]),
+                        "command": info["command"],
+                        "tools": [],
+                    }
+                else:
+                    servers[server_name] = info
+            with self._agents_lock:
+                self._workspace_servers[cwd] = servers
+            return servers
+
+    def _close_servers(self, servers: dict[str, dict[str, Any]]) -> None:
+        for server_name, info in servers.items():
+            if info is not self.mcp_servers.get(server_name):
+                _close_server(info["server"])
+
+    def agent_for(self, config: dict[str, Any], cwd: str | None = None) -> tuple[Any, threading.Lock]:
+        """
+        Return a warm agent for the config and working directory, building and registering MCP tools on a miss.
+
+        Call inside `workspace(cwd)`, so that the agent and its MCP servers start in that directory.
+        """
+        cwd = cwd or self.home
+        key = _config_key(config, cwd)
+        with self._agents_lock:
+            if key in self._agents:
+                self._agents.move_to_end(key)
+                agent, lock, _cwd = self._agents[key]
+                return agent, lock
+
+        agent = self.build_agent(config)
+        if self.register_mcp_server is not None:
+            for server_name, info in self._servers_for(cwd).items():
+                info["tools"] = self.register_mcp_server(agent, server_name, info["server"])
+
+        with self._agents_lock:
+            if key not in self._agents:
+                self._agents[key] = (agent, threading.Lock(), cwd)
+            self._agents.move_to_end(key)
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+            # MCP servers started for a directory are closed with its last agent. Tasks only run
+            # in one directory at a time (see workspace), so no task is still using them.
+            live = {agent_cwd for _agent, _lock, agent_cwd in self._agents.values()}
+            stale = [
+                self._workspace_servers.pop(path)
+                for path in list(self._workspace_servers)
+                if path != self.home and path not in live
+            ]
+            agent, lock, _cwd = self._agents[key]
+        for servers in stale:
+            self._close_servers(servers)
+        return agent, lock
+
+    def server_close(self) -> None:
+        super().server_close()
+        with self._agents_lock:
+            stale = [servers for path, servers in self._workspace_servers.items() if path != self.home]
+            self._workspace_servers = {self.home: self.mcp_servers}
+        for servers in stale:
+            self._close_servers(servers)
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    server: MicrocodeDaemon
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line.strip():
+            return
+
+        try:
+            request = json.loads(line.decode("utf-8"))
+            task = request["task"]
+            config = request["config"]
+            stream = bool(request.get("stream", False))
+            cwd = request.get("cwd") or self.server.home
+            route = request.get("route")
+            route_lm = bool(request.get("route_lm", False))
+            assert isinstance(task, str), "task must be a str"
+            assert isinstance(config, dict), "config must be a dict"
+            assert route is None or route in ROUTE_MODES, f"route must be one of {ROUTE_MODES}"
+            assert isinstance(cwd, str) and os.path.isabs(cwd), "cwd must be an absolute path"
+            assert os.path.isdir(cwd), f"cwd {cwd} is not a directory"
+        except (ValueError, KeyError, AssertionError) as err:
+            _send(self.wfile, {"event": "error", "message": f"Invalid request: {err}"})
+            return
+
+        try:
+            with self.server.workspace(cwd):
+                self._run(task, config, cwd, stream, TaskRouter(route, route_lm) if route else None)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except Exception as err:
+            try:
+                _send(self.wfile, {"event": "error", "message": str(err)})
+            except OSError:
+                pass
+
+    def _run(
+        self, task: str, config: dict[str, Any], cwd: str, stream: bool, router: TaskRouter | None = None
+    ) -> None:
+        agent, lock = self.server.agent_for(config, cwd)
+        decision = None
+        with lock:
+            _send(self.wfile, {"event": "status", "message": "running"})
+            markers = lm_markers(agent)
+            started_at = time.time()
+            started = time.perf_counter()
+            try:
+                result = None
+                if router is not None:
+                    decision = router.route(task, agent.sub_lm)
+                    if decision["route"] == "direct":
+                        result = answer_directly(agent.lm, task)
+                        if result is None:
+                            router.escalate(decision)
+                if result is None and stream:
+                    from .streaming import stream_agent
+
+                    result = stream_agent(agent, task, self._send_stream_event)
+                elif result is None:
+                    result = agent(task=task)
+            except Exception as err:
+                record_turn(task, None, started_at, time.perf_counter() - started, error=err)
+                raise
+            stats = turn_stats(agent, result, markers, time.perf_counter() - started)
+            record_turn(task, result, started_at, stats["seconds"])
+            if router is not None:
+                router.record(decision, task, started_at, stats["seconds"])
+                stats["route"] = decision["route"]
+                stats["saved_seconds"] = decision["saved_seconds"]
+        event = {"event": "answer", "text": result.answer, "stats": stats}
+        if decision is not None:
+            event["decision"] = decision
+        _send(self.wfile, event)
+
+    def _send_stream_event(self, kind: str, text: str) -> None:
+        if kind == "status":
+            _send(self.wfile, {"event": "status", "message": text})
+        else:
+            _send(self.wfile, {"event": kind, "text": text})
+
+
+def daemon_available(socket_path: str | None = None) -> bool:
+    """
+    Return True if a daemon accepts connections on the socket path.
+    """
+    socket_path = _socket_path(socket_path)
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def request_task(
+    task: str,
+    config: dict[str, Any],
+    socket_path: str | None = None,
+    on_event: Callable[[dict[str, Any]], None] | None = None,
+    stream: bool = False,
+    cwd: str | None = None,
+    route: str | None = None,
+    route_lm: bool = False,
+) -> str | None:
+    """
+    Run a task on the daemon.
+
+    Args:
+        task: The task prompt
+        config: Resolved program config
+        socket_path: Daemon socket path (defaults to MICROCODE_DAEMON_SOCKET or DAEMON_SOCKET_PATH)
+        on_event: Optional callback receiving every event sent by the daemon
+        stream: Ask the daemon for "token" events and per-iteration status events
+        cwd: Directory the task runs in (default the current directory)
+        route: Have the daemon route the task ("auto", "direct" or "rlm"); None always runs the RLM
+        route_lm: Let the daemon ask the sub_lm when routing heuristics are undecided
+
+    Returns:
+        The answer text, or None if no daemon is listening
+
+    Raises:
+        RuntimeError: If the daemon reports an error for the task
+    """
+    assert isinstance(task, str), "task must be a str"
+    assert isinstance(config, dict), "config must be a dict"
+
+    socket_path = _socket_path(socket_path)
+    if not os.path.exists(socket_path):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.connect(socket_path)
+        except OSError:
+            return None
+
+        request = {"task": task, "config": config, "cwd": os.path.abspath(cwd or os.getcwd())}
+        if stream:
+            request["stream"] = True
+        if route:
+            request["route"] = route
+            request["route_lm"] = route_lm
+        payload = json.dumps(request) + "\n"
+        client.sendall(payload.encode("utf-8"))
+
+        with client.makefile("rb") as stream:
+            for line in stream:
+                event = json.loads(line.decode("utf-8"))
+                if on_event is not None:
+                    on_event(event)
+                if event.get("event") == "answer":
+                    return event.get("text", "")
+                if event.get("event") == "error":
+                    raise RuntimeError(event.get("message", "daemon error"))
+    finally:
+        client.close()
+
+    raise RuntimeError("Daemon closed the connection without an answer")
@@ -78,9 +78,9 @@ def render_markdown(text: str) -> str:
     # 4. Strikethrough
     result = re.sub(r"~~(.+?)~~", f"{strikethrough}\\1{reset}", result, flags=re.DOTALL)
 
-    # 5. Restore code blocks
-    for code_match in code_matches:
-        result = result.replace(code_placeholder, code_match, 1)
+    # 5. Restore code blocks in order, in one pass
+    codes = iter(code_matches)
+    result = re.sub(code_placeholder, lambda match: next(codes, match.group(0)), result)
 
     return result
 
@@ -293,6 +293,9 @@ def print_help() -> None:
     click.echo(f"  {BLUE}/key{RESET}             Set or clear openrouter key")
     click.echo(f"  {BLUE}/clear{RESET}           Clear the screen")
     click.echo(f"  {BLUE}/c{RESET}               Clear conversation history")
+    click.echo(f"  {BLUE}/resume{RESET}          List or resume saved sessions")
+    click.echo(f"  {BLUE}/stats{RESET}           Show session time, tokens and cost")
+    click.echo(f"  {BLUE}/pool{RESET}            Show HTTP connection reuse")
     click.echo(f"  {BLUE}/q{RESET}               Quit")
     click.echo(f"  {BLUE}/mcp{RESET}             Manage MCP servers")
     click.echo(f"  {BLUE}/reset{RESET}           Reset to default configuration")
@@ -0,0 +1,342 @@
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable
+
+from .cassettes import enable_cassette
+from .constants import (
+    AVAILABLE_MODELS,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW,
+)
+
+_LATENCIES: dict[str, deque] = {}
+_COUNTS = {"calls": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0}
+_LOCK = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _LOCK:
+        _COUNTS[name] += 1
+
+
+def hedge_counts() -> dict[str, int]:
+    """
+    Return process-wide counts of LM calls, hedged requests, hedges that won and fallbacks.
+    """
+    with _LOCK:
+        return dict(_COUNTS)
+
+
+def record_latency(model: str, seconds: float) -> None:
+    """
+    Record the latency of a successful LM call for a model.
+    """
+    with _LOCK:
+        _LATENCIES.setdefault(model, deque(maxlen=HEDGE_WINDOW)).append(seconds)
+
+
+def p95_latency(model: str) -> float | None:
+    """
+    Return the 95th percentile of recent call latencies for a model.
+
+    Returns:
+        Seconds, or None until HEDGE_MIN_SAMPLES calls have been seen
+    """
+    with _LOCK:
+        samples = sorted(_LATENCIES.get(model, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+
+def hedging_enabled() -> bool:
+    """
+    Return True if MICROCODE_HEDGE=1 or a fallback chain is configured.
+    """
+    return os.getenv("MICROCODE_HEDGE") == "1" or bool(os.getenv("MICROCODE_FALLBACK_MODELS"))
+
+
+def fallback_chain(model: str) -> list[str]:
+    """
+    Build the fallback models for a primary model from MICROCODE_FALLBACK_MODELS.
+
+    The variable is a comma-separated list of model IDs or AVAILABLE_MODELS
+    numbers; "auto" expands to every available model in menu order. The
+    primary model and duplicates are dropped.
+
+    Args:
+        model: The primary model ID
+
+    Returns:
+        Normalized model IDs in the order they are tried
+    """
+    from .models import normalize_model_id
+
+    chain: list[str] = []
+    for item in (os.getenv("MICROCODE_FALLBACK_MODELS") or "").split(","):
+        item = item.strip()
+        if item == "auto":
+            candidates = [model_id for _name, model_id in AVAILABLE_MODELS.values()]
+        elif item in AVAILABLE_MODELS:
+            candidates = [AVAILABLE_MODELS[item][1]]
+        else:
+            candidates = [item] if item else []
+        for candidate in candidates:
+            candidate = normalize_model_id(candidate)
+            if candidate != model and candidate not in chain:
+                chain.append(candidate)
+    return chain
+
+
+def _fallback_lm(lm: Any, model: str, role: str | None) -> Any:
+    """
+    Copy an LM for a fallback model, without the wrappers already installed on the primary.
+
+    `LM.copy` keeps instance-level `forward`/`aforward`, which are bound to
+    the primary model, so they are dropped and the fallback gets its own
+    prompt caching and cassette group.
+    """
+    from .usage import enable_prompt_caching
+
+    fallback = lm.copy(model=model)
+    for name in ("forward", "aforward", "_cassette", "_cache_split"):
+        fallback.__dict__.pop(name, None)
+    kwargs = getattr(fallback, "kwargs", None)
+    if isinstance(kwargs, dict):
+        kwargs.pop("cache_control_injection_points", None)
+    enable_prompt_caching(fallback)
+    if role is not None:
+        enable_cassette(fallback, f"{role}@{model}")
+    return fallback
+
+
+class HedgePolicy:
+    """
+    Latency-aware request policy for one dspy LM.
+
+    Each request starts on the primary model. If it has not answered after
+    the hedge delay (the model's recent p95 latency, or MICROCODE_HEDGE_DELAY
+    if set), a second request is fired at the first fallback model, or at the
+    same model when no chain is configured. The first response wins. In
+    `aforward` the other request is cancelled; in `forward` it runs on a
+    thread that cannot be interrupted, so it is abandoned and still runs to
+    completion. A request that fails fails over to the next unused model in
+    the chain. Hedged and fallback requests run with dspy's `send_stream`
+    unset, so only the primary request streams tokens to the caller.
+
+    Args:
+        lm: The primary dspy LM
+        chain: Fallback model IDs, in the order they are tried
+        delay: Fixed hedge delay in seconds, or None for the p95 latency
+        role: "lm" or "sub_lm"; fallbacks record and replay under "<role>@<model>"
+    """
+
+    def __init__(self, lm: Any, chain: list[str], delay: float | None = None, role: str | None = None):
+        self.model = lm.model
+        self.delay = delay
+        self._forward = lm.forward
+        self._aforward = lm.aforward
+        self._fallbacks = [_fallback_lm(lm, model, role) for model in chain]
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> "HedgePolicy":
+        # Program copies share the policy and its latency history.
+        return self
+
+    def hedge_delay(self) -> float:
+        """
+        Return the seconds to wait before hedging a request.
+        """
+        if self.delay is not None:
+            return self.delay
+        p95 = p95_latency(self.model)
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(p95, HEDGE_MIN_DELAY)
+
+    def _targets(self) -> tuple[tuple[str, Callable, Callable], list[tuple[str, Callable, Callable]]]:
+        primary = (self.model, self._forward, self._aforward)
+        fallbacks = [(lm.model, lm.forward, lm.aforward) for lm in self._fallbacks]
+        return primary, fallbacks
+
+    def forward(self, prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any) -> Any:
+        """
+        Hedged replacement for LM.forward.
+        """
+        _count("calls")
+        primary, unused = self._targets()
+        started: dict[Future, tuple[str, float]] = {}
+
+        def start(target: tuple[str, Callable, Callable]) -> Future:
+            model, forward, _aforward = target
+            # Only the first request streams.
+            if started:
+                forward = _without_stream(forward)
+            future = _spawn(forward, prompt=prompt, messages=messages, **kwargs)
+            started[future] = (model, time.monotonic())
+            return future
+
+        first = start(primary)
+        pending = {first}
+        hedged = False
+        error: BaseException | None = None
+        while pending:
+            timeout = None if hedged else max(self.hedge_delay() - (time.monotonic() - started[first][1]), 0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                _count("hedges")
+                pending.add(start(unused.pop(0) if unused else primary))
+                continue
+            for future in done:
+                if future.exception() is None:
+                    model, begin = started[future]
+                    record_latency(model, time.monotonic() - begin)
+                    if future is not first:
+                        _count("hedge_wins")
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                error = future.exception()
+            if not pending and unused:
+                hedged = True
+                _count("fallbacks")
+                pending.add(start(unused.pop(0)))
+        raise error
+
+    async def aforward(
+        self,
+        prompt: str | None = None,
+        messages: list[dict[str, Any]] | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Hedged replacement for LM.aforward; losing requests are cancelled.
+        """
+        _count("calls")
+        primary, unused = self._targets()
+        started: dict[asyncio.Task, tuple[str, float]] = {}
+
+        def start(target: tuple[str, Callable, Callable]) -> asyncio.Task:
+            model, _forward, aforward = target
+            if started:
+                aforward = _without_astream(aforward)
+            task = asyncio.ensure_future(aforward(prompt=prompt, messages=messages, **kwargs))
+            started[task] = (model, time.monotonic())
+            return task
+
+        first = start(primary)
+        pending = {first}
+        hedged = False
+        error: BaseException | None = None
+        try:
+            while pending:
+                timeout = None if hedged else max(self.hedge_delay() - (time.monotonic() - started[first][1]), 0)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    _count("hedges")
+                    pending.add(start(unused.pop(0) if unused else primary))
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        model, begin = started[task]
+                        record_latency(model, time.monotonic() - begin)
+                        if task is not first:
+                            _count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+                if not pending and unused:
+                    hedged = True
+                    _count("fallbacks")
+                    pending.add(start(unused.pop(0)))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def _without_stream(forward: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap a forward so it runs with dspy's `send_stream` unset.
+
+    The duplicate request inherits the caller's context; without this it
+    would push its tokens into the same stream as the primary request.
+    Without dspy loaded there is no stream, and importing it here would
+    delay the hedge.
+    """
+
+    def quiet_forward(**kwargs: Any) -> Any:
+        dspy = sys.modules.get("dspy")
+        if dspy is None:
+            return forward(**kwargs)
+        with dspy.context(send_stream=None):
+            return forward(**kwargs)
+
+    return quiet_forward
+
+
+def _without_astream(aforward: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Async _without_stream.
+    """
+
+    async def quiet_aforward(**kwargs: Any) -> Any:
+        dspy = sys.modules.get("dspy")
+        if dspy is None:
+            return await aforward(**kwargs)
+        with dspy.context(send_stream=None):
+            return await aforward(**kwargs)
+
+    return quiet_aforward
+
+
+def _spawn(fn: Callable[..., Any], **kwargs: Any) -> Future:
+    """
+    Run fn on a daemon thread in the caller's context, returning a Future for its result.
+
+    Daemon threads are used so an abandoned request never delays exit.
+    """
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn, **kwargs))
+        except BaseException as err:
+            future.set_exception(err)
+
+    threading.Thread(target=run, name="microcode-hedge", daemon=True).start()
+    return future
+
+
+def enable_hedging(lm: Any, role: str | None = None) -> None:
+    """
+    Install a HedgePolicy on a dspy LM when hedging is enabled.
+
+    Args:
+        lm: The dspy LM to wrap (ignored if None or already hedged)
+        role: "lm" or "sub_lm", for the fallbacks' cassette groups
+    """
+    if lm is None or not hedging_enabled() or getattr(lm, "hedge_policy", None) is not None:
+        return
+
+    delay = os.getenv("MICROCODE_HEDGE_DELAY")
+    try:
+        fixed_delay = float(delay) if delay else None
+    except ValueError:
+        fixed_delay = None
+
+    policy = HedgePolicy(lm, fallback_chain(lm.model), delay=fixed_delay, role=role)
+    lm.hedge_policy = policy
+    lm.forward = policy.forward
+    lm.aforward = policy.aforward
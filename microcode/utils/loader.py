@@ -0,0 +1,96 @@
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import click
+
+from .constants import CYAN, DIM, GREEN, RESET
+
+_SPINNER_FRAMES = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+
+
+class AgentLoader:
+    """
+    Build the agent on a worker thread while the session starts up.
+
+    The build callable receives a stage callback so that callers waiting on
+    the result can show what the loader is currently doing.
+    """
+
+    def __init__(self, build: Callable[[Callable[[str], None]], Any]):
+        assert callable(build), "build must be callable"
+
+        self.stage = "Starting"
+        self._started = time.monotonic()
+        self._finished: float | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="microcode-agent"
+        )
+        self._future: Future = self._executor.submit(self._run, build)
+
+    def _run(self, build: Callable[[Callable[[str], None]], Any]) -> Any:
+        try:
+            return build(self._set_stage)
+        finally:
+            self._finished = time.monotonic()
+
+    def _set_stage(self, label: str) -> None:
+        self.stage = label
+
+    def done(self) -> bool:
+        """
+        Return True once the agent has loaded (or failed to load).
+        """
+        return self._future.done()
+
+    def elapsed(self) -> float:
+        """
+        Return the seconds spent loading so far, or in total once finished.
+        """
+        end = self._finished if self._finished is not None else time.monotonic()
+        return end - self._started
+
+    def result(self) -> Any:
+        """
+        Wait for the agent, drawing a status line with the current load stage.
+
+        Returns:
+            The built agent
+
+        Raises:
+            Exception: Whatever the build callable raised
+        """
+        if self._future.done():
+            return self._future.result()
+
+        show_status = sys.stdout.isatty()
+        frame = 0
+        while True:
+            try:
+                agent = self._future.result(timeout=0.1)
+                break
+            except TimeoutError:
+                if show_status:
+                    spinner = _SPINNER_FRAMES[frame % len(_SPINNER_FRAMES)]
+                    click.echo(
+                        f"\r\033[K{CYAN}{spinner}{RESET} {DIM}{self.stage}... {self.elapsed():.1f}s{RESET}",
+                        nl=False,
+                    )
+                frame += 1
+            except BaseException:
+                if show_status and frame:
+                    click.echo("\r\033[K", nl=False)
+                raise
+
+        if show_status and frame:
+            click.echo(
+                f"\r\033[K{GREEN}⏺{RESET} {DIM}Agent ready in {self.elapsed():.1f}s{RESET}"
+            )
+        return agent
+
+    def shutdown(self) -> None:
+        """
+        Release the worker thread, waiting for an in-flight build to finish.
+        """
+        self._executor.shutdown(wait=True)
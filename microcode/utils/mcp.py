@@ -1,14 +1,18 @@
 import json
 import re
 import shlex
-from typing import Any
-
-from modaic import PrecompiledProgram
+from typing import TYPE_CHECKING, Any
 
+from .cassettes import cassette_tool
 from .constants import GREEN, RED, RESET, YELLOW
+from .profiler import traced_tool
+from .tracing import trace_tool
+
+if TYPE_CHECKING:
+    from modaic import PrecompiledProgram
 
 
-def register_mcp_server(agent: PrecompiledProgram, name: str, server: Any) -> list[str]:
+def register_mcp_server(agent: "PrecompiledProgram", name: str, server: Any) -> list[str]:
     """
     Register MCP server tools with the agent.
 
@@ -20,6 +24,8 @@ def register_mcp_server(agent: PrecompiledProgram, name: str, server: Any) -> li
     Returns:
         List of registered tool names
     """
+    from modaic import PrecompiledProgram
+
     assert isinstance(name, str), "name must be a str"
     assert isinstance(agent, PrecompiledProgram), "agent must be PrecompiledProgram"
     assert hasattr(server, "tools"), "server must expose tools"
@@ -27,13 +33,23 @@ def register_mcp_server(agent: PrecompiledProgram, name: str, server: Any) -> li
     tool_names: list[str] = []
     for tool in server.tools:
         tool_name = f"{name}_{tool.__name__}"
+        tool = trace_tool(traced_tool(cassette_tool(tool, tool_name), tool_name), tool_name)
         agent.set_tool(tool_name, tool)
         tool_names.append(tool_name)
     return tool_names
 
 
+def load_mcp_command(server_cmd: str) -> Any:
+    """
+    Start an MCP server from its command line in the current directory.
+    """
+    from mcp2py import load
+
+    return load(server_cmd)
+
+
 def handle_add_mcp_command(
-    user_input: str, agent: PrecompiledProgram, mcp_servers: dict[str, dict[str, Any]]
+    user_input: str, agent: "PrecompiledProgram", mcp_servers: dict[str, dict[str, Any]]
 ) -> bool:
     """
     Handle the /mcp add command.
@@ -46,6 +62,8 @@ def handle_add_mcp_command(
     Returns:
         True if command was handled, False otherwise
     """
+    from modaic import PrecompiledProgram
+
     assert isinstance(user_input, str), "user_input must be a str"
     assert isinstance(agent, PrecompiledProgram), "agent must be PrecompiledProgram"
     assert isinstance(mcp_servers, dict), "mcp_servers must be a dict"
@@ -0,0 +1,227 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .constants import (
+    MODEL_BENCH_CONCURRENCY,
+    MODEL_BENCH_MAX_TOKENS,
+    MODEL_BENCH_TIMEOUT,
+    OPENROUTER_API_BASE,
+)
+from .stats import percentile
+
+# Fixed probe set: a one-word reply (TTFT dominates), a short code answer and a short prose answer.
+PROBE_PROMPTS = (
+    "Reply with the single word: ready",
+    "Write a Python function that returns the n-th Fibonacci number iteratively. Code only.",
+    "In three sentences, explain what a race condition is and how a lock prevents it.",
+)
+
+
+def _failure(started: float, error: str) -> dict[str, Any]:
+    return {
+        "ok": False,
+        "seconds": time.perf_counter() - started,
+        "ttft": None,
+        "tokens": 0,
+        "tokens_per_sec": None,
+        "error": error[:200],
+    }
+
+
+def probe_model(
+    model: str,
+    prompt: str,
+    api_base: str | None = None,
+    api_key: str | None = None,
+    max_tokens: int = MODEL_BENCH_MAX_TOKENS,
+    timeout: float = MODEL_BENCH_TIMEOUT,
+) -> dict[str, Any]:
+    """
+    Send one streamed chat completion and time it.
+
+    The request goes straight to the OpenAI-compatible endpoint over the
+    shared HttpPool client rather than through litellm, so the timings are
+    the provider's and every stream is closed when it ends.
+
+    Args:
+        model: Model ID, with or without the "openrouter/" prefix
+        prompt: The user message
+        api_base: API base URL (default OpenRouter; e.g. a `microcode dev stub-server`)
+        api_key: API key (default OPENROUTER_API_KEY)
+        max_tokens: Completion token limit
+        timeout: Request timeout in seconds
+
+    Returns:
+        Dict with ok, seconds, ttft, tokens, tokens_per_sec and error
+    """
+    from .connections import get_http_pool
+
+    url = f"{(api_base or OPENROUTER_API_BASE).rstrip('/')}/chat/completions"
+    api_key = api_key or os.getenv("OPENROUTER_API_KEY")
+    body = {
+        "model": model.removeprefix("openrouter/"),
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        "max_tokens": max_tokens,
+    }
+
+    started = time.perf_counter()
+    first_token = None
+    pieces = 0
+    usage: dict[str, Any] = {}
+    try:
+        with get_http_pool().client.stream(
+            "POST",
+            url,
+            json=body,
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else None,
+            timeout=timeout,
+        ) as response:
+            if response.status_code >= 400:
+                return _failure(started, f"HTTP {response.status_code}: {response.read().decode('utf-8', 'replace')}")
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    return _failure(started, f"stream error: {chunk['error']}")
+                for choice in chunk.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    if delta.get("content") or delta.get("reasoning"):
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        pieces += 1
+                usage = chunk.get("usage") or usage
+    except Exception as err:
+        return _failure(started, f"{type(err).__name__}: {err}")
+
+    finished = time.perf_counter()
+    tokens = usage.get("completion_tokens") or pieces
+    generating = finished - first_token if first_token is not None else 0.0
+    return {
+        "ok": True,
+        "seconds": finished - started,
+        "ttft": first_token - started if first_token is not None else None,
+        "tokens": tokens,
+        "tokens_per_sec": (tokens - 1) / generating if tokens > 1 and generating > 0 else None,
+        "error": None,
+    }
+
+
+def summarize_probes(probes: list[dict[str, Any]], api_base: str | None = None) -> dict[str, Any]:
+    """
+    Reduce one model's probes to medians and an error rate.
+    """
+    ok = [probe for probe in probes if probe["ok"]]
+    errors = [probe["error"] for probe in probes if not probe["ok"]]
+    return {
+        "measured_at": time.time(),
+        "api_base": api_base,
+        "samples": len(probes),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(probes) if probes else None,
+        "ttft": percentile([probe["ttft"] for probe in ok if probe["ttft"] is not None], 0.5),
+        "tokens_per_sec": percentile(
+            [probe["tokens_per_sec"] for probe in ok if probe["tokens_per_sec"] is not None], 0.5
+        ),
+        "latency": percentile([probe["seconds"] for probe in ok], 0.5),
+        "latency_p90": percentile([probe["seconds"] for probe in ok], 0.9),
+        "last_error": errors[-1] if errors else None,
+    }
+
+
+def run_model_bench(
+    models: list[str],
+    prompts: tuple[str, ...] | list[str] = PROBE_PROMPTS,
+    repeat: int = 1,
+    concurrency: int = MODEL_BENCH_CONCURRENCY,
+    api_base: str | None = None,
+    api_key: str | None = None,
+    probe: Callable[..., dict[str, Any]] = probe_model,
+) -> dict[str, dict[str, Any]]:
+    """
+    Run every probe prompt `repeat` times against each model, `concurrency` requests at a time.
+
+    Args:
+        models: Model IDs
+        prompts: Probe prompts
+        repeat: Rounds over the prompt set
+        concurrency: Requests in flight at once, across all models
+        api_base: Override for the API base URL
+        api_key: API key (default OPENROUTER_API_KEY)
+        probe: The function that sends and times one request
+
+    Returns:
+        Per-model summaries from summarize_probes, keyed by model ID
+    """
+    assert models, "models must not be empty"
+    assert repeat > 0 and concurrency > 0, "repeat and concurrency must be positive"
+
+    jobs = [(model, prompt) for _ in range(repeat) for prompt in prompts for model in models]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(jobs))) as pool:
+        probes = list(
+            pool.map(lambda job: probe(job[0], job[1], api_base=api_base, api_key=api_key), jobs)
+        )
+
+    by_model: dict[str, list[dict[str, Any]]] = {model: [] for model in models}
+    for (model, _prompt), result in zip(jobs, probes):
+        by_model[model].append(result)
+    return {model: summarize_probes(results, api_base) for model, results in by_model.items()}
+
+
+def _age(seconds: float) -> str:
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h ago"
+    return f"{int(seconds // 86400)}d ago"
+
+
+def format_bench_columns(result: dict[str, Any] | None, now: float | None = None) -> str:
+    """
+    Format a bench summary as fixed-width columns: TTFT, tokens/sec, latency, error rate and age.
+    """
+    if not result:
+        return ""
+
+    def seconds(value: Any) -> str:
+        return f"{value:.2f}s" if isinstance(value, (int, float)) else "-"
+
+    tokens_per_sec = result.get("tokens_per_sec")
+    error_rate = result.get("error_rate")
+    measured_at = result.get("measured_at")
+    speed = f"{tokens_per_sec:.0f}" if isinstance(tokens_per_sec, (int, float)) else "-"
+    errors = f"{error_rate:.0%}" if isinstance(error_rate, (int, float)) else "-"
+    age = _age((now or time.time()) - measured_at) if isinstance(measured_at, (int, float)) else ""
+    return (
+        f"{seconds(result.get('ttft')):>7} ttft  {speed:>5} tok/s  "
+        f"{seconds(result.get('latency')):>7} e2e  {errors:>4} err  {age}"
+    ).rstrip()
+
+
+def format_bench_table(results: dict[str, dict[str, Any]]) -> list[str]:
+    """
+    Format bench summaries as one line per model, fastest median latency first.
+    """
+    width = max((len(model.removeprefix("openrouter/")) for model in results), default=0)
+
+    def order(item: tuple[str, dict[str, Any]]) -> float:
+        latency = item[1].get("latency")
+        return latency if isinstance(latency, (int, float)) else float("inf")
+
+    lines = []
+    for model, result in sorted(results.items(), key=order):
+        line = f"{model.removeprefix('openrouter/'):<{width}}  {format_bench_columns(result)}"
+        if result.get("last_error"):
+            line += f"  ({result['last_error']})"
+        lines.append(line)
+    return lines
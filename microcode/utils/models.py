@@ -1,15 +1,24 @@
+import json
 import os
-from typing import Any, Callable
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable
 
 import click
-from textual.app import App, ComposeResult
-from textual.widgets import OptionList, Static
-from textual.widgets.option_list import Option
 
-from modaic import AutoProgram, PrecompiledProgram
+from .cache import load_model_bench, load_model_config, save_model_bench, save_model_config
+from .constants import AVAILABLE_MODELS, GREEN, MODEL_POOL_SIZE, RED, RESET
+from .cassettes import enable_cassette
+from .display import read_int_env
+from .hedging import enable_hedging
+from .model_bench import PROBE_PROMPTS, format_bench_columns, format_bench_table, run_model_bench
+from .profiler import instrument_lm
+from .programs import resolve_program_path
+from .tracing import enable_tracing
+from .usage import enable_prompt_caching
 
-from .cache import load_model_config, save_model_config
-from .constants import AVAILABLE_MODELS, GREEN, RED, RESET
+if TYPE_CHECKING:
+    from modaic import PrecompiledProgram
+    from textual.widgets.option_list import Option
 
 
 def normalize_model_id(model_id: str) -> str:
@@ -31,30 +40,7 @@ KEEP_OPTION = "__keep__"
 PRIMARY_OPTION = "__primary__"
 
 
-class ModelSelectApp(App[None]):
-    BINDINGS = [("q", "quit", "Quit")]
-
-    def __init__(self, title: str, options: list[Option]):
-        super().__init__()
-        self.title = title
-        self.options = options
-        self.selection: str | None = None
-
-    def compose(self) -> ComposeResult:
-        yield Static(self.title, id="title")
-        yield OptionList(*self.options, id="options")
-
-    def on_option_list_option_selected(self, event: OptionList.OptionSelected) -> None:
-        self.selection = event.option_id
-        self.exit()
-
-    def on_mount(self) -> None:
-        # Add subtle dimming to the title
-        title_widget = self.query_one("#title", Static)
-        title_widget.styles.padding = 1
-
-
-def prompt_model_tui(title: str, options: list[Option]) -> str | None:
+def prompt_model_tui(title: str, options: list["Option"]) -> str | None:
     """
     Prompt the user to select a model using a TUI.
 
@@ -65,6 +51,8 @@ def prompt_model_tui(title: str, options: list[Option]) -> str | None:
     Returns:
         The selected option ID, or None if cancelled
     """
+    from .picker import ModelSelectApp
+
     app = ModelSelectApp(title, options)
     app.run()
     return app.selection
@@ -74,22 +62,33 @@ def _build_model_options(
     include_custom: bool = False,
     include_keep: bool = False,
     include_primary: bool = False,
-) -> list[Option]:
+    api_base: str | None = None,
+) -> list["Option"]:
     """
     Build a list of model options for selection.
 
+    Models with cached `/model bench` results for the session's API base
+    show their median TTFT, tokens/sec, end-to-end latency, error rate and
+    result age as columns.
+
     Args:
         include_custom: Whether to include a "Custom model" option
         include_keep: Whether to include a "Keep current model" option
         include_primary: Whether to include a "Use primary model" option
+        api_base: The session's API base URL, whose bench results are shown (default OpenRouter)
 
     Returns:
         List of Option objects
     """
-    options = [
-        Option(f"{name} ({model_id})", id=model_id)
-        for name, model_id in AVAILABLE_MODELS.values()
-    ]
+    from textual.widgets.option_list import Option
+
+    bench = load_model_bench(api_base)
+    labels = [(f"{name} ({model_id})", model_id) for name, model_id in AVAILABLE_MODELS.values()]
+    width = max(len(label) for label, _model_id in labels)
+    options = []
+    for label, model_id in labels:
+        columns = format_bench_columns(bench.get(normalize_model_id(model_id)))
+        options.append(Option(f"{label:<{width}}  {columns}" if columns else label, id=model_id))
 
     if include_primary:
         options.append(Option("Use primary model", id=PRIMARY_OPTION))
@@ -102,10 +101,13 @@ def _build_model_options(
     return options
 
 
-def select_model() -> str:
+def select_model(api_base: str | None = None) -> str:
     """
     Interactive model selection.
 
+    Args:
+        api_base: The session's API base URL, for bench results
+
     Returns:
         The selected model ID
     """
@@ -114,7 +116,7 @@ def select_model() -> str:
     while True:
         selection = prompt_model_tui(
             "Select a base RLM model:",
-            _build_model_options(include_custom=True),
+            _build_model_options(include_custom=True, api_base=api_base),
         )
 
         if selection is None:
@@ -136,12 +138,13 @@ def select_model() -> str:
         return selection
 
 
-def select_sub_model(primary_model: str) -> str:
+def select_sub_model(primary_model: str, api_base: str | None = None) -> str:
     """
     Interactive sub model selection.
 
     Args:
         primary_model: The primary model ID
+        api_base: The session's API base URL, for bench results
 
     Returns:
         The selected sub model ID
@@ -151,7 +154,7 @@ def select_sub_model(primary_model: str) -> str:
     while True:
         selection = prompt_model_tui(
             "Select the RLM's sub model (usually a smaller, faster model than the base):",
-            _build_model_options(include_custom=True, include_primary=True),
+            _build_model_options(include_custom=True, include_primary=True, api_base=api_base),
         )
 
         if selection is None:
@@ -182,6 +185,7 @@ def select_sub_model(primary_model: str) -> str:
 def resolve_startup_models(
     model_override: str | None = None,
     sub_lm_override: str | None = None,
+    api_base: str | None = None,
 ) -> tuple[str, str]:
     """
     Resolve the primary and sub model IDs from environment variables, cache, or user selection.
@@ -189,6 +193,7 @@ def resolve_startup_models(
     Args:
         model_override: Override for the primary model ID
         sub_lm_override: Override for the sub model ID
+        api_base: The session's API base URL, for bench results in the pickers
 
     Returns:
         Tuple of (primary_model_id, sub_model_id)
@@ -209,7 +214,7 @@ def resolve_startup_models(
         model = cached_model
 
     else:
-        model = select_model()
+        model = select_model(api_base)
         first_time = True
 
     normalized_model = normalize_model_id(model)
@@ -222,7 +227,7 @@ def resolve_startup_models(
         sub_lm = model
 
     elif first_time:
-        sub_lm = select_sub_model(normalized_model)
+        sub_lm = select_sub_model(normalized_model, api_base)
 
     elif cached_sub_lm:
         if cached_model and not model_env:
@@ -242,16 +247,118 @@ def resolve_startup_models(
     return normalized_model, normalized_sub_lm
 
 
+def wrap_program_lms(agent: Any) -> None:
+    """
+    Apply prompt caching and the optional LM wrappers to a freshly loaded program.
+
+    The cassette wraps the provider call first; hedging, profiling and
+    tracing then wrap it in that order, so a hedged call is one span.
+
+    Args:
+        agent: The loaded program, with `lm` and `sub_lm` attributes
+    """
+    for role in ("lm", "sub_lm"):
+        lm = getattr(agent, role, None)
+        enable_prompt_caching(lm)
+        enable_cassette(lm, role)
+        enable_hedging(lm, role)
+        instrument_lm(lm, role)
+        enable_tracing(lm, role)
+
+
+def run_bench_command(
+    args: list[str],
+    api_base: str | None = None,
+    repeat: int = 1,
+    concurrency: int | None = None,
+    echo: bool = True,
+) -> dict[str, dict[str, Any]]:
+    """
+    Probe models for latency and throughput, cache the results and print a table.
+
+    Args:
+        args: Model IDs or AVAILABLE_MODELS numbers; empty for all available models
+        api_base: Override for the API base URL
+        repeat: Rounds over the probe prompt set
+        concurrency: Requests in flight at once (default MODEL_BENCH_CONCURRENCY)
+        echo: Whether to print progress and the results table
+
+    Returns:
+        Per-model summaries, keyed by normalized model ID
+    """
+    assert isinstance(args, list), "args must be a list"
+
+    selected = args or list(AVAILABLE_MODELS)
+    models = [
+        normalize_model_id(AVAILABLE_MODELS[arg][1] if arg in AVAILABLE_MODELS else arg)
+        for arg in selected
+    ]
+    models = list(dict.fromkeys(models))
+    if echo:
+        via = f" via {api_base}" if api_base else ""
+        print(f"{GREEN}⏺ Probing {len(models)} model(s) with {len(PROBE_PROMPTS) * repeat} prompt(s) each{via}...{RESET}")
+    options = {"concurrency": concurrency} if concurrency else {}
+    results = run_model_bench(models, repeat=repeat, api_base=api_base, **options)
+    save_model_bench(results)
+    if echo:
+        for line in format_bench_table(results):
+            print(f"  {line}")
+    return results
+
+
+# Agents built by /model, keyed by program rev and config, with the MCP servers registered on each.
+_AGENT_POOL: OrderedDict[str, tuple[Any, set[str]]] = OrderedDict()
+
+
+def _program_config(agent: Any, lm: str, sub_lm: str) -> dict[str, Any]:
+    config = {"lm": normalize_model_id(lm), "sub_lm": normalize_model_id(sub_lm)}
+    for key in ("max_iters", "max_tokens", "max_output_chars", "api_base", "verbose"):
+        if hasattr(agent.config, key):
+            value = getattr(agent.config, key)
+            if value is not None:
+                config[key] = value
+    return config
+
+
+def _pool_key(config: dict[str, Any], rev: str) -> str:
+    return json.dumps({"rev": rev, **config}, sort_keys=True, default=str)
+
+
+def _pool_agent(key: str, agent: Any, servers: set[str]) -> None:
+    """
+    Keep an agent warm for later switches, evicting the least recently used past the pool size.
+
+    MICROCODE_MODEL_POOL_SIZE overrides MODEL_POOL_SIZE; 0 disables the pool.
+    """
+    size = read_int_env("MICROCODE_MODEL_POOL_SIZE")
+    size = MODEL_POOL_SIZE if size is None else size
+    if size <= 0:
+        _AGENT_POOL.clear()
+        return
+    _AGENT_POOL[key] = (agent, servers)
+    _AGENT_POOL.move_to_end(key)
+    while len(_AGENT_POOL) > size:
+        _AGENT_POOL.popitem(last=False)
+
+
 def handle_model_command(
     user_input: str,
-    agent: PrecompiledProgram,
+    agent: "PrecompiledProgram",
     mcp_servers: dict[str, dict[str, Any]],
-    register_mcp_server: Callable[[PrecompiledProgram, str, Any], list[str]],
+    register_mcp_server: Callable[["PrecompiledProgram", str, Any], list[str]],
     repo_path: str,
-) -> tuple[bool, PrecompiledProgram, str]:
+) -> tuple[bool, "PrecompiledProgram", str]:
     """
     Handle the /model command.
 
+    `/model bench [model ...]` probes models with run_bench_command instead
+    of switching.
+
+    The outgoing agent is kept in a small LRU pool together with the MCP
+    servers registered on it, so switching back to a recent model pair
+    reuses that agent instead of loading the program again; only servers
+    added since it was pooled are registered on it.
+
     Args:
         user_input: The user input string
         agent: The PrecompiledProgram agent
@@ -262,16 +369,24 @@ def handle_model_command(
     Returns:
         Tuple of (handled, agent, new_model)
     """
+    from modaic import AutoProgram, PrecompiledProgram
+
     assert isinstance(user_input, str), "user_input must be a str"
     assert isinstance(agent, PrecompiledProgram), "agent must be PrecompiledProgram"
     assert isinstance(mcp_servers, dict), "mcp_servers must be a dict"
     assert callable(register_mcp_server), "register_mcp_server must be callable"
     assert isinstance(repo_path, str), "repo_path must be a str"
 
+    args = user_input.split()[1:]
+    api_base = getattr(agent.config, "api_base", None)
+    if args[:1] == ["bench"]:
+        run_bench_command(args[1:], api_base)
+        return True, agent, normalize_model_id(agent.config.sub_lm)
+
     new_model = agent.config.lm
     model_selection = prompt_model_tui(
         "Select a base RLM model:",
-        _build_model_options(include_custom=True, include_keep=True),
+        _build_model_options(include_custom=True, include_keep=True, api_base=api_base),
     )
 
     if model_selection is None:
@@ -309,6 +424,7 @@ def handle_model_command(
             include_custom=True,
             include_keep=True,
             include_primary=True,
+            api_base=api_base,
         ),
     )
 
@@ -334,18 +450,27 @@ def handle_model_command(
     else:
         new_sub_lm = normalize_model_id(sub_selection)
 
-    config = {"lm": normalize_model_id(new_model), "sub_lm": new_sub_lm}
-    for key in ("max_iters", "max_tokens", "max_output_chars", "api_base", "verbose"):
-        if hasattr(agent.config, key):
-            value = getattr(agent.config, key)
-            if value is not None:
-                config[key] = value
-
-    agent = AutoProgram.from_precompiled(
-        repo_path, rev=os.getenv("MODAIC_ENV", "prod"), config=config
+    rev = os.getenv("MODAIC_ENV", "prod")
+    _pool_agent(
+        _pool_key(_program_config(agent, agent.config.lm, agent.config.sub_lm), rev),
+        agent,
+        set(mcp_servers),
     )
+
+    config = _program_config(agent, new_model, new_sub_lm)
+    key = _pool_key(config, rev)
+    if key in _AGENT_POOL:
+        agent, registered = _AGENT_POOL[key]
+    else:
+        agent = AutoProgram.from_precompiled(
+            resolve_program_path(repo_path, rev), rev=rev, config=config
+        )
+        wrap_program_lms(agent)
+        registered = set()
     for server_name, info in mcp_servers.items():
-        info["tools"] = register_mcp_server(agent, server_name, info["server"])
+        if server_name not in registered:
+            info["tools"] = register_mcp_server(agent, server_name, info["server"])
+    _pool_agent(key, agent, set(mcp_servers))
 
     save_model_config(normalize_model_id(new_model), new_sub_lm)
     return True, agent, new_sub_lm
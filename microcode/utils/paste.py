@@ -1,38 +1,53 @@
+import atexit
+import hashlib
+import mmap
 import os
 import re
+import shutil
 import sys
+import tempfile
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
 import click
-from prompt_toolkit import PromptSession
-from prompt_toolkit.formatted_text import ANSI
-from prompt_toolkit.key_binding import KeyBindings
-from prompt_toolkit.keys import Keys
-from prompt_toolkit.lexers import Lexer
-from prompt_toolkit.styles import Style
+
+from .constants import PASTE_HOT_BYTES, PASTE_SPILL_THRESHOLD, PASTE_SPOOL_DIR
+from .display import read_int_env
+
+if TYPE_CHECKING:
+    from prompt_toolkit import PromptSession
 
 _SESSION = None
 _PASTE_THRESHOLD = int(os.getenv("MICROCODE_PASTE_THRESHOLD", "2000"))
 _LAST_PASTE = None
 _PLACEHOLDER_RE = re.compile(r"^\[pasted \d+\+ chars\]$")
+PASTE_REF_RE = re.compile(r"\[(paste_\d+)\]")
 
 
-class _PlaceholderLexer(Lexer):
+def _placeholder_lexer():
     """
-    Lexer for highlighting paste placeholders in the prompt.
+    Build a lexer for highlighting paste placeholders in the prompt.
+
+    prompt_toolkit is imported here so that non-interactive runs never load it.
     """
+    from prompt_toolkit.lexers import Lexer
+
+    class _PlaceholderLexer(Lexer):
+        def lex_document(self, document):
+            lines = document.lines
 
-    def lex_document(self, document):
-        lines = document.lines
+            def get_line(lineno: int):
+                line = lines[lineno]
+                if _PLACEHOLDER_RE.match(line):
+                    return [("class:paste_placeholder", line)]
+                return [("", line)]
 
-        def get_line(lineno: int):
-            line = lines[lineno]
-            if _PLACEHOLDER_RE.match(line):
-                return [("class:paste_placeholder", line)]
-            return [("", line)]
+            return get_line
 
-        return get_line
+    return _PlaceholderLexer()
 
 
-def _get_session() -> PromptSession | None:
+def _get_session() -> "PromptSession | None":
     """
     Get or create a PromptSession instance for handling paste events.
 
@@ -40,7 +55,12 @@ def _get_session() -> PromptSession | None:
         A PromptSession instance or None if prompt_toolkit is not available
     """
     global _SESSION
-    if PromptSession is None:
+    try:
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.key_binding import KeyBindings
+        from prompt_toolkit.keys import Keys
+        from prompt_toolkit.styles import Style
+    except ImportError:
         return None
 
     if _SESSION is None:
@@ -54,24 +74,19 @@ def _get_session() -> PromptSession | None:
         def _insert_newline(event) -> None:
             event.app.current_buffer.insert_text("\n")
 
-        if Keys is not None:
-
-            @bindings.add(Keys.BracketedPaste)
-            def _handle_bracketed_paste(event) -> None:
-                pasted = event.data or ""
-                if _PASTE_THRESHOLD > 0 and len(pasted) > _PASTE_THRESHOLD:
-                    placeholder = f"[pasted {len(pasted)}+ chars]"
-                    _store_paste(pasted, placeholder)
-                    event.app.current_buffer.insert_text(placeholder)
-                else:
-                    _clear_paste()
-                    event.app.current_buffer.insert_text(pasted)
-
-        placeholder_style = None
-        placeholder_lexer = None
-        if Style is not None and Lexer is not None:
-            placeholder_style = Style.from_dict({"paste_placeholder": "fg:ansimagenta"})
-            placeholder_lexer = _PlaceholderLexer()
+        @bindings.add(Keys.BracketedPaste)
+        def _handle_bracketed_paste(event) -> None:
+            pasted = event.data or ""
+            if _PASTE_THRESHOLD > 0 and len(pasted) > _PASTE_THRESHOLD:
+                placeholder = f"[pasted {len(pasted)}+ chars]"
+                _store_paste(pasted, placeholder)
+                event.app.current_buffer.insert_text(placeholder)
+            else:
+                _clear_paste()
+                event.app.current_buffer.insert_text(pasted)
+
+        placeholder_style = Style.from_dict({"paste_placeholder": "fg:ansimagenta"})
+        placeholder_lexer = _placeholder_lexer()
 
         _SESSION = PromptSession(
             multiline=True,
@@ -104,7 +119,9 @@ def read_user_input(
         if session is None:
             return click.prompt(prompt, prompt_suffix="", show_default=False)
 
-        formatted_prompt = ANSI(prompt) if ANSI is not None else prompt
+        from prompt_toolkit.formatted_text import ANSI
+
+        formatted_prompt = ANSI(prompt)
         text = session.prompt(formatted_prompt)
 
         if _PASTE_THRESHOLD > 0 and len(text) > _PASTE_THRESHOLD:
@@ -158,3 +175,188 @@ def _clear_paste() -> None:
     """
     global _LAST_PASTE
     _LAST_PASTE = None
+
+
+class PasteStore:
+    """
+    Content-addressed, memory-bounded store for pasted text in a session.
+
+    Pastes are keyed by the sha256 of their content, so pasting the same text
+    again returns the existing paste ID instead of storing a second copy.
+    Payloads larger than `spill_threshold` bytes are written to a per-session
+    spool directory and read back through memory-mapped views; a bounded LRU
+    of decoded hot pastes stays in RAM. Call close() (also run at exit) to
+    unmap and delete the spool.
+    """
+
+    def __init__(
+        self,
+        spool_root: str | None = None,
+        spill_threshold: int | None = None,
+        hot_bytes: int | None = None,
+    ):
+        if spill_threshold is None:
+            spill_threshold = read_int_env("MICROCODE_PASTE_SPILL_THRESHOLD")
+        self.spool_root = spool_root or PASTE_SPOOL_DIR
+        self.spill_threshold = (
+            spill_threshold if spill_threshold is not None else PASTE_SPILL_THRESHOLD
+        )
+        self.hot_bytes = hot_bytes if hot_bytes is not None else PASTE_HOT_BYTES
+        self.spool_dir: str | None = None
+
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._ids_by_digest: dict[str, str] = {}
+        self._counter = 0
+        self._hot: OrderedDict[str, str] = OrderedDict()
+        self._hot_size = 0
+        self._maps: dict[str, mmap.mmap] = {}
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, paste_id: object) -> bool:
+        return paste_id in self._entries
+
+    @property
+    def ids(self) -> list[str]:
+        """
+        Return paste IDs in insertion order.
+        """
+        return list(self._entries)
+
+    def add(self, text: str) -> str:
+        """
+        Store pasted text, deduplicating by content.
+
+        Args:
+            text: The pasted text
+
+        Returns:
+            The paste ID, referenced as [paste_id] in user input
+        """
+        assert isinstance(text, str), "text must be a str"
+        assert not self._closed, "paste store is closed"
+
+        payload = text.encode("utf-8")
+        digest = hashlib.sha256(payload).hexdigest()
+        existing = self._ids_by_digest.get(digest)
+        if existing is not None:
+            return existing
+
+        self._counter += 1
+        paste_id = f"paste_{self._counter}"
+        entry: dict[str, Any] = {
+            "size": len(payload),
+            "lines": text.count("\n") + (0 if text.endswith("\n") else 1),
+        }
+        if self.spill_threshold > 0 and len(payload) > self.spill_threshold:
+            path = os.path.join(self._ensure_spool(), f"{digest}.txt")
+            with open(path, "wb") as handle:
+                handle.write(payload)
+            entry["path"] = path
+        else:
+            entry["text"] = text
+
+        self._entries[paste_id] = entry
+        self._ids_by_digest[digest] = paste_id
+        return paste_id
+
+    def view(self, paste_id: str) -> memoryview:
+        """
+        Return a read-only view of a paste's UTF-8 bytes.
+
+        Spilled pastes are served from a memory map, so no copy is made.
+        """
+        entry = self._entries[paste_id]
+        if "text" in entry:
+            return memoryview(entry["text"].encode("utf-8"))
+
+        mapped = self._maps.get(paste_id)
+        if mapped is None:
+            with open(entry["path"], "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[paste_id] = mapped
+        return memoryview(mapped)
+
+    def get(self, paste_id: str) -> str:
+        """
+        Return the text of a paste, decoding spilled pastes through the hot LRU.
+        """
+        entry = self._entries[paste_id]
+        if "text" in entry:
+            return entry["text"]
+
+        text = self._hot.get(paste_id)
+        if text is not None:
+            self._hot.move_to_end(paste_id)
+            return text
+
+        with self.view(paste_id) as view:
+            text = str(view, "utf-8")
+        if entry["size"] <= self.hot_bytes:
+            self._hot[paste_id] = text
+            self._hot_size += entry["size"]
+            while self._hot_size > self.hot_bytes:
+                old_id, _old_text = self._hot.popitem(last=False)
+                self._hot_size -= self._entries[old_id]["size"]
+        return text
+
+    def summary(self, paste_id: str) -> str:
+        """
+        Return a one-line description of a paste without its content.
+        """
+        entry = self._entries[paste_id]
+        size = entry["size"]
+        if size >= 1024 * 1024:
+            size_label = f"{size / (1024 * 1024):.1f} MB"
+        elif size >= 1024:
+            size_label = f"{size / 1024:.1f} KB"
+        else:
+            size_label = f"{size} B"
+        return f"[{paste_id}] {entry['lines']} lines, {size_label} (not referenced)"
+
+    def close(self) -> None:
+        """
+        Unmap spilled pastes and delete the session spool directory.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for mapped in self._maps.values():
+            try:
+                mapped.close()
+            except (BufferError, ValueError):
+                pass
+        self._maps.clear()
+        self._hot.clear()
+        self._hot_size = 0
+        if self.spool_dir is not None:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            self.spool_dir = None
+
+    def _ensure_spool(self) -> str:
+        if self.spool_dir is None:
+            _remove_stale_spools(self.spool_root)
+            os.makedirs(self.spool_root, exist_ok=True)
+            self.spool_dir = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=self.spool_root)
+            atexit.register(self.close)
+        return self.spool_dir
+
+
+def _remove_stale_spools(spool_root: str) -> None:
+    """
+    Delete spool directories left behind by sessions that are no longer running.
+    """
+    if not os.path.isdir(spool_root):
+        return
+    for name in os.listdir(spool_root):
+        pid_text = name.split("-", 1)[0]
+        if not pid_text.isdigit():
+            continue
+        try:
+            os.kill(int(pid_text), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(spool_root, name), ignore_errors=True)
+        except OSError:
+            continue
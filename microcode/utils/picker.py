@@ -0,0 +1,26 @@
+from textual.app import App, ComposeResult
+from textual.widgets import OptionList, Static
+from textual.widgets.option_list import Option
+
+
+class ModelSelectApp(App[None]):
+    BINDINGS = [("q", "quit", "Quit")]
+
+    def __init__(self, title: str, options: list[Option]):
+        super().__init__()
+        self.title = title
+        self.options = options
+        self.selection: str | None = None
+
+    def compose(self) -> ComposeResult:
+        yield Static(self.title, id="title")
+        yield OptionList(*self.options, id="options")
+
+    def on_option_list_option_selected(self, event: OptionList.OptionSelected) -> None:
+        self.selection = event.option_id
+        self.exit()
+
+    def on_mount(self) -> None:
+        # Add subtle dimming to the title
+        title_widget = self.query_one("#title", Static)
+        title_widget.styles.padding = 1
@@ -0,0 +1,310 @@
+import functools
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from .constants import PROFILE_SAMPLE_DEPTH, PROFILES_DIR
+from .display import read_int_env
+
+
+def profiling_enabled() -> bool:
+    """
+    Return True if MICROCODE_PROFILE=1 (set by --profile).
+    """
+    return os.getenv("MICROCODE_PROFILE") == "1"
+
+
+def _now_us() -> int:
+    return time.perf_counter_ns() // 1000
+
+
+class Profiler:
+    """
+    Collect Chrome trace events for one session.
+
+    Synchronous work (program load, context building, rendering, tool calls)
+    is recorded as complete ("X") spans on the thread that ran it. LM calls
+    are recorded as async ("b"/"e") spans so that concurrent sub_lm calls
+    get their own rows instead of overlapping. The file written by save()
+    opens in chrome://tracing or https://ui.perfetto.dev.
+
+    With sample_ms set, a background thread also samples every thread's
+    Python stack and save() writes the counts as folded stacks next to the
+    trace, for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, root: str | None = None, sample_ms: int | None = None):
+        self.root = root or PROFILES_DIR
+        self.pid = os.getpid()
+        self._origin = _now_us()
+        self._lock = threading.Lock()
+        self._events: list[dict[str, Any]] = []
+        self._threads: dict[int, str] = {}
+        self._ids = itertools.count(1)
+        self._samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._sampler: threading.Thread | None = None
+        if sample_ms:
+            assert sample_ms > 0, "sample_ms must be positive"
+            self._sampler = threading.Thread(
+                target=self._sample, args=(sample_ms / 1000,), name="microcode-profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def _base(self, name: str, cat: str, phase: str, ts: int) -> dict[str, Any]:
+        thread = threading.current_thread()
+        tid = thread.ident or 0
+        self._threads.setdefault(tid, thread.name)
+        return {"name": name, "cat": cat, "ph": phase, "ts": ts - self._origin, "pid": self.pid, "tid": tid}
+
+    def add_span(self, name: str, cat: str, start_us: int, end_us: int, args: dict[str, Any] | None = None) -> None:
+        """
+        Record a complete span on the current thread.
+
+        Args:
+            name: Span label
+            cat: Category, e.g. "load", "context", "lm", "tool", "render"
+            start_us: Start time from perf_counter_ns() // 1000
+            end_us: End time on the same clock
+            args: Extra JSON-serializable details shown in the viewer
+        """
+        event = self._base(name, cat, "X", start_us)
+        event["dur"] = max(end_us - start_us, 0)
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    def add_async(self, name: str, cat: str, start_us: int, end_us: int, args: dict[str, Any] | None = None) -> None:
+        """
+        Record a span that may overlap others on the same thread, as a begin/end pair.
+        """
+        span_id = next(self._ids)
+        begin = self._base(name, cat, "b", start_us)
+        end = self._base(name, cat, "e", end_us)
+        begin["id"] = end["id"] = span_id
+        if args:
+            begin["args"] = args
+        with self._lock:
+            self._events.extend((begin, end))
+
+    @contextmanager
+    def span(self, name: str, cat: str = "app", **args: Any) -> Iterator[None]:
+        """
+        Time the enclosed block as a complete span.
+        """
+        start = _now_us()
+        try:
+            yield
+        finally:
+            self.add_span(name, cat, start, _now_us(), args)
+
+    def events(self) -> list[dict[str, Any]]:
+        """
+        Return the recorded events, preceded by thread-name metadata.
+        """
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        return metadata + events
+
+    def _sample(self, interval: float) -> None:
+        own = threading.get_ident()
+        while not self._stopped.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_SAMPLE_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                key = ";".join(reversed(stack))
+                with self._lock:
+                    self._samples[key] += 1
+
+    def folded(self) -> list[str]:
+        """
+        Return sampled stacks in folded format ("thread;file:func;... count").
+        """
+        with self._lock:
+            samples = self._samples.most_common()
+        return [f"{stack} {count}" for stack, count in samples]
+
+    def save(self, name: str) -> str:
+        """
+        Write the trace (and folded stacks, if sampling) for a session atomically.
+
+        Args:
+            name: File stem, usually the session ID
+
+        Returns:
+            Path of the trace file
+        """
+        assert isinstance(name, str) and name, "name must be a non-empty str"
+        path = os.path.join(self.root, f"{name}.trace.json")
+        _write_atomic(self.root, path, json.dumps({"traceEvents": self.events(), "displayTimeUnit": "ms"}))
+        if self._sampler is not None:
+            folded = self.folded()
+            _write_atomic(self.root, os.path.join(self.root, f"{name}.folded"), "\n".join(folded) + "\n")
+        return path
+
+    def stop(self) -> None:
+        """
+        Stop the stack sampler, if running.
+        """
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+
+
+def _write_atomic(root: str, path: str, text: str) -> None:
+    os.makedirs(root, exist_ok=True)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix="microcode_profile_", suffix=".tmp", dir=root)
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_ACTIVE: Profiler | None = None
+
+
+def active_profiler() -> Profiler | None:
+    """
+    Return the profiler recording this process, if any.
+    """
+    return _ACTIVE
+
+
+def start_profiler(root: str | None = None) -> Profiler | None:
+    """
+    Start a new profiler when profiling is enabled, replacing any active one.
+
+    The stack sampler runs when MICROCODE_PROFILE_SAMPLE_MS is set.
+
+    Returns:
+        The new profiler, or None if profiling is off
+    """
+    global _ACTIVE
+    stop_profiler()
+    if not profiling_enabled():
+        return None
+    _ACTIVE = Profiler(root, sample_ms=read_int_env("MICROCODE_PROFILE_SAMPLE_MS"))
+    return _ACTIVE
+
+
+def stop_profiler() -> None:
+    """
+    Stop and detach the active profiler.
+    """
+    global _ACTIVE
+    if _ACTIVE is not None:
+        _ACTIVE.stop()
+        _ACTIVE = None
+
+
+@contextmanager
+def span(name: str, cat: str = "app", **args: Any) -> Iterator[None]:
+    """
+    Time the enclosed block on the active profiler; a no-op when none is running.
+    """
+    profiler = _ACTIVE
+    if profiler is None:
+        yield
+        return
+    with profiler.span(name, cat, **args):
+        yield
+
+
+def instrument_lm(lm: Any, role: str) -> None:
+    """
+    Record every request an LM sends as an async span while a profiler is active.
+
+    The LM's `forward`/`aforward` are wrapped (after hedging, so a hedged
+    call is one span), which times the provider round trip on whatever
+    thread makes it, including sub_lm calls fanned out by llm_query_batched.
+
+    Args:
+        lm: The dspy LM (ignored if None, already instrumented, or profiling is off)
+        role: "lm" or "sub_lm", used as the span category
+    """
+    if lm is None or not profiling_enabled() or getattr(lm, "_profiled", False):
+        return
+
+    forward = lm.forward
+    aforward = lm.aforward
+    label = f"{role} {str(lm.model).removeprefix('openrouter/')}"
+
+    def record(start: int, error: BaseException | None) -> None:
+        profiler = _ACTIVE
+        if profiler is not None:
+            args = {"model": lm.model}
+            if error is not None:
+                args["error"] = type(error).__name__
+            profiler.add_async(label, role, start, _now_us(), args)
+
+    def profiled_forward(*args: Any, **kwargs: Any) -> Any:
+        start = _now_us()
+        error = None
+        try:
+            return forward(*args, **kwargs)
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            record(start, error)
+
+    async def profiled_aforward(*args: Any, **kwargs: Any) -> Any:
+        start = _now_us()
+        error = None
+        try:
+            return await aforward(*args, **kwargs)
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            record(start, error)
+
+    lm._profiled = True
+    lm.forward = profiled_forward
+    lm.aforward = profiled_aforward
+
+
+def traced_tool(tool: Callable[..., Any], name: str) -> Callable[..., Any]:
+    """
+    Wrap a tool so each call is recorded as a span while a profiler is active.
+
+    The wrapper keeps the tool's name, docstring and signature, so the
+    program describes it to the model exactly as before. Tools are returned
+    unchanged when profiling is off.
+    """
+    if not profiling_enabled():
+        return tool
+
+    @functools.wraps(tool)
+    def call(*args: Any, **kwargs: Any) -> Any:
+        with span(name, "tool"):
+            return tool(*args, **kwargs)
+
+    return call
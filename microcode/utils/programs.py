@@ -0,0 +1,353 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+from .constants import (
+    PROGRAM_REFRESH_INTERVAL,
+    PROGRAM_STORE_DIR,
+    PROGRAM_STORE_LIMIT,
+)
+from .display import read_int_env
+
+_MANIFEST_NAME = "manifest.json"
+_INDEX_NAME = "index.json"
+_STAGING_PREFIX = ".staging_"
+_STAGING_MAX_AGE = 3600
+_IGNORED_NAMES = {".git", "__pycache__", _MANIFEST_NAME}
+_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+_INDEX_LOCK = threading.Lock()
+_RESOLVED: dict[tuple[str, str], str] = {}
+
+
+def _is_local_repo(repo_path: str) -> bool:
+    """
+    Return True when the repo path points at a local directory instead of the hub.
+    """
+    return os.path.isabs(repo_path) or repo_path.startswith((".", "~"))
+
+
+def _store_key(repo_path: str, rev: str, commit: str) -> str:
+    """
+    Build the content address for a repo path, revision and resolved commit.
+    """
+    digest = hashlib.sha256(f"{repo_path}\0{rev}\0{commit}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def _rev_key(repo_path: str, rev: str) -> str:
+    return f"{repo_path}@{rev}"
+
+
+def _index_path() -> str:
+    return os.path.join(PROGRAM_STORE_DIR, _INDEX_NAME)
+
+
+def _load_index() -> dict:
+    """
+    Load the store index, returning an empty index when missing or corrupt.
+    """
+    empty = {"entries": {}, "revs": {}}
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, json.JSONDecodeError):
+        return empty
+
+    if not isinstance(data, dict):
+        return empty
+    entries = data.get("entries")
+    revs = data.get("revs")
+    return {
+        "entries": entries if isinstance(entries, dict) else {},
+        "revs": revs if isinstance(revs, dict) else {},
+    }
+
+
+def _save_index(index: dict) -> None:
+    """
+    Atomically write the store index.
+    """
+    os.makedirs(PROGRAM_STORE_DIR, exist_ok=True)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix="microcode_programs_", suffix=".json", dir=PROGRAM_STORE_DIR
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(index, handle)
+        os.replace(tmp_path, _index_path())
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _hash_tree(root: str) -> dict[str, str]:
+    """
+    Compute a sha256 digest for every file under root, keyed by relative path.
+    """
+    digests: dict[str, str] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in _IGNORED_NAMES)
+        for filename in sorted(filenames):
+            if filename in _IGNORED_NAMES or filename.endswith(".pyc"):
+                continue
+            path = os.path.join(dirpath, filename)
+            digest = hashlib.sha256()
+            with open(path, "rb") as handle:
+                for chunk in iter(lambda: handle.read(1 << 16), b""):
+                    digest.update(chunk)
+            digests[os.path.relpath(path, root)] = digest.hexdigest()
+    return digests
+
+
+def _verify_entry(entry_dir: str) -> bool:
+    """
+    Check that a stored program still matches the digests in its manifest.
+    """
+    try:
+        with open(os.path.join(entry_dir, _MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        return manifest.get("files") == _hash_tree(entry_dir)
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return False
+
+
+def _fetch_snapshot(repo_path: str, rev: str) -> tuple[str, str | None]:
+    """
+    Download (or update) a hub checkout through modaic and return its path and commit.
+    """
+    from modaic.hub import load_repo
+
+    repo_dir, commit = load_repo(repo_path, rev=rev)
+    return str(repo_dir), commit.sha if commit is not None else None
+
+
+def _ingest(repo_path: str, rev: str, source_dir: str, commit: str) -> str:
+    """
+    Copy a checkout into the store under its content address and record it in the index.
+    """
+    key = _store_key(repo_path, rev, commit)
+    entry_dir = os.path.join(PROGRAM_STORE_DIR, key)
+
+    if not _verify_entry(entry_dir):
+        os.makedirs(PROGRAM_STORE_DIR, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=_STAGING_PREFIX, dir=PROGRAM_STORE_DIR)
+        try:
+            payload_dir = os.path.join(staging_dir, "program")
+            shutil.copytree(
+                source_dir,
+                payload_dir,
+                ignore=shutil.ignore_patterns(*_IGNORED_NAMES, "*.pyc"),
+            )
+            manifest = {
+                "repo_path": repo_path,
+                "rev": rev,
+                "commit": commit,
+                "files": _hash_tree(payload_dir),
+            }
+            with open(os.path.join(payload_dir, _MANIFEST_NAME), "w", encoding="utf-8") as handle:
+                json.dump(manifest, handle)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(payload_dir, entry_dir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    now = time.time()
+    with _INDEX_LOCK:
+        index = _load_index()
+        index["entries"][key] = {
+            "repo_path": repo_path,
+            "rev": rev,
+            "commit": commit,
+            "last_used": now,
+            "checked_at": now,
+        }
+        index["revs"][_rev_key(repo_path, rev)] = key
+        _save_index(index)
+    return entry_dir
+
+
+def _refresh(repo_path: str, rev: str, cached_commit: str) -> None:
+    """
+    Re-resolve a revision and ingest a new entry only when its commit has moved.
+    """
+    try:
+        source_dir, commit = _fetch_snapshot(repo_path, rev)
+    except Exception:
+        return
+
+    if commit and commit != cached_commit:
+        _ingest(repo_path, rev, source_dir, commit)
+        evict_programs()
+        return
+
+    with _INDEX_LOCK:
+        index = _load_index()
+        key = index["revs"].get(_rev_key(repo_path, rev))
+        if key in index["entries"]:
+            index["entries"][key]["checked_at"] = time.time()
+            _save_index(index)
+
+
+def _start_refresh(repo_path: str, rev: str, entry: dict) -> threading.Thread | None:
+    """
+    Refresh a moving revision on a daemon thread, throttled by PROGRAM_REFRESH_INTERVAL.
+    """
+    if _SHA_RE.match(rev):
+        return None
+
+    interval = read_int_env("MICROCODE_PROGRAM_REFRESH_INTERVAL")
+    if interval is None:
+        interval = PROGRAM_REFRESH_INTERVAL
+    checked_at = entry.get("checked_at")
+    if isinstance(checked_at, (int, float)) and time.time() - checked_at < interval:
+        return None
+
+    thread = threading.Thread(
+        target=_refresh,
+        args=(repo_path, rev, entry.get("commit")),
+        name="microcode-program-refresh",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def evict_programs(limit: int | None = None) -> list[str]:
+    """
+    Evict least recently used program entries beyond the store limit.
+
+    Args:
+        limit: Number of entries to keep (defaults to MICROCODE_PROGRAM_STORE_LIMIT or PROGRAM_STORE_LIMIT)
+
+    Returns:
+        List of evicted store keys
+    """
+    if limit is None:
+        limit = read_int_env("MICROCODE_PROGRAM_STORE_LIMIT")
+        if limit is None:
+            limit = PROGRAM_STORE_LIMIT
+    limit = max(limit, 1)
+
+    with _INDEX_LOCK:
+        index = _load_index()
+        ordered = sorted(
+            index["entries"].items(),
+            key=lambda item: item[1].get("last_used", 0),
+            reverse=True,
+        )
+        evicted = [key for key, _entry in ordered[limit:]]
+        for key in evicted:
+            index["entries"].pop(key, None)
+            shutil.rmtree(os.path.join(PROGRAM_STORE_DIR, key), ignore_errors=True)
+        index["revs"] = {
+            rev: key for rev, key in index["revs"].items() if key in index["entries"]
+        }
+        if evicted:
+            _save_index(index)
+
+        if os.path.isdir(PROGRAM_STORE_DIR):
+            now = time.time()
+            for name in os.listdir(PROGRAM_STORE_DIR):
+                path = os.path.join(PROGRAM_STORE_DIR, name)
+                if not os.path.isdir(path) or name in index["entries"]:
+                    continue
+                if name.startswith(_STAGING_PREFIX):
+                    try:
+                        if now - os.path.getmtime(path) < _STAGING_MAX_AGE:
+                            continue
+                    except OSError:
+                        continue
+                shutil.rmtree(path, ignore_errors=True)
+
+    return evicted
+
+
+def program_revision(program_path: str) -> str:
+    """
+    Identify the program revision stored at a resolved path.
+
+    Store entries report the commit recorded in their manifest; local
+    directories are identified by a digest of their files.
+
+    Args:
+        program_path: A path returned by resolve_program_path
+
+    Returns:
+        A commit sha or content digest
+    """
+    try:
+        with open(os.path.join(program_path, _MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            commit = json.load(handle).get("commit")
+        if isinstance(commit, str) and commit != "unknown":
+            return commit
+    except (OSError, json.JSONDecodeError, AttributeError):
+        pass
+    files = json.dumps(_hash_tree(program_path), sort_keys=True)
+    return hashlib.sha256(files.encode("utf-8")).hexdigest()
+
+
+def resolve_program_path(repo_path: str, rev: str, offline: bool | None = None) -> str:
+    """
+    Resolve a hub program to a verified local copy in the program store.
+
+    Cached entries are reused as-is and refreshed on a background thread; the
+    hub is only contacted synchronously when no valid copy exists.
+
+    Args:
+        repo_path: Hub path of the program ("user/repo") or a local directory
+        rev: Branch, tag or commit to load
+        offline: Never contact the hub (defaults to MICROCODE_OFFLINE)
+
+    Returns:
+        Absolute path of a local program directory
+
+    Raises:
+        FileNotFoundError: If offline and no valid cached copy exists
+    """
+    assert isinstance(repo_path, str), "repo_path must be a str"
+    assert isinstance(rev, str), "rev must be a str"
+
+    if offline is None:
+        offline = os.getenv("MICROCODE_OFFLINE") == "1"
+
+    if _is_local_repo(repo_path):
+        return os.path.abspath(os.path.expanduser(repo_path))
+
+    resolved = _RESOLVED.get((repo_path, rev))
+    if resolved and os.path.isdir(resolved):
+        return resolved
+
+    index = _load_index()
+    key = index["revs"].get(_rev_key(repo_path, rev))
+    entry = index["entries"].get(key) if key else None
+    entry_dir = os.path.join(PROGRAM_STORE_DIR, key) if key else None
+
+    if entry and entry_dir and _verify_entry(entry_dir):
+        with _INDEX_LOCK:
+            index = _load_index()
+            if key in index["entries"]:
+                index["entries"][key]["last_used"] = time.time()
+                _save_index(index)
+        if not offline:
+            _start_refresh(repo_path, rev, entry)
+    elif offline:
+        raise FileNotFoundError(
+            f"No cached copy of {repo_path}@{rev}; run once without --offline to populate the program store"
+        )
+    else:
+        source_dir, commit = _fetch_snapshot(repo_path, rev)
+        entry_dir = _ingest(repo_path, rev, source_dir, commit or "unknown")
+
+    evict_programs()
+    _RESOLVED[(repo_path, rev)] = entry_dir
+    return entry_dir
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import time
+from typing import Any
+
+from .constants import (
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL,
+)
+from .display import read_int_env
+
+_STATS_NAME = "stats.json"
+_ENTRY_SUFFIX = ".json"
+# Config fields that change what the agent answers.
+_KEY_FIELDS = ("lm", "sub_lm", "api_base", "max_iters", "max_tokens", "max_output_chars")
+
+
+def normalize_task(task: str) -> str:
+    """
+    Normalize task text so that whitespace-only edits map to the same cache key.
+    """
+    lines = task.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def _git(cwd: str, *args: str, stdin: bytes | None = None) -> bytes | None:
+    try:
+        completed = subprocess.run(
+            ["git", "-C", cwd, *args],
+            input=stdin,
+            capture_output=True,
+            timeout=30,
+            check=False,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout if completed.returncode == 0 else None
+
+
+def workspace_fingerprint(cwd: str) -> str | None:
+    """
+    Fingerprint the working tree of the git repository containing cwd.
+
+    Combines the HEAD tree hash with the diff against HEAD and the contents
+    of untracked files, so any edit to the workspace changes the value.
+
+    Args:
+        cwd: A directory inside the workspace
+
+    Returns:
+        A hex digest, or None outside a git repository
+    """
+    tree = _git(cwd, "rev-parse", "HEAD^{tree}")
+    if tree is None:
+        return None
+
+    digest = hashlib.sha256(tree.strip())
+    status = _git(cwd, "status", "--porcelain", "-z", "--untracked-files=all")
+    if status:
+        digest.update(_git(cwd, "diff", "HEAD", "--binary") or b"")
+        untracked = _git(cwd, "ls-files", "--others", "--exclude-standard", "-z")
+        if untracked:
+            paths = untracked.rstrip(b"\0").split(b"\0")
+            digest.update(b"\0".join(paths))
+            digest.update(
+                _git(cwd, "hash-object", "--stdin-paths", stdin=b"\n".join(paths)) or b""
+            )
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of final answers keyed on the task, program config and revision.
+
+    Each answer is a small JSON file named by its key. Entries expire after
+    `ttl` seconds; the file mtime records the last hit, and the least recently
+    used entries are evicted once the cache grows past `max_bytes`. Hit and
+    miss counts are kept in a stats file.
+    """
+
+    def __init__(
+        self,
+        root: str | None = None,
+        ttl: int | None = None,
+        max_bytes: int | None = None,
+    ):
+        if ttl is None:
+            ttl = read_int_env("MICROCODE_RESPONSE_CACHE_TTL") or RESPONSE_CACHE_TTL
+        if max_bytes is None:
+            max_bytes = read_int_env("MICROCODE_RESPONSE_CACHE_MAX_BYTES") or RESPONSE_CACHE_MAX_BYTES
+        assert ttl > 0, "ttl must be positive"
+        assert max_bytes > 0, "max_bytes must be positive"
+
+        self.root = root or RESPONSE_CACHE_DIR
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(
+        task: str,
+        config: dict[str, Any],
+        revision: str | None = None,
+        workspace: str | None = None,
+        route: str | None = None,
+    ) -> str:
+        """
+        Build the cache key for a task.
+
+        Args:
+            task: The task prompt
+            config: Program config from resolve_agent_config
+            revision: Program revision (see programs.program_revision)
+            workspace: Optional workspace fingerprint
+            route: Effective task routing, since a direct answer differs from an RLM one
+
+        Returns:
+            A hex digest
+        """
+        assert isinstance(task, str), "task must be a str"
+        assert isinstance(config, dict), "config must be a dict"
+
+        payload = {
+            "task": normalize_task(task),
+            "config": {field: config.get(field) for field in _KEY_FIELDS},
+            "revision": revision,
+            "workspace": workspace,
+            "route": route,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key + _ENTRY_SUFFIX)
+
+    def get(self, key: str) -> str | None:
+        """
+        Return the cached answer for a key, counting the lookup as a hit or miss.
+        """
+        path = self._entry_path(key)
+        answer = None
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                entry = json.load(handle)
+            if time.time() - entry.get("created", 0) < self.ttl:
+                answer = entry.get("answer")
+                os.utime(path)
+            else:
+                os.remove(path)
+        except (OSError, json.JSONDecodeError, AttributeError):
+            answer = None
+
+        self._count("hits" if isinstance(answer, str) else "misses")
+        return answer if isinstance(answer, str) else None
+
+    def put(self, key: str, answer: str, task: str | None = None) -> None:
+        """
+        Store an answer and evict expired and least recently used entries.
+        """
+        assert isinstance(answer, str), "answer must be a str"
+
+        entry = {"created": time.time(), "answer": answer}
+        if task is not None:
+            entry["task"] = normalize_task(task)[:200]
+        self._write_json(self._entry_path(key), entry)
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove expired entries, then the least recently used ones beyond max_bytes.
+
+        Returns:
+            The number of entries removed
+        """
+        try:
+            names = [name for name in os.listdir(self.root) if name.endswith(_ENTRY_SUFFIX)]
+        except OSError:
+            return 0
+
+        now = time.time()
+        entries = []
+        for name in names:
+            if name == _STATS_NAME:
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        total = sum(size for _mtime, size, _path in entries)
+        for mtime, size, path in sorted(entries):
+            # Entries are never hit after the TTL, so mtime bounds their age too.
+            if total <= self.max_bytes and now - mtime < self.ttl:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return lookup counters plus the current number and size of entries.
+        """
+        counters = self._read_counters()
+        entries = 0
+        size = 0
+        try:
+            for name in os.listdir(self.root):
+                if name.endswith(_ENTRY_SUFFIX) and name != _STATS_NAME:
+                    entries += 1
+                    size += os.path.getsize(os.path.join(self.root, name))
+        except OSError:
+            pass
+        return {**counters, "entries": entries, "bytes": size}
+
+    def clear(self) -> None:
+        """
+        Delete every entry and reset the counters.
+        """
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(_ENTRY_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+
+    def _read_counters(self) -> dict[str, int]:
+        counters = {"hits": 0, "misses": 0}
+        try:
+            with open(os.path.join(self.root, _STATS_NAME), "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+            for name in counters:
+                if isinstance(data.get(name), int):
+                    counters[name] = data[name]
+        except (OSError, json.JSONDecodeError, AttributeError):
+            pass
+        return counters
+
+    def _count(self, name: str) -> None:
+        # Concurrent processes may lose an increment; the counters are advisory.
+        counters = self._read_counters()
+        counters[name] += 1
+        self._write_json(os.path.join(self.root, _STATS_NAME), counters)
+
+    def _write_json(self, path: str, data: dict[str, Any]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix="microcode_response_", suffix=".tmp", dir=self.root)
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(data, handle)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
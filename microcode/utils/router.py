@@ -0,0 +1,282 @@
+import os
+import re
+import time
+from typing import Any
+
+from .cache import load_route_baseline, save_route_baseline
+from .constants import ROUTE_BASELINE_WINDOW, ROUTE_MAX_DIRECT_CHARS, ROUTE_MODES
+from .stats import percentile
+from .tracing import get_tracer
+
+# Signals that a task needs the workspace, code execution or several steps.
+_RLM_PATTERNS = (
+    (re.compile(r"\[paste_\d+\]"), "references a paste"),
+    (re.compile(r"```|^\s*(def|class|import|from|function|const|let)\s", re.MULTILINE), "contains code"),
+    (
+        re.compile(r"\b(fix|implement|refactor|rename|edit|modify|delete|debug|migrate|install|commit|grep)\b", re.IGNORECASE),
+        "asks for work in the workspace",
+    ),
+    # Verbs that are also common nouns ("a list", "the test") only count as commands.
+    (
+        re.compile(
+            r"(^|[.;!?]\s+|\b(please|you|and|then)\s+)(write|create|add|update|change|remove|move|run|"
+            r"execute|test|build|generate|convert|port|review|search|find|list|read|open|show|look at|check)\b",
+            re.IGNORECASE,
+        ),
+        "asks for work in the workspace",
+    ),
+    (
+        re.compile(
+            r"\b(this|the|our|my)\s+(repo|repository|codebase|project|file|files|directory|folder|"
+            r"module|package|function|class|method|script|tests?|branch|diff|error|traceback|bug)\b",
+            re.IGNORECASE,
+        ),
+        "refers to the workspace",
+    ),
+    (
+        re.compile(
+            r"(^|\s)[\w.-]*[/\\][\w./\\-]+|"
+            r"\b[\w-]+\.(py|js|ts|tsx|jsx|go|rs|java|c|h|cpp|rb|md|json|toml|ya?ml|txt|sh|cfg|ini)\b"
+        ),
+        "mentions a path",
+    ),
+)
+_QUESTION = re.compile(
+    r"^(what|what's|whats|why|how|when|where|which|who|whom|whose|is|are|was|were|can|could|does|do|did|"
+    r"should|would|will|explain|define|describe|compare|tell me)\b",
+    re.IGNORECASE,
+)
+_SMALL_TALK = re.compile(
+    r"^(hi|hello|hey|thanks|thank you|thx|good (morning|afternoon|evening))\b[\s!.]*$", re.IGNORECASE
+)
+
+# The direct path answers with this word when the question needs the workspace after all.
+ESCALATE = "ESCALATE"
+
+_DIRECT_INSTRUCTIONS = (
+    "You are microcode, a coding assistant in the user's terminal. Answer the user's latest "
+    "message directly and concisely in markdown; the task below also carries the working "
+    "directory and recent conversation. If a correct answer needs reading or changing files "
+    f"in the workspace, running code or several steps, reply with exactly {ESCALATE} and nothing else."
+)
+_CLASSIFY_INSTRUCTIONS = (
+    "Classify the user's request to a coding assistant. Reply with one word: DIRECT if it is a "
+    "question that can be answered from general knowledge and the conversation alone, or AGENT "
+    "if it needs reading or changing files, running code or several steps."
+)
+
+
+def classify_task(text: str) -> tuple[str | None, str]:
+    """
+    Classify a user request with local heuristics.
+
+    Args:
+        text: The user's message (without history)
+
+    Returns:
+        ("direct", reason), ("rlm", reason), or (None, reason) when undecided
+    """
+    assert isinstance(text, str), "text must be a str"
+
+    text = text.strip()
+    if not text:
+        return "rlm", "empty task"
+    if len(text) > ROUTE_MAX_DIRECT_CHARS:
+        return "rlm", "long task"
+    if text.count("\n") >= 2:
+        return "rlm", "several lines"
+    for pattern, reason in _RLM_PATTERNS:
+        if pattern.search(text):
+            return "rlm", reason
+    if _SMALL_TALK.match(text):
+        return "direct", "small talk"
+    if _QUESTION.match(text) or text.endswith("?"):
+        return "direct", "short question"
+    return None, "no strong signal"
+
+
+def _output_text(outputs: Any) -> str:
+    output = outputs[0] if isinstance(outputs, list) and outputs else outputs
+    if isinstance(output, dict):
+        output = output.get("text")
+    return str(output or "").strip()
+
+
+def _classify_messages(text: str) -> list[dict[str, str]]:
+    return [{"role": "system", "content": _CLASSIFY_INSTRUCTIONS}, {"role": "user", "content": text}]
+
+
+def _direct_messages(task: str) -> list[dict[str, str]]:
+    return [{"role": "system", "content": _DIRECT_INSTRUCTIONS}, {"role": "user", "content": task}]
+
+
+def _direct_result(outputs: Any) -> Any:
+    import dspy
+
+    answer = _output_text(outputs)
+    if not answer or answer.strip("`*. ").upper() == ESCALATE:
+        return None
+    return dspy.Prediction(answer=answer)
+
+
+def answer_directly(lm: Any, task: str) -> Any:
+    """
+    Answer a task with a single LM completion instead of the RLM loop.
+
+    Args:
+        lm: The program's main dspy LM
+        task: The rendered task, with working directory and history
+
+    Returns:
+        A Prediction with `answer`, or None if the LM escalated to the RLM
+    """
+    return _direct_result(lm(messages=_direct_messages(task)))
+
+
+async def aanswer_directly(lm: Any, task: str) -> Any:
+    """
+    Async answer_directly, for the AgentRunner loop.
+    """
+    return _direct_result(await lm.acall(messages=_direct_messages(task)))
+
+
+class TaskRouter:
+    """
+    Decide per task whether to run the RLM loop or answer with one LM completion.
+
+    In "auto" mode local heuristics decide first; tasks they cannot place
+    go to the RLM, or, with `use_lm`, to one sub_lm classification call.
+    "direct" and "rlm" force a path. Each decision is recorded as a "route"
+    trace span with the latency saved against the median of recent RLM
+    turns, which are kept across runs.
+
+    Args:
+        mode: "auto", "direct" or "rlm" (default MICROCODE_ROUTE, else "auto")
+        use_lm: Ask the sub_lm when heuristics are undecided (default MICROCODE_ROUTE_LM=1)
+    """
+
+    def __init__(self, mode: str | None = None, use_lm: bool | None = None):
+        mode = mode or os.getenv("MICROCODE_ROUTE") or "auto"
+        assert mode in ROUTE_MODES, f"mode must be one of {ROUTE_MODES}"
+
+        self.mode = mode
+        self.use_lm = os.getenv("MICROCODE_ROUTE_LM") == "1" if use_lm is None else use_lm
+        self.counts = {"direct": 0, "rlm": 0, "escalated": 0}
+        self.saved_seconds = 0.0
+        self._baseline: list[float] | None = None
+
+    def _decide(self, text: str) -> dict[str, Any]:
+        if self.mode != "auto":
+            return {"route": self.mode, "reason": "forced"}
+        route, reason = classify_task(text)
+        return {"route": route, "reason": reason}
+
+    def _label(self, outputs: Any) -> dict[str, Any]:
+        label = _output_text(outputs).upper()
+        if label.startswith("DIRECT"):
+            return {"route": "direct", "reason": "sub_lm: direct"}
+        return {"route": "rlm", "reason": "sub_lm: agent"}
+
+    def route(self, text: str, lm: Any = None) -> dict[str, Any]:
+        """
+        Route a task.
+
+        Args:
+            text: The user's message (without history)
+            lm: The sub_lm, used when heuristics are undecided and use_lm is set
+
+        Returns:
+            Dict with route ("direct" or "rlm"), reason and classify_seconds
+        """
+        started = time.perf_counter()
+        decision = self._decide(text)
+        if decision["route"] is None:
+            decision = {"route": "rlm", "reason": decision["reason"]}
+            if self.use_lm and lm is not None:
+                try:
+                    decision = self._label(lm(messages=_classify_messages(text)))
+                except Exception as err:
+                    decision["reason"] = f"sub_lm failed: {type(err).__name__}"
+        decision["classify_seconds"] = round(time.perf_counter() - started, 3)
+        return decision
+
+    async def aroute(self, text: str, lm: Any = None) -> dict[str, Any]:
+        """
+        Async route, for the AgentRunner loop.
+        """
+        started = time.perf_counter()
+        decision = self._decide(text)
+        if decision["route"] is None:
+            decision = {"route": "rlm", "reason": decision["reason"]}
+            if self.use_lm and lm is not None:
+                try:
+                    decision = self._label(await lm.acall(messages=_classify_messages(text)))
+                except Exception as err:
+                    decision["reason"] = f"sub_lm failed: {type(err).__name__}"
+        decision["classify_seconds"] = round(time.perf_counter() - started, 3)
+        return decision
+
+    def escalate(self, decision: dict[str, Any]) -> None:
+        """
+        Mark a direct decision as handed back to the RLM after the LM answered ESCALATE.
+        """
+        decision["route"] = "rlm"
+        decision["reason"] = f"escalated ({decision['reason']})"
+        decision["escalated"] = True
+
+    def record(self, decision: dict[str, Any], task: str, started_at: float, seconds: float) -> float | None:
+        """
+        Log a finished turn's routing decision and update the RLM baseline.
+
+        Args:
+            decision: The decision from route, as finally taken
+            task: The user's message
+            started_at: Turn start as time.time()
+            seconds: Turn wall time
+
+        Returns:
+            Seconds saved against the median recent RLM turn, or None without a baseline
+        """
+        if self._baseline is None:
+            self._baseline = load_route_baseline()
+        route = decision["route"]
+        saved = None
+        if route == "rlm":
+            if not decision.get("escalated"):
+                self._baseline = (self._baseline + [round(seconds, 3)])[-ROUTE_BASELINE_WINDOW:]
+                save_route_baseline(self._baseline)
+        else:
+            baseline = percentile(self._baseline, 0.5)
+            if baseline is not None:
+                saved = baseline - seconds
+                self.saved_seconds += saved
+        self.counts[route] += 1
+        if decision.get("escalated"):
+            self.counts["escalated"] += 1
+        decision["saved_seconds"] = round(saved, 3) if saved is not None else None
+
+        tracer = get_tracer()
+        if tracer is not None:
+            tracer.record(
+                "route",
+                route,
+                started_at,
+                seconds,
+                task=task[:200],
+                mode=self.mode,
+                reason=decision["reason"],
+                classify_seconds=decision.get("classify_seconds"),
+                saved_seconds=decision["saved_seconds"],
+            )
+        return saved
+
+
+def format_route(decision: dict[str, Any]) -> str:
+    """
+    Format a recorded routing decision as a one-line summary.
+    """
+    line = f"route: {decision['route']} ({decision['reason']})"
+    saved = decision.get("saved_seconds")
+    if decision["route"] == "direct" and saved is not None:
+        line += f", ~{saved:.1f}s saved vs median RLM turn"
+    return line
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable
+
+from .streaming import astream_agent
+
+
+class TurnCancelled(BaseException):
+    """
+    Raised when the user cancels an agent turn.
+
+    It derives from BaseException so that program code catching Exception
+    (for example around executed REPL code) cannot swallow it.
+    """
+
+
+def _cancel_callback(cancelled: threading.Event) -> Any:
+    """
+    Build a dspy callback that aborts a cancelled turn at its next module, LM or tool call.
+    """
+    from dspy.utils.callback import BaseCallback
+
+    class CancelCheck(BaseCallback):
+        def _check(self) -> None:
+            if cancelled.is_set():
+                raise TurnCancelled()
+
+        def on_module_start(self, call_id: str, instance: Any, inputs: dict[str, Any]) -> None:
+            self._check()
+
+        def on_lm_start(self, call_id: str, instance: Any, inputs: dict[str, Any]) -> None:
+            self._check()
+
+        def on_tool_start(self, call_id: str, instance: Any, inputs: dict[str, Any]) -> None:
+            self._check()
+
+    return CancelCheck()
+
+
+class AgentRunner:
+    """
+    Run agent turns on a background asyncio loop so that Ctrl-C cancels the turn.
+
+    The calling thread only waits on the turn, so a KeyboardInterrupt lands
+    there: the turn's task is cancelled (cancelling in-flight LM requests for
+    programs with `aforward`) and a cancel flag makes any worker thread stop
+    at its next module, LM or tool call.
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="microcode-runner", daemon=True
+        )
+        self._thread.start()
+
+    async def _turn(
+        self,
+        agent: Any,
+        task: str,
+        on_event: Callable[[str, str], None],
+        cancelled: threading.Event,
+    ) -> Any:
+        import dspy
+
+        callbacks = [_cancel_callback(cancelled), *dspy.settings.callbacks]
+        with dspy.context(callbacks=callbacks):
+            return await astream_agent(agent, task, on_event)
+
+    def run(self, agent: Any, task: str, on_event: Callable[[str, str], None]) -> Any:
+        """
+        Run one streamed turn, waiting for it in a way that lets Ctrl-C through.
+
+        Args:
+            agent: The loaded program
+            task: The task string
+            on_event: Callback receiving (kind, text) stream events
+
+        Returns:
+            The final prediction
+
+        Raises:
+            TurnCancelled: If the user pressed Ctrl-C during the turn
+        """
+        assert isinstance(task, str), "task must be a str"
+
+        cancelled = threading.Event()
+        future: Future = asyncio.run_coroutine_threadsafe(
+            self._turn(agent, task, on_event, cancelled), self._loop
+        )
+        return self._wait(future, cancelled)
+
+    def call(self, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Run a coroutine function on the loop with the same Ctrl-C handling as run.
+
+        Used for turn steps outside the RLM program, such as routing and
+        direct answers.
+
+        Raises:
+            TurnCancelled: If the user pressed Ctrl-C while it ran
+        """
+        cancelled = threading.Event()
+
+        async def step() -> Any:
+            import dspy
+
+            callbacks = [_cancel_callback(cancelled), *dspy.settings.callbacks]
+            with dspy.context(callbacks=callbacks):
+                return await func(*args)
+
+        future: Future = asyncio.run_coroutine_threadsafe(step(), self._loop)
+        return self._wait(future, cancelled)
+
+    def _wait(self, future: Future, cancelled: threading.Event) -> Any:
+        try:
+            while True:
+                try:
+                    return future.result(timeout=0.1)
+                except FutureTimeoutError:
+                    continue
+        except KeyboardInterrupt:
+            cancelled.set()
+            future.cancel()
+            raise TurnCancelled() from None
+
+    def close(self) -> None:
+        """
+        Stop the event loop thread.
+        """
+        if self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=1)
+        if not self._thread.is_alive():
+            self._loop.close()
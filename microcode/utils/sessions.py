@@ -0,0 +1,412 @@
+import gzip
+import json
+import os
+import re
+import secrets
+import struct
+import time
+import zlib
+from typing import Any
+
+from .constants import (
+    SESSION_FSYNC_INTERVAL,
+    SESSION_LIMIT,
+    SESSION_RETENTION_DAYS,
+    SESSIONS_DIR,
+)
+from .display import read_int_env
+from .paste import PASTE_REF_RE
+
+_LOG_SUFFIX = ".jsonl.gz"
+_INDEX_SUFFIX = ".idx"
+# Index records are (offset, length) of one gzip member in the log.
+_INDEX_RECORD = struct.Struct("<QQ")
+_SESSION_ID_RE = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{6}$")
+
+
+def _log_path(session_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, session_id + _LOG_SUFFIX)
+
+
+def _index_path(session_id: str) -> str:
+    return os.path.join(SESSIONS_DIR, session_id + _INDEX_SUFFIX)
+
+
+def _new_session_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+def _read_member(handle: Any, offset: int, length: int) -> dict[str, Any]:
+    handle.seek(offset)
+    return json.loads(gzip.decompress(handle.read(length)).decode("utf-8"))
+
+
+def _scan_members(data: bytes) -> list[tuple[int, int]]:
+    """
+    Return (offset, length) for every complete gzip member at the start of data.
+    """
+    members = []
+    offset = 0
+    while offset < len(data):
+        decoder = zlib.decompressobj(wbits=31)
+        try:
+            decoder.decompress(data[offset:])
+        except zlib.error:
+            break
+        if not decoder.eof:
+            break
+        length = len(data) - offset - len(decoder.unused_data)
+        members.append((offset, length))
+        offset += length
+    return members
+
+
+def _recover(session_id: str) -> int:
+    """
+    Reconcile a session's index with its log after a crash.
+
+    Index records pointing past the end of the log are dropped, complete
+    records written after the last index entry are indexed, and a torn
+    trailing record is truncated away.
+
+    Returns:
+        The number of records in the session
+    """
+    log_path = _log_path(session_id)
+    index_path = _index_path(session_id)
+    log_size = os.path.getsize(log_path)
+
+    entries = _load_index(session_id)
+    while entries and sum(entries[-1]) > log_size:
+        entries.pop()
+    end = sum(entries[-1]) if entries else 0
+
+    with open(log_path, "rb") as handle:
+        handle.seek(end)
+        members = [(end + offset, length) for offset, length in _scan_members(handle.read())]
+    entries.extend(members)
+    valid_end = sum(entries[-1]) if entries else 0
+
+    if valid_end < log_size:
+        with open(log_path, "r+b") as handle:
+            handle.truncate(valid_end)
+    try:
+        index_size = os.path.getsize(index_path)
+    except OSError:
+        index_size = -1
+    if members or index_size != len(entries) * _INDEX_RECORD.size:
+        with open(index_path, "wb") as handle:
+            for offset, length in entries:
+                handle.write(_INDEX_RECORD.pack(offset, length))
+    return len(entries)
+
+
+def _load_index(session_id: str) -> list[tuple[int, int]]:
+    try:
+        with open(_index_path(session_id), "rb") as handle:
+            data = handle.read()
+    except OSError:
+        return []
+    usable = len(data) - len(data) % _INDEX_RECORD.size
+    return [record for record in _INDEX_RECORD.iter_unpack(data[:usable])]
+
+
+class SessionLog:
+    """
+    Append-only, gzip-compressed JSONL log of conversation turns.
+
+    Every record is written as its own gzip member, so the log stays a valid
+    gzip stream, and its offset and length go to a fixed-width index file.
+    Reading the last N records costs one seek into the index and one seek per
+    record, regardless of how long the session is. Writes are flushed per
+    record and fsynced at most every `SESSION_FSYNC_INTERVAL` seconds.
+    """
+
+    def __init__(self, session_id: str | None = None):
+        assert session_id is None or isinstance(session_id, str), "session_id must be a str"
+
+        self.session_id = session_id or _new_session_id()
+        self._log = None
+        self._index = None
+        self._last_sync = 0.0
+        self._count = 0
+        if os.path.exists(_log_path(self.session_id)):
+            self._count = _recover(self.session_id)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _open(self) -> None:
+        if self._log is not None:
+            return
+        os.makedirs(SESSIONS_DIR, mode=0o700, exist_ok=True)
+        self._log = open(_log_path(self.session_id), "ab")
+        self._index = open(_index_path(self.session_id), "ab")
+        for path in (_log_path(self.session_id), _index_path(self.session_id)):
+            try:
+                os.chmod(path, 0o600)
+            except OSError:
+                pass
+
+    def append(self, record: dict[str, Any]) -> None:
+        """
+        Append a record to the session.
+
+        Args:
+            record: JSON-serializable record, usually one conversation turn
+        """
+        assert isinstance(record, dict), "record must be a dict"
+
+        self._open()
+        member = gzip.compress(
+            (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"),
+            compresslevel=6,
+            mtime=0,
+        )
+        offset = self._log.tell()
+        self._log.write(member)
+        self._log.flush()
+        # The index is written after the data so a crash never indexes a torn record.
+        self._index.write(_INDEX_RECORD.pack(offset, len(member)))
+        self._index.flush()
+        self._count += 1
+
+        interval = read_int_env("MICROCODE_SESSION_FSYNC_INTERVAL")
+        if interval is None:
+            interval = SESSION_FSYNC_INTERVAL
+        now = time.monotonic()
+        if now - self._last_sync >= interval:
+            self.sync()
+            self._last_sync = now
+
+    def sync(self) -> None:
+        """
+        Force written records to disk.
+        """
+        if self._log is None:
+            return
+        os.fsync(self._log.fileno())
+        os.fsync(self._index.fileno())
+
+    def tail(self, count: int) -> list[dict[str, Any]]:
+        """
+        Return the last records of the session, oldest first.
+
+        Args:
+            count: Maximum number of records to return
+
+        Returns:
+            Up to count records
+        """
+        assert count >= 0, "count must be non-negative"
+        return read_tail(self.session_id, count)
+
+    def close(self) -> None:
+        """
+        Sync and close the log files.
+        """
+        if self._log is None:
+            return
+        try:
+            self.sync()
+        except OSError:
+            pass
+        self._log.close()
+        self._index.close()
+        self._log = None
+        self._index = None
+
+
+def read_tail(session_id: str, count: int) -> list[dict[str, Any]]:
+    """
+    Read the last records of a session through its index.
+
+    Args:
+        session_id: The session ID
+        count: Maximum number of records to return
+
+    Returns:
+        Up to count records, oldest first
+
+    Raises:
+        FileNotFoundError: If the session does not exist
+    """
+    assert isinstance(session_id, str), "session_id must be a str"
+
+    if not os.path.exists(_log_path(session_id)):
+        raise FileNotFoundError(f"Session not found: {session_id}")
+    if count <= 0:
+        return []
+
+    log_size = os.path.getsize(_log_path(session_id))
+    index_path = _index_path(session_id)
+    try:
+        index_size = os.path.getsize(index_path)
+    except OSError:
+        index_size = 0
+    total = index_size // _INDEX_RECORD.size
+    start = max(total - count, 0)
+
+    records = []
+    try:
+        with open(index_path, "rb") as index, open(_log_path(session_id), "rb") as log:
+            index.seek(start * _INDEX_RECORD.size)
+            for offset, length in _INDEX_RECORD.iter_unpack(
+                index.read((total - start) * _INDEX_RECORD.size)
+            ):
+                if offset + length > log_size:
+                    break
+                records.append(_read_member(log, offset, length))
+        return records
+    except (OSError, EOFError, zlib.error, json.JSONDecodeError):
+        # A damaged index falls back to recovery and a second read.
+        _recover(session_id)
+        with open(index_path, "rb") as index, open(_log_path(session_id), "rb") as log:
+            entries = list(_INDEX_RECORD.iter_unpack(index.read()))[-count:]
+            return [_read_member(log, offset, length) for offset, length in entries]
+
+
+def turn_record(context: Any, user: str, assistant: str, model: str | None = None) -> dict[str, Any]:
+    """
+    Build the session record for a finished turn.
+
+    Pastes referenced by the user input are stored with the turn so that a
+    resumed session can restore them.
+
+    Args:
+        context: The ConversationContext holding the pastes
+        user: The user input for the turn
+        assistant: The assistant answer for the turn
+        model: The model that answered
+
+    Returns:
+        A JSON-serializable record
+    """
+    pastes = {
+        paste_id: context.pastes.get(paste_id)
+        for paste_id in dict.fromkeys(PASTE_REF_RE.findall(user))
+        if paste_id in context.pastes
+    }
+    record: dict[str, Any] = {
+        "time": time.time(),
+        "user": user,
+        "assistant": assistant,
+        "model": model,
+    }
+    if pastes:
+        record["pastes"] = pastes
+    return record
+
+
+def restore_session(context: Any, session_id: str) -> "SessionLog":
+    """
+    Load the tail of a saved session into a context and reopen it for appending.
+
+    Only the last `context.history_limit` turns are read. Stored pastes are
+    re-added to the context and their [paste_N] references renumbered.
+
+    Args:
+        context: The ConversationContext to fill
+        session_id: The session to resume
+
+    Returns:
+        The reopened SessionLog
+
+    Raises:
+        FileNotFoundError: If the session does not exist
+    """
+    log = SessionLog(session_id)
+    if not len(log):
+        raise FileNotFoundError(f"Session not found: {session_id}")
+
+    context.clear_history()
+    for record in log.tail(context.history_limit):
+        user = record.get("user", "")
+        assistant = record.get("assistant", "")
+        renamed = {
+            old_id: context.pastes.add(text)
+            for old_id, text in (record.get("pastes") or {}).items()
+        }
+        if renamed:
+            rename = lambda match: f"[{renamed.get(match.group(1), match.group(1))}]"
+            user = PASTE_REF_RE.sub(rename, user)
+            assistant = PASTE_REF_RE.sub(rename, assistant)
+        context.add_turn(user, assistant)
+    return log
+
+
+def list_sessions() -> list[dict[str, Any]]:
+    """
+    List saved sessions, newest first.
+
+    Returns:
+        Dicts with id, updated (epoch seconds), turns and the first user input
+    """
+    try:
+        names = os.listdir(SESSIONS_DIR)
+    except OSError:
+        return []
+
+    sessions = []
+    for name in names:
+        if not name.endswith(_LOG_SUFFIX):
+            continue
+        session_id = name[: -len(_LOG_SUFFIX)]
+        if not _SESSION_ID_RE.match(session_id):
+            continue
+        entries = _load_index(session_id)
+        first = ""
+        try:
+            if entries:
+                with open(_log_path(session_id), "rb") as handle:
+                    first = _read_member(handle, *entries[0]).get("user", "")
+            updated = os.path.getmtime(_log_path(session_id))
+        except (OSError, EOFError, zlib.error, json.JSONDecodeError):
+            continue
+        sessions.append(
+            {"id": session_id, "updated": updated, "turns": len(entries), "first": first}
+        )
+    sessions.sort(key=lambda session: session["updated"], reverse=True)
+    return sessions
+
+
+def resolve_session_id(ref: str) -> str | None:
+    """
+    Resolve "last", a full session ID or a unique ID suffix to a session ID.
+    """
+    sessions = list_sessions()
+    if ref == "last":
+        return sessions[0]["id"] if sessions else None
+    matches = [session["id"] for session in sessions if session["id"].endswith(ref)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def evict_sessions(
+    limit: int | None = None,
+    retention_days: int | None = None,
+    keep: str | None = None,
+) -> None:
+    """
+    Delete sessions beyond the count limit or older than the retention period.
+
+    Args:
+        limit: Maximum sessions kept (defaults to MICROCODE_SESSION_LIMIT or SESSION_LIMIT)
+        retention_days: Maximum age in days (defaults to MICROCODE_SESSION_RETENTION_DAYS)
+        keep: A session ID that is never deleted, e.g. the active one
+    """
+    if limit is None:
+        limit = read_int_env("MICROCODE_SESSION_LIMIT") or SESSION_LIMIT
+    if retention_days is None:
+        retention_days = read_int_env("MICROCODE_SESSION_RETENTION_DAYS") or SESSION_RETENTION_DAYS
+
+    cutoff = time.time() - retention_days * 86400
+    for position, session in enumerate(list_sessions()):
+        if session["id"] == keep:
+            continue
+        if position < limit and session["updated"] >= cutoff:
+            continue
+        for path in (_log_path(session["id"]), _index_path(session["id"])):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
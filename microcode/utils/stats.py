@@ -0,0 +1,180 @@
+import math
+from typing import Any
+
+from .usage import cached_prompt_tokens, entries_since, history_marker
+
+# Roles of the LMs a program exposes, in reporting order.
+_LM_ROLES = ("lm", "sub_lm")
+_TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def _program_lms(agent: Any) -> dict[str, Any]:
+    """
+    Return the program's distinct LMs by role; a sub_lm that is the main LM is only counted once.
+    """
+    lms: dict[str, Any] = {}
+    for role in _LM_ROLES:
+        lm = getattr(agent, role, None)
+        if lm is not None and all(lm is not other for other in lms.values()):
+            lms[role] = lm
+    return lms
+
+
+def lm_markers(agent: Any) -> dict[str, Any]:
+    """
+    Mark the end of each program LM's history before a turn.
+
+    Returns:
+        Markers by role, for turn_stats
+    """
+    return {role: history_marker(lm) for role, lm in _program_lms(agent).items()}
+
+
+def _model_stats(lm: Any, entries: list[dict[str, Any]]) -> dict[str, Any]:
+    cached, prompt = cached_prompt_tokens(entries)
+    completion = sum((entry.get("usage") or {}).get("completion_tokens") or 0 for entry in entries)
+    costs = [entry["cost"] for entry in entries if isinstance(entry.get("cost"), (int, float))]
+    return {
+        "model": getattr(lm, "model", None),
+        "calls": len(entries),
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "cached_tokens": cached,
+        "cost": round(sum(costs), 6),
+        "priced_calls": len(costs),
+    }
+
+
+def turn_stats(agent: Any, result: Any, markers: dict[str, Any], seconds: float) -> dict[str, Any]:
+    """
+    Summarize one agent call from the LM histories recorded since lm_markers.
+
+    Cost comes from the provider-reported `response_cost` of each call, so
+    it is an estimate and calls without pricing (for example cache hits)
+    count as free; `priced_calls` says how many calls had a price.
+
+    Args:
+        agent: The program that ran
+        result: Its prediction (may be None if the call failed)
+        markers: Markers from lm_markers taken before the call
+        seconds: Wall time of the call
+
+    Returns:
+        A JSON-serializable dict
+    """
+    models = {
+        role: _model_stats(lm, entries_since(lm, markers.get(role)))
+        for role, lm in _program_lms(agent).items()
+    }
+    stats: dict[str, Any] = {"seconds": round(seconds, 3), "models": models}
+    stats["lm_calls"] = sum(model["calls"] for model in models.values())
+    for field in _TOKEN_FIELDS:
+        stats[field] = sum(model[field] for model in models.values())
+    stats["cost"] = round(sum(model["cost"] for model in models.values()), 6)
+
+    trajectory = getattr(result, "trajectory", None)
+    stats["iterations"] = len(trajectory) if isinstance(trajectory, list) else None
+    config = getattr(agent, "config", None)
+    stats["max_iters"] = getattr(config, "max_iters", None) or getattr(agent, "max_iterations", None)
+    return stats
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    """
+    Return the nearest-rank percentile of values, or None if there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(max(math.ceil(fraction * len(ordered)) - 1, 0), len(ordered) - 1)
+    return ordered[rank]
+
+
+class SessionStats:
+    """
+    Per-turn stats for an interactive session, with totals and percentiles for /stats.
+    """
+
+    def __init__(self) -> None:
+        self.turns: list[dict[str, Any]] = []
+
+    def add(self, stats: dict[str, Any]) -> None:
+        assert isinstance(stats, dict), "stats must be a dict"
+        self.turns.append(stats)
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Return session totals, per-model totals, route counts and p50/p90/max of turn time, cost and LM calls.
+        """
+        summary: dict[str, Any] = {"turns": len(self.turns), "models": {}}
+        for field in ("seconds", "lm_calls", *_TOKEN_FIELDS, "cost"):
+            summary[field] = round(sum(turn.get(field) or 0 for turn in self.turns), 6)
+        for turn in self.turns:
+            for role, model in turn.get("models", {}).items():
+                totals = summary["models"].setdefault(
+                    role, {"model": model.get("model"), "calls": 0, **{field: 0 for field in _TOKEN_FIELDS}, "cost": 0.0}
+                )
+                totals["model"] = model.get("model")
+                for field in ("calls", *_TOKEN_FIELDS, "cost"):
+                    totals[field] += model.get(field) or 0
+        iterations = [turn["iterations"] for turn in self.turns if turn.get("iterations") is not None]
+        summary["iterations"] = sum(iterations)
+        routed = [turn for turn in self.turns if turn.get("route")]
+        summary["routes"] = {
+            "direct": sum(turn["route"] == "direct" for turn in routed),
+            "rlm": sum(turn["route"] == "rlm" for turn in routed),
+            "saved_seconds": round(sum(turn.get("saved_seconds") or 0 for turn in routed), 3),
+        }
+        summary["percentiles"] = {
+            field: {
+                name: percentile([turn.get(field) or 0 for turn in self.turns], fraction)
+                for name, fraction in (("p50", 0.5), ("p90", 0.9), ("max", 1.0))
+            }
+            for field in ("seconds", "cost", "lm_calls")
+        }
+        return summary
+
+
+def format_turn_stats(stats: dict[str, Any]) -> str:
+    """
+    Format turn_stats as a one-line summary.
+    """
+    iterations = ""
+    if stats.get("iterations") is not None:
+        iterations = f"{stats['iterations']}/{stats.get('max_iters') or '?'} iterations, "
+    return (
+        f"{stats['seconds']:.1f}s, {iterations}{stats['lm_calls']} LM calls, "
+        f"{stats['prompt_tokens']:,} in / {stats['completion_tokens']:,} out tokens, ${stats['cost']:.4f}"
+    )
+
+
+def format_session_stats(summary: dict[str, Any]) -> list[str]:
+    """
+    Format SessionStats.summary() as lines for /stats.
+    """
+    if not summary["turns"]:
+        return ["No turns yet"]
+
+    lines = [
+        f"{summary['turns']} turns, {summary['seconds']:.1f}s, {summary['lm_calls']} LM calls, "
+        f"{summary['iterations']} iterations, ${summary['cost']:.4f}"
+    ]
+    for role, model in summary["models"].items():
+        name = (model.get("model") or role).removeprefix("openrouter/")
+        lines.append(
+            f"  {role} ({name}): {model['calls']} calls, {model['prompt_tokens']:,} in "
+            f"({model['cached_tokens']:,} cached) / {model['completion_tokens']:,} out, ${model['cost']:.4f}"
+        )
+    routes = summary.get("routes") or {}
+    if routes.get("direct"):
+        lines.append(
+            f"  routed: {routes['direct']} direct (~{routes['saved_seconds']:.1f}s saved), {routes['rlm']} RLM"
+        )
+    percentiles = summary["percentiles"]
+    lines.append(
+        "  per turn p50/p90/max: "
+        f"{percentiles['seconds']['p50']:.1f}/{percentiles['seconds']['p90']:.1f}/{percentiles['seconds']['max']:.1f}s, "
+        f"${percentiles['cost']['p50']:.4f}/${percentiles['cost']['p90']:.4f}/${percentiles['cost']['max']:.4f}, "
+        f"{percentiles['lm_calls']['p50']}/{percentiles['lm_calls']['p90']}/{percentiles['lm_calls']['max']} LM calls"
+    )
+    return lines
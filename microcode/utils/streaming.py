@@ -0,0 +1,258 @@
+from typing import Any, Callable
+
+import click
+
+from .constants import BOLD, CYAN, DIM, RESET
+from .display import render_markdown
+
+# Output field streamed from the RLM action predictor on every iteration.
+_STREAM_FIELD = "reasoning"
+
+
+class MarkdownStream:
+    """
+    Incremental markdown renderer for streamed text.
+
+    Chunks are buffered until a line is complete, because inline markup such
+    as **bold** can be split across chunks. Complete lines go through
+    render_markdown, headings are shown in bold and fenced code is passed
+    through untouched. With `ansi=False` chunks are returned as-is for piping.
+    """
+
+    def __init__(self, ansi: bool = True, style: str = ""):
+        self.ansi = ansi
+        self.style = style
+        self._buffer = ""
+        self._in_code = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk and return the rendered text for every line it completes.
+        """
+        assert isinstance(chunk, str), "chunk must be a str"
+
+        if not self.ansi:
+            return chunk
+        self._buffer += chunk
+        if "\n" not in self._buffer:
+            return ""
+        complete, self._buffer = self._buffer.rsplit("\n", 1)
+        return "".join(self._render_line(line) + "\n" for line in complete.split("\n"))
+
+    def flush(self) -> str:
+        """
+        Render whatever is left of the last, unterminated line.
+        """
+        if not self.ansi or not self._buffer:
+            return ""
+        line, self._buffer = self._buffer, ""
+        return self._render_line(line)
+
+    def _render_line(self, line: str) -> str:
+        stripped = line.lstrip()
+        if stripped.startswith("```"):
+            self._in_code = not self._in_code
+            return f"{DIM}{line}{RESET}"
+        if self._in_code:
+            rendered = line
+        elif stripped.startswith("#"):
+            rendered = f"{BOLD}{stripped.lstrip('#').strip()}{RESET}"
+        else:
+            rendered = render_markdown(line)
+        if not self.style:
+            return rendered
+        return f"{self.style}{rendered.replace(RESET, RESET + self.style)}{RESET}"
+
+
+class StreamPrinter:
+    """
+    Event callback for stream_agent that writes progress to the terminal.
+
+    Status events are printed as their own lines, optionally on stderr so
+    that stdout only carries streamed text when piped.
+    """
+
+    def __init__(self, ansi: bool = True, status_to_stderr: bool = False):
+        self.ansi = ansi
+        self.status_to_stderr = status_to_stderr
+        self._markdown = MarkdownStream(ansi=ansi, style=DIM if ansi else "")
+        self._mid_line = False
+
+    def __call__(self, kind: str, text: str) -> None:
+        if kind == "status":
+            self._end_line()
+            label = f"  {CYAN}⎿{RESET} {DIM}{text}{RESET}" if self.ansi else f"[{text}]"
+            click.echo(label, err=self.status_to_stderr)
+        elif kind == "token":
+            self._write(self._markdown.feed(text))
+
+    def _write(self, text: str) -> None:
+        if text:
+            click.echo(text, nl=False)
+            self._mid_line = not text.endswith("\n")
+
+    def _end_line(self) -> None:
+        self._write(self._markdown.flush())
+        if self._mid_line:
+            click.echo()
+            self._mid_line = False
+
+    def finish(self) -> None:
+        """
+        Flush buffered text and end the current line.
+        """
+        self._end_line()
+
+
+def _action_predictors(agent: Any) -> list[tuple[str, Any]]:
+    """
+    Return the named predictors that emit RLM reasoning and code.
+    """
+    named_predictors = getattr(agent, "named_predictors", None)
+    if not callable(named_predictors):
+        return []
+    return [
+        (name, predictor)
+        for name, predictor in named_predictors()
+        if {_STREAM_FIELD, "code"} <= set(getattr(predictor.signature, "output_fields", {}))
+    ]
+
+
+def _status_provider(agent: Any, action_ids: set[int]) -> Any:
+    """
+    Build a dspy status provider that reports RLM iterations, sub_lm queries and tool calls.
+    """
+    from dspy.streaming import StatusMessageProvider
+
+    main_lm = getattr(agent, "lm", None)
+    sub_lm = getattr(agent, "sub_lm", None)
+
+    class IterationStatus(StatusMessageProvider):
+        def __init__(self) -> None:
+            self.iteration = 0
+
+        def module_start_status_message(self, instance: Any, inputs: dict[str, Any]) -> str | None:
+            if id(instance) in action_ids:
+                self.iteration += 1
+                return f"Iteration {self.iteration}"
+            return None
+
+        def lm_start_status_message(self, instance: Any, inputs: dict[str, Any]) -> str | None:
+            if sub_lm is not None and instance is sub_lm and instance is not main_lm:
+                return f"sub_lm query ({getattr(instance, 'model', 'sub_lm').removeprefix('openrouter/')})"
+            return None
+
+        def tool_start_status_message(self, instance: Any, inputs: dict[str, Any]) -> str:
+            return f"Tool {getattr(instance, 'name', 'tool')}"
+
+        def tool_end_status_message(self, outputs: Any) -> None:
+            return None
+
+    return IterationStatus()
+
+
+def _streaming_program(agent: Any, async_streaming: bool) -> Any:
+    """
+    Wrap the agent with dspy.streamify, listening to the RLM reasoning field.
+    """
+    import dspy
+    from dspy.streaming import StreamListener
+
+    predictors = _action_predictors(agent)
+    listeners = [
+        StreamListener(
+            signature_field_name=_STREAM_FIELD,
+            predict=predictor,
+            predict_name=name,
+            allow_reuse=True,
+        )
+        for name, predictor in predictors
+    ]
+    return dspy.streamify(
+        agent,
+        status_message_provider=_status_provider(
+            agent, {id(predictor) for _name, predictor in predictors}
+        ),
+        stream_listeners=listeners or None,
+        is_async_program=async_streaming and callable(getattr(agent, "aforward", None)),
+        async_streaming=async_streaming,
+    )
+
+
+def _dispatch(value: Any, on_event: Callable[[str, str], None]) -> Any:
+    """
+    Forward a streamed value to on_event, returning it if it is the final prediction.
+    """
+    import dspy
+    from dspy.streaming import StatusMessage, StreamResponse
+
+    if isinstance(value, dspy.Prediction):
+        return value
+    if isinstance(value, StatusMessage):
+        on_event("status", value.message)
+    elif isinstance(value, StreamResponse):
+        on_event("token", value.chunk)
+        if value.is_last_chunk:
+            on_event("token", "\n")
+    return None
+
+
+def stream_agent(
+    agent: Any,
+    task: str,
+    on_event: Callable[[str, str], None],
+) -> Any:
+    """
+    Run the agent while streaming its progress.
+
+    Events are delivered as (kind, text) pairs: "status" for iterations,
+    sub_lm queries and tool calls, and "token" for chunks of the reasoning
+    the RLM writes on each iteration. The final answer is only available
+    once the run ends, since the RLM submits it from code.
+
+    Args:
+        agent: The loaded program
+        task: The task string
+        on_event: Callback receiving (kind, text) for each event
+
+    Returns:
+        The final prediction
+    """
+    assert isinstance(task, str), "task must be a str"
+    assert callable(on_event), "on_event must be callable"
+
+    result = None
+    for value in _streaming_program(agent, async_streaming=False)(task=task):
+        prediction = _dispatch(value, on_event)
+        if prediction is not None:
+            result = prediction
+
+    if result is None:
+        raise RuntimeError("Agent finished without a prediction")
+    return result
+
+
+async def astream_agent(
+    agent: Any,
+    task: str,
+    on_event: Callable[[str, str], None],
+) -> Any:
+    """
+    Async variant of stream_agent.
+
+    Programs that define `aforward` are awaited directly, so cancelling the
+    coroutine cancels in-flight LM requests; other programs run on a worker
+    thread that is abandoned on cancellation.
+    """
+    assert isinstance(task, str), "task must be a str"
+    assert callable(on_event), "on_event must be callable"
+
+    result = None
+    async for value in _streaming_program(agent, async_streaming=True)(task=task):
+        prediction = _dispatch(value, on_event)
+        if prediction is not None:
+            result = prediction
+
+    if result is None:
+        raise RuntimeError("Agent finished without a prediction")
+    return result
@@ -0,0 +1,283 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+_TOKEN_RE = re.compile(r"\s*\S+|\s+")
+
+
+def _tokens(text: str) -> list[str]:
+    """
+    Split text into word-sized pieces that join back to the original text.
+    """
+    return _TOKEN_RE.findall(text)
+
+
+def load_script(path: str) -> list[dict[str, Any]]:
+    """
+    Read scripted responses from a JSONL file.
+
+    Each line is a JSON string (the reply) or an object with "content" and
+    optionally "match", a substring the last user message must contain for
+    the reply to be used.
+
+    Raises:
+        ValueError: If a line is not a string or an object with "content"
+    """
+    script: list[dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"content": item}
+            if not isinstance(item, dict) or not isinstance(item.get("content"), str):
+                raise ValueError(f"{path}:{number}: expected a string or an object with 'content'")
+            script.append(item)
+    return script
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the OpenRouter/OpenAI chat completions API.
+
+    POST .../chat/completions answers with the next scripted reply (the
+    first whose "match" occurs in the last user message, else the next one
+    in rotation) or, without a script, echoes the last user message. Replies
+    wait `ttft` seconds and then produce `tokens_per_sec` word-sized tokens
+    per second, streamed as server-sent events when the request sets
+    `"stream": true`. `error_rate` and `rate_limit_rate` inject 500 and 429
+    responses at random; `rpm` rejects requests over a sliding one-minute
+    window with 429 and a Retry-After header. GET .../models lists the
+    models requests have used.
+
+    Args:
+        address: (host, port); port 0 picks a free port
+        script: Scripted replies from load_script, or None to echo
+        ttft: Seconds before the first token
+        tokens_per_sec: Generation speed (0 for instant)
+        error_rate: Fraction of requests answered with 500
+        rate_limit_rate: Fraction of requests answered with 429
+        rpm: Requests allowed per minute (0 for unlimited)
+        seed: Seed for the error injection
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        script: list[dict[str, Any]] | None = None,
+        ttft: float = 0.0,
+        tokens_per_sec: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        rpm: int = 0,
+        seed: int | None = None,
+    ):
+        assert ttft >= 0 and tokens_per_sec >= 0, "ttft and tokens_per_sec must not be negative"
+        assert 0 <= error_rate <= 1 and 0 <= rate_limit_rate <= 1, "rates must be between 0 and 1"
+        assert rpm >= 0, "rpm must not be negative"
+
+        self.script = script or []
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.counts = {"requests": 0, "ok": 0, "streamed": 0, "errors": 0, "rate_limited": 0}
+        self.models: set[str] = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._window: deque = deque()
+        super().__init__(address, _StubHandler)
+
+    @property
+    def api_base(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def admit(self) -> tuple[int, float | None]:
+        """
+        Decide the status of a new request: 200, 429 (with Retry-After seconds) or 500.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.counts["requests"] += 1
+            if self.rpm:
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                if len(self._window) >= self.rpm:
+                    self.counts["rate_limited"] += 1
+                    return 429, max(60 - (now - self._window[0]), 0.0)
+                self._window.append(now)
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.counts["rate_limited"] += 1
+                return 429, 1.0
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.counts["errors"] += 1
+                return 500, None
+            return 200, None
+
+    def reply(self, prompt: str) -> str:
+        """
+        Return the reply for the last user message.
+        """
+        if not self.script:
+            return prompt
+        with self._lock:
+            for item in self.script:
+                if item.get("match") and item["match"] in prompt:
+                    return item["content"]
+            unmatched = [item for item in self.script if not item.get("match")] or self.script
+            item = unmatched[self._next % len(unmatched)]
+            self._next += 1
+            return item["content"]
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+
+def _last_user_text(messages: Any) -> str:
+    for message in reversed(messages if isinstance(messages, list) else []):
+        if isinstance(message, dict) and message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return str(content or "")
+    return ""
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            models = sorted(self.server.models) or ["stub/echo"]
+            self._send_json(200, {"object": "list", "data": [{"id": model, "object": "model"} for model in models]})
+        else:
+            self._send_json(404, {"error": {"message": "not found", "code": 404}})
+
+    def do_POST(self) -> None:
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON", "code": 400}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "code": 404}})
+            return
+
+        status, retry_after = self.server.admit()
+        if status == 429:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit exceeded (stub)", "code": 429}},
+                headers={"Retry-After": str(max(int(retry_after or 0), 1))},
+            )
+            return
+        if status == 500:
+            self._send_json(500, {"error": {"message": "Injected server error (stub)", "code": 500}})
+            return
+
+        model = str(request.get("model") or "stub/echo")
+        self.server.models.add(model)
+        messages = request.get("messages") or []
+        prompt_tokens = sum(len(_tokens(str(message.get("content") or ""))) for message in messages if isinstance(message, dict))
+        pieces = _tokens(self.server.reply(_last_user_text(messages)))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces),
+        }
+        completion_id = f"chatcmpl-stub-{self.server.counts['requests']}"
+        time.sleep(self.server.ttft)
+        if request.get("stream"):
+            self._stream(completion_id, model, pieces, usage, bool((request.get("stream_options") or {}).get("include_usage")))
+            return
+
+        if self.server.tokens_per_sec:
+            time.sleep(len(pieces) / self.server.tokens_per_sec)
+        self.server.count("ok")
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}
+                ],
+                "usage": usage,
+            },
+        )
+
+    def _stream(self, completion_id: str, model: str, pieces: list[str], usage: dict[str, int], include_usage: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict[str, Any], finish_reason: str | None = None, extra: dict[str, Any] | None = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **(extra or {}),
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        interval = 1 / self.server.tokens_per_sec if self.server.tokens_per_sec else 0.0
+        event({"role": "assistant", "content": ""})
+        for piece in pieces:
+            if interval:
+                time.sleep(interval)
+            event({"content": piece})
+        event({}, finish_reason="stop", extra={"usage": usage} if include_usage else None)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.server.count("streamed")
+        self.server.count("ok")
+
+
+def format_stub_counts(counts: dict[str, int]) -> str:
+    """
+    Format StubServer.counts as a one-line summary.
+    """
+    return (
+        f"{counts['requests']} requests: {counts['ok']} ok ({counts['streamed']} streamed), "
+        f"{counts['rate_limited']} rate limited, {counts['errors']} errors"
+    )
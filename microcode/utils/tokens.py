@@ -0,0 +1,156 @@
+import math
+from typing import Any
+
+from .cache import load_token_calibration, save_token_calibration
+from .constants import (
+    CHARS_PER_TOKEN,
+    DEFAULT_CHARS_PER_TOKEN,
+    DEFAULT_CONTEXT_WINDOW,
+    HISTORY_TOKEN_FRACTION,
+    MODEL_CONTEXT_WINDOWS,
+)
+from .display import read_int_env
+
+_MIN_CHARS_PER_TOKEN = 1.5
+_MAX_CHARS_PER_TOKEN = 8.0
+_MIN_HISTORY_TOKENS = 1024
+_CALIBRATION: dict[str, float] | None = None
+
+
+def _model_key(model: str | None) -> str:
+    return (model or "").removeprefix("openrouter/")
+
+
+def _calibration() -> dict[str, float]:
+    global _CALIBRATION
+    if _CALIBRATION is None:
+        _CALIBRATION = load_token_calibration()
+    return _CALIBRATION
+
+
+def chars_per_token(model: str | None = None) -> float:
+    """
+    Return the characters-per-token ratio for a model.
+
+    Calibrated ratios from observed usage win over the per-provider defaults.
+
+    Args:
+        model: The model ID, with or without the "openrouter/" prefix
+
+    Returns:
+        Average number of characters per token
+    """
+    key = _model_key(model)
+    calibrated = _calibration().get(key)
+    if calibrated:
+        return calibrated
+    for prefix, ratio in CHARS_PER_TOKEN.items():
+        if key.startswith(prefix):
+            return ratio
+    return DEFAULT_CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str, model: str | None = None) -> int:
+    """
+    Estimate the token count of a string without running a tokenizer.
+
+    Args:
+        text: The text to estimate
+        model: The model ID used to pick the characters-per-token ratio
+
+    Returns:
+        Estimated number of tokens
+    """
+    assert isinstance(text, str), "text must be a str"
+
+    if not text:
+        return 0
+    return math.ceil(len(text) / chars_per_token(model))
+
+
+def context_window(model: str | None) -> int:
+    """
+    Return the approximate context window of a model in tokens.
+    """
+    return MODEL_CONTEXT_WINDOWS.get(_model_key(model), DEFAULT_CONTEXT_WINDOW)
+
+
+def history_token_budget(
+    model: str | None,
+    max_tokens: int | None = None,
+    override: int | None = None,
+) -> int:
+    """
+    Compute the token budget for conversation history in the task prompt.
+
+    Args:
+        model: The primary model ID
+        max_tokens: Tokens reserved for the model's output
+        override: Explicit budget (falls back to MICROCODE_HISTORY_TOKENS)
+
+    Returns:
+        Token budget for the history window
+    """
+    if override is None:
+        override = read_int_env("MICROCODE_HISTORY_TOKENS")
+    if override is not None and override > 0:
+        return override
+
+    available = context_window(model) - (max_tokens or 0)
+    return max(int(available * HISTORY_TOKEN_FRACTION), _MIN_HISTORY_TOKENS)
+
+
+def calibrate(model: str, chars: int, tokens: int, weight: float = 0.2) -> float:
+    """
+    Fold an observed characters/tokens sample into a model's calibration.
+
+    Args:
+        model: The model ID the sample was observed on
+        chars: Number of characters sent
+        tokens: Number of prompt tokens reported by the provider
+        weight: Weight of the new sample in the moving average
+
+    Returns:
+        The updated characters-per-token ratio
+    """
+    assert 0 < weight <= 1, "weight must be in (0, 1]"
+
+    if chars <= 0 or tokens <= 0:
+        return chars_per_token(model)
+
+    sample = min(max(chars / tokens, _MIN_CHARS_PER_TOKEN), _MAX_CHARS_PER_TOKEN)
+    current = chars_per_token(model)
+    updated = round(current + (sample - current) * weight, 4)
+
+    calibration = _calibration()
+    calibration[_model_key(model)] = updated
+    save_token_calibration(calibration)
+    return updated
+
+
+def calibrate_from_entries(entries: list[dict[str, Any]]) -> None:
+    """
+    Calibrate ratios from dspy LM history entries with usage data.
+
+    Args:
+        entries: LM history entries (see utils.usage.entries_since)
+    """
+    totals: dict[str, list[int]] = {}
+    for entry in entries:
+        usage = entry.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        messages = entry.get("messages") or []
+        model = entry.get("model")
+        if not isinstance(prompt_tokens, int) or not model:
+            continue
+        chars = sum(
+            len(message["content"])
+            for message in messages
+            if isinstance(message, dict) and isinstance(message.get("content"), str)
+        )
+        total = totals.setdefault(model, [0, 0])
+        total[0] += chars
+        total[1] += prompt_tokens
+
+    for model, (chars, tokens) in totals.items():
+        calibrate(model, chars, tokens)
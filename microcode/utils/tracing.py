@@ -0,0 +1,460 @@
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Iterator
+
+from .constants import (
+    TRACE_BUFFER_SIZE,
+    TRACE_FILE_MAX_BYTES,
+    TRACE_FLUSH_INTERVAL,
+    TRACE_MAX_CHARS,
+    TRACE_MAX_FILES,
+    TRACES_DIR,
+)
+from .display import read_int_env
+from .stats import percentile
+
+
+def tracing_enabled() -> bool:
+    """
+    Return True if MICROCODE_TRACE=1 (set by --trace).
+    """
+    return os.getenv("MICROCODE_TRACE") == "1"
+
+
+def _clip(value: Any, limit: int = TRACE_MAX_CHARS) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + f"... [{len(value) - limit} chars]"
+    return value
+
+
+class Tracer:
+    """
+    Buffer spans in memory and flush them to rotating NDJSON files off the hot path.
+
+    record() only appends to a bounded ring buffer; when the buffer is full
+    the oldest unflushed span is dropped and counted rather than blocking
+    the caller. A daemon thread drains the buffer every flush interval (or
+    when it is half full) and hands each batch to the sinks. The file sink
+    writes one JSON span per line to `traces-<time>-<pid>-<n>.ndjson`, starting
+    a new file past max_file_bytes and deleting the oldest beyond max_files.
+    """
+
+    def __init__(
+        self,
+        root: str | None = None,
+        buffer_size: int | None = None,
+        flush_interval: float = TRACE_FLUSH_INTERVAL,
+        max_file_bytes: int | None = None,
+        max_files: int = TRACE_MAX_FILES,
+        sinks: list[Callable[[list[dict[str, Any]]], None]] | None = None,
+    ):
+        buffer_size = buffer_size or read_int_env("MICROCODE_TRACE_BUFFER") or TRACE_BUFFER_SIZE
+        max_file_bytes = max_file_bytes or read_int_env("MICROCODE_TRACE_FILE_MAX_BYTES") or TRACE_FILE_MAX_BYTES
+        assert buffer_size > 0, "buffer_size must be positive"
+        assert max_files > 0, "max_files must be positive"
+
+        self.root = root or TRACES_DIR
+        self.session: str | None = None
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.sinks = [self.write_file] if sinks is None else list(sinks)
+        self.counts = {"recorded": 0, "dropped": 0, "flushed": 0, "sink_errors": 0}
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._path: str | None = None
+        self._sequence = 0
+        self._interval = flush_interval
+        self._thread = threading.Thread(target=self._run, name="microcode-tracer", daemon=True)
+        self._thread.start()
+
+    def record(self, kind: str, name: str, start: float, seconds: float | None, **attrs: Any) -> None:
+        """
+        Queue a span.
+
+        Args:
+            kind: "turn", "iteration", "route", "lm", "sub_lm" or "tool"
+            name: Span label, e.g. a model or tool name
+            start: Start time as time.time()
+            seconds: Duration, or None when unknown
+            **attrs: JSON-serializable details
+        """
+        span = {
+            "ts": round(start, 6),
+            "seconds": None if seconds is None else round(seconds, 6),
+            "kind": kind,
+            "name": name,
+            "session": self.session,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "attrs": attrs,
+        }
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.counts["dropped"] += 1
+            self._buffer.append(span)
+            self.counts["recorded"] += 1
+            half_full = len(self._buffer) * 2 >= self._buffer.maxlen
+        if half_full:
+            self._wake.set()
+
+    def span(self, kind: str, name: str, **attrs: Any) -> "_Span":
+        """
+        Time the enclosed block as a span; the block may add attrs to the yielded dict.
+        """
+        return _Span(self, kind, name, attrs)
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Drain the buffer into every sink now.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._buffer)
+                self._buffer.clear()
+            if not batch:
+                return
+            for sink in self.sinks:
+                try:
+                    sink(batch)
+                except Exception:
+                    with self._lock:
+                        self.counts["sink_errors"] += 1
+            with self._lock:
+                self.counts["flushed"] += len(batch)
+
+    def write_file(self, batch: list[dict[str, Any]]) -> None:
+        """
+        File sink: append a batch to the current NDJSON file, rotating by size.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        if self._path is None or _size(self._path) >= self.max_file_bytes:
+            files = trace_files(self.root)
+            for stale in files[: max(len(files) + 1 - self.max_files, 0)]:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            self._sequence += 1
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            self._path = os.path.join(self.root, f"traces-{stamp}-{os.getpid()}-{self._sequence}.ndjson")
+        with open(self._path, "a", encoding="utf-8") as handle:
+            handle.write("".join(json.dumps(span, default=str) + "\n" for span in batch))
+
+    def close(self) -> None:
+        """
+        Stop the flush thread and write out anything still buffered.
+        """
+        self._closed.set()
+        self._wake.set()
+        self._thread.join(timeout=2)
+        self.flush()
+
+
+class _Span:
+    """
+    Context manager that records a span on exit, with any exception as an error.
+    """
+
+    def __init__(self, tracer: Tracer, kind: str, name: str, attrs: dict[str, Any]):
+        self.tracer = tracer
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> dict[str, Any]:
+        self.start = time.time()
+        self.began = time.perf_counter()
+        return self.attrs
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc is not None:
+            self.attrs["error"] = f"{type(exc).__name__}: {_clip(str(exc), 200)}"
+        self.tracer.record(self.kind, self.name, self.start, time.perf_counter() - self.began, **self.attrs)
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def trace_files(root: str | None = None) -> list[str]:
+    """
+    Return trace files under root, oldest first.
+    """
+    return sorted(glob.glob(os.path.join(root or TRACES_DIR, "traces-*.ndjson")), key=_mtime)
+
+
+def weave_sink(project: str | None = None) -> Callable[[list[dict[str, Any]]], None]:
+    """
+    Build a sink that logs each span as a call of a `microcode_span` weave op.
+
+    weave is imported here, so it is only needed when this sink is configured.
+
+    Args:
+        project: W&B project (defaults to WANDB_PROJECT, then "microcode")
+
+    Raises:
+        ImportError: If weave is not installed
+    """
+    import weave
+
+    weave.init(project or os.getenv("WANDB_PROJECT") or "microcode")
+
+    @weave.op(name="microcode_span")
+    def log_span(span: dict[str, Any]) -> dict[str, Any]:
+        return span
+
+    def sink(batch: list[dict[str, Any]]) -> None:
+        for span in batch:
+            log_span(span)
+
+    return sink
+
+
+_TRACER: Tracer | None = None
+_TRACER_LOCK = threading.Lock()
+
+
+def get_tracer() -> Tracer | None:
+    """
+    Return the process-wide tracer when tracing is enabled, starting it on first use.
+
+    Sinks come from MICROCODE_TRACE_SINKS, a comma-separated list of "file"
+    (the default) and "weave"; the weave sink is skipped if weave is not
+    installed. The tracer is flushed at exit.
+    """
+    global _TRACER
+    if not tracing_enabled():
+        return None
+    with _TRACER_LOCK:
+        if _TRACER is None:
+            tracer = Tracer(sinks=[])
+            for name in (os.getenv("MICROCODE_TRACE_SINKS") or "file").split(","):
+                name = name.strip()
+                if name == "file":
+                    tracer.sinks.append(tracer.write_file)
+                elif name == "weave":
+                    try:
+                        tracer.sinks.append(weave_sink())
+                    except ImportError:
+                        pass
+            import atexit
+
+            atexit.register(tracer.close)
+            _TRACER = tracer
+        return _TRACER
+
+
+def set_trace_session(session_id: str | None) -> None:
+    """
+    Tag spans recorded from now on with a session ID.
+    """
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.session = session_id
+
+
+def _message_attrs(prompt: str | None, messages: list[dict[str, Any]] | None) -> dict[str, Any]:
+    if messages:
+        last = messages[-1].get("content") if isinstance(messages[-1], dict) else None
+        return {"messages": len(messages), "request": _clip(last if isinstance(last, str) else str(last))}
+    return {"messages": 0, "request": _clip(prompt)}
+
+
+def _response_attrs(response: Any) -> dict[str, Any]:
+    attrs: dict[str, Any] = {}
+    try:
+        attrs["response"] = _clip(response.choices[0].message.content)
+    except (AttributeError, IndexError, TypeError):
+        pass
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        attrs["usage"] = {
+            field: getattr(usage, field, None) for field in ("prompt_tokens", "completion_tokens", "total_tokens")
+        }
+    return attrs
+
+
+def enable_tracing(lm: Any, role: str) -> None:
+    """
+    Record each request an LM sends, with a clipped request, response and usage.
+
+    Like enable_hedging, this wraps the LM's `forward`/`aforward`; it does
+    nothing unless tracing is enabled.
+
+    Args:
+        lm: The dspy LM (ignored if None or already traced)
+        role: "lm" or "sub_lm", used as the span kind
+    """
+    if lm is None or getattr(lm, "_traced", False):
+        return
+    tracer = get_tracer()
+    if tracer is None:
+        return
+
+    forward = lm.forward
+    aforward = lm.aforward
+
+    def traced_forward(prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any) -> Any:
+        with tracer.span(role, lm.model, **_message_attrs(prompt, messages)) as attrs:
+            response = forward(prompt=prompt, messages=messages, **kwargs)
+            attrs.update(_response_attrs(response))
+            return response
+
+    async def traced_aforward(
+        prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any
+    ) -> Any:
+        with tracer.span(role, lm.model, **_message_attrs(prompt, messages)) as attrs:
+            response = await aforward(prompt=prompt, messages=messages, **kwargs)
+            attrs.update(_response_attrs(response))
+            return response
+
+    lm._traced = True
+    lm.forward = traced_forward
+    lm.aforward = traced_aforward
+
+
+def trace_tool(tool: Callable[..., Any], name: str) -> Callable[..., Any]:
+    """
+    Wrap a tool so each call is recorded with its clipped arguments and result.
+
+    Tools are returned unchanged when tracing is off.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return tool
+
+    @functools.wraps(tool)
+    def call(*args: Any, **kwargs: Any) -> Any:
+        with tracer.span("tool", name, args=_clip(repr(args)), kwargs=_clip(repr(kwargs))) as attrs:
+            result = tool(*args, **kwargs)
+            attrs["result"] = _clip(str(result))
+            return result
+
+    return call
+
+
+def record_turn(task: str, result: Any, start: float, seconds: float, error: BaseException | None = None) -> None:
+    """
+    Record a finished agent call and one span per RLM iteration of its trajectory.
+
+    Iterations are taken from the prediction after the call, so they carry
+    the reasoning, code and output but no timing.
+
+    Args:
+        task: The task string
+        result: The prediction (None if the call failed)
+        start: Start of the call as time.time()
+        seconds: Wall time of the call
+        error: The exception, if the call failed
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return
+    trajectory = getattr(result, "trajectory", None)
+    trajectory = trajectory if isinstance(trajectory, list) else []
+    attrs: dict[str, Any] = {"task": _clip(task), "iterations": len(trajectory)}
+    if result is not None:
+        attrs["answer"] = _clip(str(getattr(result, "answer", "")))
+    if error is not None:
+        attrs["error"] = f"{type(error).__name__}: {_clip(str(error), 200)}"
+    tracer.record("turn", "turn", start, seconds, **attrs)
+    for index, step in enumerate(trajectory, 1):
+        step = step if isinstance(step, dict) else {"output": step}
+        tracer.record(
+            "iteration",
+            f"iteration {index}",
+            start,
+            None,
+            **{field: _clip(str(step[field])) for field in ("reasoning", "code", "output") if field in step},
+        )
+
+
+def read_spans(
+    root: str | None = None,
+    kind: str | None = None,
+    session: str | None = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield spans from the trace files, oldest file first, skipping torn lines.
+    """
+    for path in trace_files(root):
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        span = json.loads(line)
+                    except ValueError:
+                        continue
+                    if kind and span.get("kind") != kind:
+                        continue
+                    if session and span.get("session") != session:
+                        continue
+                    yield span
+        except OSError:
+            continue
+
+
+def summarize_spans(spans: list[dict[str, Any]], top: int = 10) -> dict[str, Any]:
+    """
+    Summarize timed spans by kind (count, total, p50, p95, max) and list the slowest.
+    """
+    timed = [span for span in spans if isinstance(span.get("seconds"), (int, float))]
+    kinds: dict[str, Any] = {}
+    for kind in sorted({span["kind"] for span in timed}):
+        durations = [span["seconds"] for span in timed if span["kind"] == kind]
+        kinds[kind] = {
+            "count": len(durations),
+            "total": round(sum(durations), 3),
+            "p50": percentile(durations, 0.5),
+            "p95": percentile(durations, 0.95),
+            "max": max(durations),
+            "errors": sum(1 for span in timed if span["kind"] == kind and "error" in span.get("attrs", {})),
+        }
+    slowest = sorted(timed, key=lambda span: span["seconds"], reverse=True)[:top]
+    return {"spans": len(spans), "kinds": kinds, "slowest": slowest}
+
+
+def format_trace_summary(summary: dict[str, Any]) -> list[str]:
+    """
+    Format summarize_spans output as lines for `microcode traces`.
+    """
+    if not summary["spans"]:
+        return ["No traces recorded (run with --trace)"]
+    lines = [f"{summary['spans']} spans"]
+    for kind, info in summary["kinds"].items():
+        lines.append(
+            f"  {kind:<9} {info['count']:>6} calls  total {info['total']:.1f}s  "
+            f"p50 {info['p50']:.2f}s  p95 {info['p95']:.2f}s  max {info['max']:.2f}s  {info['errors']} errors"
+        )
+    if summary["slowest"]:
+        lines.append("Slowest spans:")
+    for span in summary["slowest"]:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(span["ts"]))
+        name = str(span.get("name", "")).removeprefix("openrouter/")
+        error = "  ERROR" if "error" in span.get("attrs", {}) else ""
+        lines.append(f"  {span['seconds']:8.2f}s  {span['kind']:<9} {name:<32} {when}  {span.get('session') or '-'}{error}")
+    return lines
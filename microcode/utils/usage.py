@@ -0,0 +1,159 @@
+import re
+from typing import Any
+
+from .constants import CACHE_CONTROL_PREFIXES
+
+_CACHE_CONTROL_POINTS = [{"location": "message", "role": "system"}]
+# ConversationContext's time stamp line; in the "cache" layout everything before it is stable across turns.
+_VOLATILE_START = re.compile(r"^time: \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$", re.MULTILINE)
+
+
+def history_marker(lm: Any) -> Any:
+    """
+    Return a marker for the latest entry in an LM's call history.
+
+    Args:
+        lm: A dspy LM (or any object with a `history` list)
+
+    Returns:
+        The latest history entry, or None if there is none
+    """
+    history = getattr(lm, "history", None)
+    if not history:
+        return None
+    return history[-1]
+
+
+def entries_since(lm: Any, marker: Any) -> list[dict[str, Any]]:
+    """
+    Return the LM history entries recorded after a marker.
+
+    dspy trims LM history from the front once it is full, so entries are
+    matched by identity from the end rather than by index.
+
+    Args:
+        lm: A dspy LM (or any object with a `history` list)
+        marker: A value previously returned by history_marker
+
+    Returns:
+        History entries newer than the marker, oldest first
+    """
+    history = getattr(lm, "history", None)
+    if not history:
+        return []
+
+    entries: list[dict[str, Any]] = []
+    for entry in reversed(history):
+        if marker is not None and entry is marker:
+            break
+        entries.append(entry)
+    entries.reverse()
+    return entries
+
+
+def _usage_value(usage: Any, key: str) -> Any:
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage.get(key)
+    return getattr(usage, key, None)
+
+
+def cached_prompt_tokens(entries: list[dict[str, Any]]) -> tuple[int, int]:
+    """
+    Sum the provider-cached and total prompt tokens over LM history entries.
+
+    OpenAI-style providers report cache hits under
+    `prompt_tokens_details.cached_tokens`; Anthropic reports
+    `cache_read_input_tokens`.
+
+    Args:
+        entries: LM history entries, e.g. from entries_since
+
+    Returns:
+        Tuple of (cached prompt tokens, total prompt tokens)
+    """
+    cached = 0
+    prompt = 0
+    for entry in entries:
+        usage = entry.get("usage")
+        prompt += _usage_value(usage, "prompt_tokens") or 0
+        hits = _usage_value(_usage_value(usage, "prompt_tokens_details"), "cached_tokens")
+        if not hits:
+            hits = _usage_value(usage, "cache_read_input_tokens")
+        cached += hits or 0
+    return cached, prompt
+
+
+def split_stable_prefix(messages: list[dict[str, Any]] | None) -> list[dict[str, Any]] | None:
+    """
+    Mark the stable head of the last user message as a cache breakpoint.
+
+    The message is split into two text blocks at the task's time stamp,
+    with `cache_control` on the first, so the cwd, history and pastes
+    rendered before it are cached as a prefix even though the time stamp
+    and task after it change every turn.
+
+    Args:
+        messages: Chat messages, left unchanged if there is no such split point
+
+    Returns:
+        The messages, with a copy of the split user message
+    """
+    if not messages:
+        return messages
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        match = _VOLATILE_START.search(content) if isinstance(content, str) else None
+        if match is None or not content[: match.start()].strip():
+            return messages
+        blocks = [
+            {"type": "text", "text": content[: match.start()], "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": content[match.start() :]},
+        ]
+        return [*messages[:index], {**message, "content": blocks}, *messages[index + 1 :]]
+    return messages
+
+
+def enable_prompt_caching(lm: Any) -> bool:
+    """
+    Add cache_control breakpoints for providers that need them.
+
+    OpenAI-style providers cache shared prefixes automatically; Anthropic and
+    Gemini models only reuse prefixes marked with cache_control. litellm
+    injects one after the system prompt from `cache_control_injection_points`,
+    and the LM's `forward`/`aforward` are wrapped to add one after the stable
+    head of the user message (see split_stable_prefix).
+
+    Args:
+        lm: A dspy LM
+
+    Returns:
+        True if breakpoints were added
+    """
+    model = getattr(lm, "model", None)
+    kwargs = getattr(lm, "kwargs", None)
+    if not isinstance(model, str) or not isinstance(kwargs, dict):
+        return False
+    if not model.removeprefix("openrouter/").startswith(CACHE_CONTROL_PREFIXES):
+        return False
+    kwargs.setdefault("cache_control_injection_points", list(_CACHE_CONTROL_POINTS))
+    if getattr(lm, "_cache_split", False):
+        return True
+
+    forward = lm.forward
+    aforward = lm.aforward
+
+    def split_forward(prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any) -> Any:
+        return forward(prompt=prompt, messages=split_stable_prefix(messages), **kwargs)
+
+    async def split_aforward(prompt: str | None = None, messages: list[dict[str, Any]] | None = None, **kwargs: Any) -> Any:
+        return await aforward(prompt=prompt, messages=split_stable_prefix(messages), **kwargs)
+
+    lm._cache_split = True
+    lm.forward = split_forward
+    lm.aforward = split_aforward
+    return True